@@ -0,0 +1,184 @@
+"""
+Coalescing AI categorizer
+
+Instead of one Claude call per description, descriptions submitted within a
+short window (or until the batch is full) are sent together in one prompt
+that returns a JSON map of item number -> category. Every answer is checked
+against the user's category list; anything missing or invalid falls back to
+keyword matching. Batches are dispatched without waiting for each other, so a
+large Splitwise sync costs a few concurrent LLM calls instead of one
+sequential call per expense.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import llm_client
+from llm_usage import usage as llm_usage
+from keyword_matcher import DESCRIPTION_KEYWORDS, match_category
+
+CATEGORIZE_BATCH_SIZE = int(os.getenv("CATEGORIZE_BATCH_SIZE", "25"))
+CATEGORIZE_BATCH_WINDOW = float(os.getenv("CATEGORIZE_BATCH_WINDOW", "0.05"))  # seconds
+CATEGORIZE_MODEL = "claude-sonnet-4-20250514"
+
+
+def _keyword_fallback(description: str) -> str:
+    return match_category(description or "", DESCRIPTION_KEYWORDS)
+
+
+def build_batch_prompt(descriptions: List[str], category_names: List[str]) -> str:
+    items = "\n".join(f'{i}. "{desc}"' for i, desc in enumerate(descriptions, 1))
+    return f"""You are categorizing expenses. For each numbered expense description, choose the BEST matching category from the user's list.
+
+Expense Descriptions:
+{items}
+
+User's Categories:
+{', '.join(category_names)}
+
+Instructions:
+- Return ONLY a JSON object mapping each item number (as a string) to a category name
+- Example: {{"1": "{category_names[0]}", "2": "{category_names[-1]}"}}
+- Use ONLY categories from the list above
+- If nothing matches well, use the most general category available
+
+JSON:"""
+
+
+def parse_batch_response(text: str, count: int, category_names: List[str]) -> dict:
+    """Map of item number (1-based) -> valid category; invalid answers are dropped"""
+    text = text.strip().replace("```json", "").replace("```", "").strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        return {}
+    try:
+        raw = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+
+    valid = set(category_names)
+    answers = {}
+    for key, category in raw.items():
+        try:
+            number = int(key)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count and category in valid:
+            answers[number] = category
+    return answers
+
+
+class CategoryCoalescer:
+    """
+    Collects descriptions for one user's category list and categorizes them
+    in batches. submit() returns a Future resolving to a category name.
+    """
+
+    def __init__(self, category_names: List[str],
+                 batch_size: int = CATEGORIZE_BATCH_SIZE,
+                 window: float = CATEGORIZE_BATCH_WINDOW,
+                 fallback: Callable[[str], str] = _keyword_fallback,
+                 user_id: Optional[int] = None):
+        self.category_names = list(category_names)
+        self.user_id = user_id
+        self.batch_size = max(1, batch_size)
+        self.window = window
+        self.fallback = fallback
+        self.batches_sent = 0
+        self._pending = {}  # description -> [Future, ...]
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, description: str) -> Future:
+        future = Future()
+
+        if not self.category_names or not llm_client.is_available():
+            llm_usage.record_local("categorize_batch", "keywords", self.user_id)
+            future.set_result(self.fallback(description))
+            return future
+
+        batch = None
+        with self._lock:
+            self._pending.setdefault(description, []).append(future)
+            if len(self._pending) >= self.batch_size:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if batch:
+            self._dispatch(batch)
+        return future
+
+    def flush(self):
+        """Send whatever is pending now"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+    def _take(self) -> dict:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _dispatch(self, batch: dict):
+        descriptions = list(batch)
+        self.batches_sent += 1
+        try:
+            llm_future = llm_client.submit_message(
+                model=CATEGORIZE_MODEL,
+                max_tokens=20 * len(descriptions) + 50,
+                messages=[{"role": "user", "content": build_batch_prompt(descriptions, self.category_names)}],
+                route="categorize_batch",
+                user_id=self.user_id,
+            )
+        except Exception as e:
+            print(f"AI batch categorization failed: {e}")
+            self._resolve(batch, descriptions, {}, type(e).__name__)
+            return
+
+        def done(f):
+            answers, reason = {}, "invalid_category"
+            try:
+                answers = parse_batch_response(f.result().content[0].text, len(descriptions), self.category_names)
+            except Exception as e:
+                print(f"AI batch categorization failed: {e}")
+                reason = type(e).__name__
+            self._resolve(batch, descriptions, answers, reason)
+
+        llm_future.add_done_callback(done)
+
+    def _resolve(self, batch: dict, descriptions: List[str], answers: dict,
+                 fallback_reason: str = "invalid_category"):
+        missing = len(descriptions) - len(answers)
+        if missing:
+            llm_usage.record_fallback("categorize_batch", fallback_reason, self.user_id, count=missing)
+        for number, description in enumerate(descriptions, 1):
+            category = answers.get(number) or self.fallback(description)
+            for future in batch[description]:
+                if not future.done():
+                    future.set_result(category)
+
+
+def categorize_many(descriptions: List[str], category_names: List[str],
+                    fallback: Callable[[str], str] = _keyword_fallback,
+                    user_id: Optional[int] = None) -> List[str]:
+    """Categorize a known list of descriptions in as few LLM calls as possible"""
+    coalescer = CategoryCoalescer(category_names, fallback=fallback, user_id=user_id)
+    futures = [coalescer.submit(desc) for desc in descriptions]
+    coalescer.flush()
+    timeout = llm_client.sync_wait_timeout()
+    results = []
+    for desc, future in zip(descriptions, futures):
+        try:
+            results.append(future.result(timeout=timeout))
+        except Exception:
+            results.append(fallback(desc))
+    return results
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark: keyword_matcher vs the old any(k in t ...) loops
+
+Usage: python bench_keyword_matcher.py [--messages 20000]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from keyword_matcher import SMS_KEYWORDS, DESCRIPTION_KEYWORDS, get_matcher
+
+SMS_TEMPLATES = [
+    "Your A/c XX{acct} debited by Rs.{amt} on {day}-Nov-25 at {merchant}. Avl Bal: Rs.{bal}",
+    "Sent Rs.{amt} From HDFC Bank A/C *{acct} To {merchant} On {day}/12/25 Ref {ref} Not You? Call 18002586161/SMS BLOCK UPI to 7308080808",
+    "Rs.{amt} spent on your SBI Credit Card ending {acct} at {merchant} on {day}/11/25. Trxn. not done by you? Report at https://sbicard.com/Dispute",
+    "ICICI Bank Acct XX{acct} debited for Rs {amt} on {day}-Dec-25; {merchant} credited. UPI:{ref}. Call 18002662 for dispute.",
+    "Dear Customer, INR {amt} credited to your A/c XX{acct} on {day}-11-2025 by {merchant}. Avl bal INR {bal}. -Axis Bank",
+    "Your a/c no. XXXXXXXX{acct} is debited for Rs.{amt} on {day}-11-25 and credited to a/c no. XXXXXXXX{ref} (UPI Ref no {ref}) - {merchant}",
+]
+
+MERCHANTS = [
+    "Starbucks Cafe", "SWIGGY", "Zomato Ltd", "M S SHREEJEE FO", "Uber India", "OLA CABS",
+    "Amazon Pay", "Flipkart Internet", "Indian Oil Petrol Pump", "Jio Prepaid Recharge",
+    "Netflix.com", "PVR Cinemas", "SAURABH SINGH TOLIA", "Reliance Fresh", "BESCOM Electricity",
+    "Apollo Pharmacy", "Decathlon Sports", "IRCTC", "Bharat Gas", "Myntra Designs",
+]
+
+
+def make_corpus(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        corpus.append(rng.choice(SMS_TEMPLATES).format(
+            acct=rng.randint(1000, 9999),
+            amt=f"{rng.uniform(10, 20000):.2f}",
+            bal=f"{rng.uniform(1000, 200000):,.2f}",
+            day=rng.randint(1, 28),
+            ref=rng.randint(10 ** 11, 10 ** 12 - 1),
+            merchant=rng.choice(MERCHANTS),
+        ))
+    return corpus
+
+
+def make_large_dictionary(categories: int = 50, per_category: int = 20, seed: int = 3) -> dict:
+    """Stand-in for a user with many custom categories / learned merchant keywords"""
+    rng = random.Random(seed)
+    groups = {
+        f"Custom {i}": [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+            for _ in range(per_category)
+        ]
+        for i in range(categories)
+    }
+    groups.update(SMS_KEYWORDS)
+    return groups
+
+
+def naive_match(text: str, groups: dict, default: str = "Other") -> str:
+    t = text.lower()
+    for label, keywords in groups.items():
+        if any(k in t for k in keywords):
+            return label
+    return default
+
+
+def run(label: str, fn, corpus: list) -> tuple:
+    start = time.perf_counter()
+    results = [fn(text) for text in corpus]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1e3:8.1f} ms  {elapsed / len(corpus) * 1e6:6.2f} µs/msg")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages)
+    print(f"{len(corpus)} messages\n")
+
+    scenarios = (
+        ("sms", SMS_KEYWORDS),
+        ("description", DESCRIPTION_KEYWORDS),
+        ("1k-keyword user", make_large_dictionary()),
+    )
+    for name, groups in scenarios:
+        matcher = get_matcher(groups)
+        naive = run(f"{name}: any(k in t)", lambda t: naive_match(t, groups), corpus)
+        fast = run(f"{name}: aho-corasick", lambda t: matcher.match(t, "Other"), corpus)
+        mismatches = sum(1 for a, b in zip(naive, fast) if a != b)
+        print(f"{'':<28} mismatches: {mismatches}\n")
+
+
+if __name__ == "__main__":
+    main()
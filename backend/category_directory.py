@@ -0,0 +1,119 @@
+"""
+Per-user category directory cache
+
+Category lists change rarely but are read on every categorization, voice
+parse, stats call and Splitwise sync. The directory keeps each user's
+categories (names, colours, icons) plus a normalized-name index in an
+in-process LRU, so hot paths do no category queries at all.
+
+Every route that writes categories calls invalidate(user_id) after its
+commit, but that only clears this process's copy. Other workers can serve
+a stale list until the entry expires (CATEGORY_CACHE_TTL), so user-facing
+category routes read with fresh=True, which always hits the database and
+refreshes the cache. Background paths (categorization, sync, voice) accept
+the bounded staleness.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "1024"))
+CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", "300"))
+
+
+def normalize_category_name(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    return " ".join(name.split()).lower()
+
+
+class UserCategories:
+    """Immutable snapshot of one user's categories, ordered by name"""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = sorted(rows, key=lambda row: row["name"])
+        self.names = [row["name"] for row in self.rows]
+        self.by_normalized = {}
+        for row in self.rows:
+            self.by_normalized.setdefault(normalize_category_name(row["name"]), row)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def get(self, name: Optional[str]) -> Optional[dict]:
+        """Category row for a name, ignoring case and extra whitespace"""
+        return self.by_normalized.get(normalize_category_name(name))
+
+    def canonical(self, name: Optional[str]) -> Optional[str]:
+        """The user's spelling of a category name, or None if they don't have it"""
+        row = self.get(name)
+        return row["name"] if row else None
+
+
+class CategoryDirectory:
+    def __init__(self, cache_size: int = CATEGORY_CACHE_SIZE, ttl: int = CATEGORY_CACHE_TTL):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (UserCategories, loaded_at, generation)
+        self._generations = {}  # user_id -> bumped on every invalidate
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, user_id: int) -> UserCategories:
+        # Own session: never sees (or ends) the caller's uncommitted work
+        from main import SessionLocal, Category
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Category.id, Category.name, Category.color, Category.icon, Category.created_at
+            ).filter(Category.user_id == user_id).all()
+        finally:
+            db.close()
+        return UserCategories([
+            {"id": r.id, "name": r.name, "color": r.color, "icon": r.icon, "created_at": r.created_at}
+            for r in rows
+        ])
+
+    def get(self, user_id: int, fresh: bool = False) -> UserCategories:
+        """A user's categories; fresh=True skips the cache (still refreshing it)"""
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached and not fresh and time.monotonic() - cached[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+
+        categories = self._load(user_id)
+        with self._lock:
+            # Don't cache a load that raced with an invalidate
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (categories, time.monotonic(), generation)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.cache_size:
+                    self._entries.popitem(last=False)
+        return categories
+
+    def names(self, user_id: int, fresh: bool = False) -> List[str]:
+        return self.get(user_id, fresh).names
+
+    def invalidate(self, user_id: int):
+        """Call after committing any change to a user's categories"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached_users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+category_directory = CategoryDirectory()
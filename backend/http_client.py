@@ -0,0 +1,163 @@
+"""
+Shared outbound HTTP client (Splitwise, Brevo)
+
+One httpx.Client per host, kept for the life of the process, so repeated
+calls reuse warm keep-alive connections instead of paying a TCP+TLS
+handshake each time. HTTP/2 is used when the optional `h2` package is
+installed. Every request gets default connect/read timeouts.
+
+Idempotent requests (GET/HEAD/OPTIONS/PUT/DELETE) are retried with
+full-jitter exponential backoff on transport errors and 502/503/504.
+Other requests are only retried when the connection couldn't be opened,
+i.e. when they can't have reached the server. 429s are returned to the
+caller, which knows the API's rate-limit rules (see splitwise_sync.py).
+
+Per-host request counts, errors, retries and p50/p95 latency are exposed
+through stats() (GET /api/admin/http-stats).
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables http2=True in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_MAX = 5.0
+HTTP_LATENCY_WINDOW = 500
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses = {}
+        self.latencies = deque(maxlen=HTTP_LATENCY_WINDOW)
+
+    def to_dict(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+        }
+
+
+class OutboundHTTP:
+    def __init__(self, max_retries: int = HTTP_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._clients = {}  # "scheme://host" -> httpx.Client
+        self._stats = {}  # host -> HostStats
+        self._lock = threading.Lock()
+
+    def _client(self, origin: str) -> httpx.Client:
+        with self._lock:
+            client = self._clients.get(origin)
+            if client is None:
+                client = httpx.Client(
+                    http2=HTTP2_AVAILABLE,
+                    follow_redirects=True,  # as requests did
+                    timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                    ),
+                )
+                self._clients[origin] = client
+            return client
+
+    def _record(self, host: str, latency: float, status: Optional[int] = None, retry: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.latencies.append(latency)
+            if status is None:
+                stats.errors += 1
+            else:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if retry:
+                stats.retries += 1
+
+    def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request on the host's pooled client. `retry` defaults to True for
+        idempotent methods; non-idempotent ones are still retried on connect errors.
+        """
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        parts = urlsplit(url)
+        client = self._client(f"{parts.scheme}://{parts.netloc}")
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                can_retry = attempt < self.max_retries and (retry or isinstance(e, httpx.ConnectError))
+                self._record(parts.netloc, time.monotonic() - started, retry=can_retry)
+                if not can_retry:
+                    raise
+            else:
+                can_retry = retry and attempt < self.max_retries and response.status_code in RETRY_STATUSES
+                self._record(parts.netloc, time.monotonic() - started, response.status_code, retry=can_retry)
+                if not can_retry:
+                    return response
+                response.close()
+
+            attempt += 1
+            time.sleep(random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "http2": HTTP2_AVAILABLE,
+                "pools": len(self._clients),
+                "hosts": {host: stats.to_dict() for host, stats in self._stats.items()},
+            }
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+
+http = OutboundHTTP()
@@ -0,0 +1,167 @@
+"""
+Single-pass multi-keyword matcher
+
+An Aho-Corasick automaton over all keyword lists at once, so categorising a
+description or SMS is one scan of the text instead of one `in` test per
+keyword per category. Categories are listed in priority order; when several
+match, the earliest one wins (same as the old if/elif chains).
+
+Keyword lists can be replaced with a JSON file ({"Food": ["pizza", ...], ...})
+pointed to by KEYWORD_CONFIG_PATH. Built automatons are cached, so nothing
+is rebuilt per call.
+"""
+
+import json
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+# Used by map_keywords() for free-text expense descriptions
+DESCRIPTION_KEYWORDS = {
+    "Food": ["food", "restaurant", "dinner", "lunch", "pizza", "coffee"],
+    "Transport": ["uber", "ola", "taxi", "train", "flight", "bus", "travel"],
+    "Bills": ["rent", "electricity", "wifi", "bill"],
+    "Shopping": ["amazon", "shopping", "clothes", "shirt", "jeans"],
+}
+
+# Used by the SMS parser for merchant text
+SMS_KEYWORDS = {
+    "Food": ["restaurant", "cafe", "starbucks", "mcdonald", "food", "swiggy", "zomato", "dining"],
+    "Transport": ["uber", "ola", "fuel", "petrol", "metro", "taxi", "rapido"],
+    "Shopping": ["amazon", "flipkart", "mall", "store", "shop", "myntra"],
+    "Bills": ["electricity", "water", "gas", "mobile", "recharge", "jio", "airtel"],
+    "Entertainment": ["movie", "netflix", "spotify", "hotstar", "pvr", "cinema"],
+}
+
+# Debit markers are checked first, as before
+TRANSACTION_TYPE_KEYWORDS = {
+    "debit": ["debited", "debit", "paid", "purchase", "withdrawn"],
+    "credit": ["credited", "credit", "received", "deposit"],
+}
+
+
+def _load_config():
+    path = os.getenv("KEYWORD_CONFIG_PATH")
+    if not path:
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        for name, target in (("description", DESCRIPTION_KEYWORDS), ("sms", SMS_KEYWORDS)):
+            if name in config:
+                target.clear()
+                target.update(config[name])
+    except Exception as e:
+        print(f"Keyword config load failed ({path}): {e}")
+
+
+_load_config()
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton mapping keyword hits to labels by priority"""
+
+    def __init__(self, groups: dict):
+        self.labels = list(groups)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]  # label indexes of keywords ending exactly here
+        self._best = [None]  # lowest (highest-priority) label index ending here, incl. suffixes
+
+        for index, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                self._insert(keyword.lower(), index)
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, index: int):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._best.append(None)
+            state = nxt
+        self._out[state].add(index)
+        if self._best[state] is None or index < self._best[state]:
+            self._best[state] = index
+
+    def _build_failure_links(self):
+        # BFS order guarantees a state's failure target is finished first,
+        # so each state can copy its missing transitions from there (full DFA)
+        self._delta = [dict(edges) for edges in self._goto]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = self._fail[state]
+            for ch, nxt in self._delta[fallback].items():
+                self._delta[state].setdefault(ch, nxt)
+            inherited = self._best[fallback]
+            if inherited is not None and (self._best[state] is None or inherited < self._best[state]):
+                self._best[state] = inherited
+
+            for ch, nxt in self._goto[state].items():
+                self._fail[nxt] = self._delta[fallback].get(ch, 0)
+                queue.append(nxt)
+
+    def find_all(self, text: str) -> set:
+        """Every label with at least one keyword in `text`"""
+        hits = set()
+        delta, fail, out = self._delta, self._fail, self._out
+        state = 0
+        for ch in (text or "").lower():
+            state = delta[state].get(ch, 0)
+            # Walk the suffix chain so every keyword ending here is reported
+            probe = state
+            while probe:
+                for index in out[probe]:
+                    hits.add(self.labels[index])
+                probe = fail[probe]
+        return hits
+
+    def match(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """Highest-priority label with a keyword in `text`"""
+        delta, best = self._delta, self._best
+        state = 0
+        found = None
+        for ch in (text or "").lower():
+            state = delta[state].get(ch, 0)
+            index = best[state]
+            if index is not None and (found is None or index < found):
+                found = index
+                if found == 0:
+                    break
+        return self.labels[found] if found is not None else default
+
+
+@lru_cache(maxsize=256)
+def _build(frozen_groups: tuple) -> KeywordMatcher:
+    return KeywordMatcher({label: list(keywords) for label, keywords in frozen_groups})
+
+
+def _freeze(groups: dict) -> tuple:
+    return tuple((label, tuple(keywords)) for label, keywords in groups.items())
+
+
+# Built once at import for the lists the app uses
+_PREBUILT = {
+    id(keywords): _build(_freeze(keywords))
+    for keywords in (DESCRIPTION_KEYWORDS, SMS_KEYWORDS, TRANSACTION_TYPE_KEYWORDS)
+}
+
+
+def get_matcher(base: dict) -> KeywordMatcher:
+    """Cached matcher for `base` keywords; the built automaton is reused across calls"""
+    if id(base) in _PREBUILT:
+        return _PREBUILT[id(base)]
+    return _build(_freeze(base))
+
+
+def match_category(text: str, base: dict, default: str = "Other") -> str:
+    return get_matcher(base).match(text, default)
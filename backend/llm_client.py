@@ -0,0 +1,320 @@
+"""
+Shared non-blocking Anthropic client
+
+One AsyncAnthropic client with a pooled keep-alive HTTP transport, explicit
+timeouts and a concurrency cap, used by the SMS parser, voice parser and
+the Splitwise categorizer. The client lives on its own event loop thread so both
+async routes (await create_message(...)) and sync code running in the
+threadpool (create_message_sync(...)) share the same connection pool without
+ever blocking the server's event loop.
+
+Every call also goes through a circuit breaker and a per-request deadline.
+After LLM_BREAKER_FAILURES consecutive failures, or when p95 latency over the
+recent window exceeds LLM_BREAKER_P95, the breaker opens and calls fail
+immediately with LLMUnavailableError so callers drop to their local parsers.
+After LLM_BREAKER_COOLDOWN seconds one probe call is let through (half-open);
+its outcome closes or re-opens the breaker.
+
+Callers tag calls with route= (call site) and user_id=; every call is
+recorded in llm_usage.py with its tokens, latency and outcome.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import anthropic
+import httpx
+
+import llm_usage
+
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "10"))  # seconds upstream, incl. retries
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))  # seconds waiting for a concurrency slot
+
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_P95 = float(os.getenv("LLM_BREAKER_P95", "8"))  # seconds
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "100"))
+LLM_LATENCY_MIN_SAMPLES = 20
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[anthropic.AsyncAnthropic] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_init_lock = threading.Lock()
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised without calling upstream when the circuit breaker is open"""
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 p95_threshold: float = LLM_BREAKER_P95,
+                 cooldown: float = LLM_BREAKER_COOLDOWN,
+                 window: int = LLM_LATENCY_WINDOW):
+        self.failure_threshold = failure_threshold
+        self.p95_threshold = p95_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_reason = None
+        self.latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+                         "short_circuited": 0, "opened": 0}
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now (claims the probe slot when half-open)"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.counters["short_circuited"] += 1
+            return False
+
+    def available(self) -> bool:
+        """Non-claiming check for callers deciding whether to even build a prompt"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not (self.state == self.HALF_OPEN and self._probe_in_flight)
+
+    def _open(self, reason: str):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.open_reason = reason
+        self.counters["opened"] += 1
+        print(f"LLM circuit breaker opened: {reason}")
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["successes"] += 1
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                self.state = self.CLOSED
+                self.latencies.clear()
+                return
+            if len(self.latencies) >= LLM_LATENCY_MIN_SAMPLES:
+                p95 = _percentile(self.latencies, 95)
+                if p95 > self.p95_threshold:
+                    self._open(f"p95 latency {p95:.1f}s > {self.p95_threshold}s")
+                    self.latencies.clear()
+
+    def record_failure(self, latency: float, timed_out: bool = False):
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += 1
+            if timed_out:
+                self.counters["timeouts"] += 1
+            self.latencies.append(latency)
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                self._open("probe failed")
+            elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open(f"{self.consecutive_failures} consecutive failures")
+
+    def release(self):
+        """Give back a claimed half-open probe slot without an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self.latencies)
+            return {
+                "state": self.state,
+                "open_reason": self.open_reason if self.state != self.CLOSED else None,
+                "consecutive_failures": self.consecutive_failures,
+                "latency_p50": _percentile(latencies, 50),
+                "latency_p95": _percentile(latencies, 95),
+                "latency_p99": _percentile(latencies, 99),
+                "latency_samples": len(latencies),
+                **self.counters,
+            }
+
+
+breaker = CircuitBreaker()
+
+
+def is_configured() -> bool:
+    return bool(ANTHROPIC_API_KEY)
+
+
+def is_available() -> bool:
+    """Configured and not short-circuited by the breaker"""
+    return is_configured() and breaker.available()
+
+
+def stats() -> dict:
+    return {
+        "configured": is_configured(),
+        "deadline": LLM_DEADLINE,
+        "breaker": breaker.stats(),
+    }
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _ensure_started() -> asyncio.AbstractEventLoop:
+    global _loop, _client, _semaphore
+    if _loop is not None:
+        return _loop
+
+    with _init_lock:
+        if _loop is not None:
+            return _loop
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=_run_loop, args=(loop,), name="llm-client", daemon=True).start()
+
+        async def _create():
+            client = anthropic.AsyncAnthropic(
+                api_key=ANTHROPIC_API_KEY,
+                max_retries=LLM_MAX_RETRIES,
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    ),
+                ),
+            )
+            return client, asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+        _client, _semaphore = asyncio.run_coroutine_threadsafe(_create(), loop).result()
+        _loop = loop
+        return _loop
+
+
+async def _create_message(deadline: float, route: str, user_id: Optional[int], **kwargs):
+    # Waiting for our own concurrency cap is local congestion, not upstream
+    # health: it is bounded separately and kept out of the deadline, the
+    # breaker and the recorded latency.
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        breaker.release()
+        llm_usage.usage.record(route, llm_usage.SHORT_CIRCUITED, kwargs.get("model"), user_id,
+                               fallback_reason="queue_full")
+        raise LLMUnavailableError(f"No LLM slot free within {LLM_QUEUE_TIMEOUT:.1f}s")
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    try:
+        return await _call_upstream(deadline, route, user_id, **kwargs)
+    finally:
+        _semaphore.release()
+
+
+async def _call_upstream(deadline: float, route: str, user_id: Optional[int], **kwargs):
+    model = kwargs.get("model")
+    started = time.monotonic()
+    try:
+        message = await asyncio.wait_for(_client.messages.create(**kwargs), timeout=deadline)
+    except asyncio.TimeoutError:
+        latency = time.monotonic() - started
+        breaker.record_failure(latency, timed_out=True)
+        llm_usage.usage.record(route, llm_usage.TIMEOUT, model, user_id, latency=latency)
+        raise TimeoutError(f"LLM call exceeded {deadline:.1f}s deadline")
+    except anthropic.BadRequestError:
+        # Our request was wrong; says nothing about upstream health
+        breaker.release()
+        llm_usage.usage.record(route, llm_usage.ERROR, model, user_id,
+                               latency=time.monotonic() - started, fallback_reason="bad_request")
+        raise
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        latency = time.monotonic() - started
+        breaker.record_failure(latency)
+        llm_usage.usage.record(route, llm_usage.ERROR, model, user_id,
+                               latency=latency, fallback_reason=type(e).__name__)
+        raise
+
+    latency = time.monotonic() - started
+    breaker.record_success(latency)
+    usage = getattr(message, "usage", None)
+    llm_usage.usage.record(
+        route, llm_usage.OK, model, user_id,
+        input_tokens=getattr(usage, "input_tokens", 0),
+        output_tokens=getattr(usage, "output_tokens", 0),
+        latency=latency,
+    )
+    return message
+
+
+def _start(deadline: Optional[float], route: Optional[str], user_id: Optional[int],
+           kwargs: dict) -> concurrent.futures.Future:
+    route = route or "unknown"
+    if not is_configured():
+        raise RuntimeError("ANTHROPIC_API_KEY not set")
+    if not breaker.allow():
+        llm_usage.usage.record(route, llm_usage.SHORT_CIRCUITED, kwargs.get("model"), user_id,
+                               fallback_reason="breaker_open")
+        raise LLMUnavailableError("LLM circuit breaker is open")
+    try:
+        loop = _ensure_started()
+    except BaseException:
+        breaker.release()
+        raise
+    return asyncio.run_coroutine_threadsafe(
+        _create_message(deadline or LLM_DEADLINE, route, user_id, **kwargs), loop
+    )
+
+
+async def create_message(deadline: Optional[float] = None, route: Optional[str] = None,
+                         user_id: Optional[int] = None, **kwargs):
+    """messages.create on the shared client, awaitable from any event loop"""
+    return await asyncio.wrap_future(_start(deadline, route, user_id, kwargs))
+
+
+def submit_message(deadline: Optional[float] = None, route: Optional[str] = None,
+                   user_id: Optional[int] = None, **kwargs) -> concurrent.futures.Future:
+    """Start messages.create on the shared client and return a Future right away"""
+    return _start(deadline, route, user_id, kwargs)
+
+
+def sync_wait_timeout(deadline: Optional[float] = None) -> float:
+    # Queueing and the deadline are enforced on the client loop; this is only a safety margin
+    return LLM_QUEUE_TIMEOUT + (deadline or LLM_DEADLINE) + 1
+
+
+def create_message_sync(deadline: Optional[float] = None, route: Optional[str] = None,
+                        user_id: Optional[int] = None, **kwargs):
+    """messages.create on the shared client, for sync code in worker threads"""
+    future = submit_message(deadline, route, user_id, **kwargs)
+    return future.result(timeout=sync_wait_timeout(deadline))
@@ -0,0 +1,175 @@
+"""
+LLM usage and latency accounting
+
+Every call through llm_client is recorded here with its route (call site),
+model, user, token usage, latency and outcome. Callers also record when they
+fall back to local results (and why), and when a local tier answered without
+calling the LLM at all.
+
+Recent records live in an in-process ring buffer (for p50/p95/p99 per route);
+hourly aggregates are flushed to the llm_usage_rollups table every
+LLM_USAGE_FLUSH_SECONDS so totals survive restarts and cover all workers.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional
+
+LLM_USAGE_BUFFER_SIZE = int(os.getenv("LLM_USAGE_BUFFER_SIZE", "2000"))
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv("LLM_USAGE_FLUSH_SECONDS", "60"))
+
+# Outcomes
+OK, ERROR, TIMEOUT, SHORT_CIRCUITED = "ok", "error", "timeout", "short_circuited"
+FALLBACK = "fallback"  # LLM answered (or failed) and the caller used a local result
+LOCAL = "local"  # a local tier answered and the LLM was never called
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class UsageRecorder:
+    def __init__(self, buffer_size: int = LLM_USAGE_BUFFER_SIZE,
+                 flush_interval: float = LLM_USAGE_FLUSH_SECONDS):
+        self.buffer = deque(maxlen=buffer_size)
+        self.flush_interval = flush_interval
+        self._rollup = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])  # key -> [calls, in, out, latency_sum, latency_max]
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+
+    def record(self, route: str, outcome: str, model: Optional[str] = None,
+               user_id: Optional[int] = None, input_tokens: int = 0, output_tokens: int = 0,
+               latency: Optional[float] = None, fallback_reason: Optional[str] = None,
+               count: int = 1):
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "route": route or "unknown",
+            "model": model,
+            "user_id": user_id,
+            "input_tokens": input_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "latency": latency,
+            "outcome": outcome,
+            "fallback_reason": fallback_reason,
+            "count": count,
+        }
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        key = (hour, entry["route"], model or "", outcome, fallback_reason or "")
+
+        with self._lock:
+            self.buffer.append(entry)
+            agg = self._rollup[key]
+            agg[0] += count
+            agg[1] += entry["input_tokens"]
+            agg[2] += entry["output_tokens"]
+            if latency is not None:
+                agg[3] += latency
+                agg[4] = max(agg[4], latency)
+            due = not self._flushing and time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._flushing = True
+
+        if due:
+            threading.Thread(target=self.flush, name="llm-usage-flush", daemon=True).start()
+
+    def record_fallback(self, route: str, reason: str, user_id: Optional[int] = None, count: int = 1):
+        self.record(route, FALLBACK, user_id=user_id, fallback_reason=reason, count=count)
+
+    def record_local(self, route: str, reason: str, user_id: Optional[int] = None, count: int = 1):
+        self.record(route, LOCAL, user_id=user_id, fallback_reason=reason, count=count)
+
+    def summary(self) -> dict:
+        """Per-route counters and latency percentiles over the ring buffer"""
+        with self._lock:
+            entries = list(self.buffer)
+
+        routes = {}
+        for entry in entries:
+            route = routes.setdefault(entry["route"], {
+                "calls": 0, "input_tokens": 0, "output_tokens": 0,
+                "outcomes": defaultdict(int), "fallback_reasons": defaultdict(int), "_latencies": [],
+            })
+            route["outcomes"][entry["outcome"]] += entry["count"]
+            if entry["fallback_reason"]:
+                route["fallback_reasons"][entry["fallback_reason"]] += entry["count"]
+            if entry["outcome"] in (FALLBACK, LOCAL, SHORT_CIRCUITED):
+                continue
+            route["calls"] += 1
+            route["input_tokens"] += entry["input_tokens"]
+            route["output_tokens"] += entry["output_tokens"]
+            if entry["latency"] is not None:
+                route["_latencies"].append(entry["latency"])
+
+        for route in routes.values():
+            latencies = route.pop("_latencies")
+            route["latency_p50"] = _percentile(latencies, 50)
+            route["latency_p95"] = _percentile(latencies, 95)
+            route["latency_p99"] = _percentile(latencies, 99)
+            route["outcomes"] = dict(route["outcomes"])
+            route["fallback_reasons"] = dict(route["fallback_reasons"])
+
+        return {"window": len(entries), "routes": routes}
+
+    def flush(self):
+        """Add pending hourly aggregates to llm_usage_rollups"""
+        with self._lock:
+            pending, self._rollup = self._rollup, defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+            self._last_flush = time.monotonic()
+
+        try:
+            if pending:
+                self._write(pending)
+        except Exception as e:
+            print(f"LLM usage flush failed: {e}")
+            with self._lock:
+                # Keep the counts for the next attempt
+                for key, agg in pending.items():
+                    merged = self._rollup[key]
+                    merged[0] += agg[0]
+                    merged[1] += agg[1]
+                    merged[2] += agg[2]
+                    merged[3] += agg[3]
+                    merged[4] = max(merged[4], agg[4])
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def _write(self, pending: dict):
+        from main import SessionLocal, LLMUsageRollup
+        db = SessionLocal()
+        try:
+            for (hour, route, model, outcome, reason), (calls, tokens_in, tokens_out, latency_sum, latency_max) in pending.items():
+                row = db.query(LLMUsageRollup).filter(
+                    LLMUsageRollup.hour == hour,
+                    LLMUsageRollup.route == route,
+                    LLMUsageRollup.model == model,
+                    LLMUsageRollup.outcome == outcome,
+                    LLMUsageRollup.fallback_reason == reason,
+                ).with_for_update().first()
+                if row is None:
+                    row = LLMUsageRollup(
+                        hour=hour, route=route, model=model, outcome=outcome, fallback_reason=reason,
+                        calls=0, input_tokens=0, output_tokens=0, latency_total=0.0, latency_max=0.0,
+                    )
+                    db.add(row)
+                row.calls += calls
+                row.input_tokens += tokens_in
+                row.output_tokens += tokens_out
+                row.latency_total += latency_sum
+                row.latency_max = max(row.latency_max or 0.0, latency_max)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+usage = UsageRecorder()
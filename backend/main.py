@@ -2,14 +2,17 @@ from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, ForeignKey, func, BigInteger, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, ForeignKey, func, BigInteger, Boolean, LargeBinary
+from sqlalchemy import UniqueConstraint, Index
+from sqlalchemy import inspect, text, insert, select, cast
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker, Session, deferred
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, date as date_type
-from typing import Optional, List
+from typing import Optional, List, Dict
 from dotenv import load_dotenv
 from secrets import token_urlsafe
 from urllib.parse import quote
@@ -20,6 +23,7 @@ from datetime import date
 
 import hashlib
 import os
+import threading
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -31,7 +35,7 @@ import csv
 load_dotenv()
 
 from fastapi import APIRouter
-import requests
+from http_client import http as outbound_http
 from urllib.parse import urlencode
 
 # Import SMS parser router (after load_dotenv!)
@@ -40,6 +44,21 @@ from sms_parser_api import router as sms_router
 # Import voice transaction router (after load_dotenv!)
 from voice_transaction_api import router as voice_router
 
+from keyword_matcher import DESCRIPTION_KEYWORDS, match_category
+import llm_client
+from llm_usage import usage as llm_usage
+from ai_categorizer import categorize_many
+from merchant_classifier import merchant_classifier
+from merchant_index import merchant_registry
+from category_directory import category_directory
+from splitwise_sync import SPLITWISE_MAX_RETRIES, splitwise_throttle, sync_all_jobs
+from splitwise_tokens import SplitwiseAuthError, splitwise_tokens
+import splitwise_payloads
+from scheduler import SCHEDULER_ENABLED, scheduler
+from sms_ingest_queue import SMS_INGEST_ASYNC, sms_ingest_queue
+from sms_parse_cache import sms_parse_cache
+from sms_templates import template_library
+
 import json
 
 from fastapi.responses import RedirectResponse
@@ -59,6 +78,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "3650
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./expense_tracker.db")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 API_BASE = os.getenv("API_BASE_URL", "https://webapp-expense.onrender.com")
+# Usernames allowed to use /api/admin/* (comma-separated)
+ADMIN_USERNAMES = {u.strip() for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u.strip()}
 
 
 SPLITWISE_CLIENT_ID = os.getenv("SPLITWISE_CLIENT_ID")
@@ -68,6 +89,13 @@ SPLITWISE_REDIRECT_URI = os.getenv(
     f"{API_BASE}/api/splitwise/callback"
 )
 SPLITWISE_BASE_URL = "https://secure.splitwise.com"
+# get_expenses page size (Splitwise defaults to 20 when no limit is sent)
+SPLITWISE_PAGE_SIZE = int(os.getenv("SPLITWISE_PAGE_SIZE", "200"))
+SPLITWISE_REQUEST_TIMEOUT = float(os.getenv("SPLITWISE_REQUEST_TIMEOUT", "30"))
+# IN-list / multi-row INSERT batch size for Splitwise sync
+SPLITWISE_ID_CHUNK_SIZE = 500
+# Re-read this much before the cursor to absorb clock skew; updates are idempotent
+SPLITWISE_SYNC_OVERLAP = timedelta(minutes=int(os.getenv("SPLITWISE_SYNC_OVERLAP_MINUTES", "5")))
 
 
 # 📧 Email Configuration
@@ -170,7 +198,16 @@ class PendingTransaction(Base):
      # 🔹 Splitwise-specific
     splitwise_expense_id = Column(BigInteger, nullable=True, index=True)
     splitwise_group_name = Column(String, nullable=True)
-    splitwise_raw_json = Column(String, nullable=True)  # optional, for debugging
+    # Legacy: raw payloads now live compressed in splitwise_payloads (splitwise_payloads.py)
+    splitwise_raw_json = deferred(Column(String, nullable=True))
+    merchant_id = Column(Integer, nullable=True, index=True)  # see merchant_index.py
+    source_sms = Column(String, nullable=True)  # raw SMS while status == "parsing" (sms_ingest_queue.py)
+    sms_claimed_at = Column(DateTime, nullable=True)  # last time an ingest worker took the "parsing" row
+
+    # One pending row per Splitwise expense, so concurrent syncs can't double-import
+    __table_args__ = (
+        Index("uq_pending_transactions_user_splitwise", "user_id", "splitwise_expense_id", unique=True),
+    )
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -181,6 +218,10 @@ class Expense(Base):
     description = Column(String)
     date = Column(Date)
     type = Column(String)
+    # 🔹 Import dedup: sha256 of (user, date, amount, description, type)
+    import_fingerprint = Column(String(64), nullable=True, index=True)
+    # 🔹 Canonical merchant (see merchant_index.py)
+    merchant_id = Column(Integer, nullable=True, index=True)
 
 # ✅ NEW: Category Model
 class Category(Base):
@@ -264,6 +305,12 @@ class PendingTransactionCreate(BaseModel):
     date: Optional[str] = None
     type: Optional[str] = None
 
+class PendingBulkAction(BaseModel):
+    action: str  # "approve", "reject" or "edit_approve"
+    tokens: List[str]
+    # edit_approve: field changes per token, applied before approving
+    edits: Optional[Dict[str, PendingTransactionCreate]] = None
+
 # ✅ NEW: Category Pydantic Models
 class CategoryCreate(BaseModel):
     name: str
@@ -367,6 +414,197 @@ class CategoryMigration(Base):
     affected_count = Column(Integer, nullable=False)
     migrated_at = Column(DateTime, default=datetime.utcnow)
 
+class SmsParseTemplate(Base):
+    """Persisted SMS template -> parse mapping (see sms_parse_cache.py)"""
+    __tablename__ = "sms_parse_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    signature_hash = Column(String(64), nullable=False, unique=True, index=True)
+    signature = Column(String, nullable=False)
+    payload = Column(String, nullable=False)  # JSON
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+
+class SmsLearnedTemplate(Base):
+    """Learned per-sender SMS extraction regex (see sms_templates.py)"""
+    __tablename__ = "sms_learned_templates"
+    __table_args__ = (UniqueConstraint("sender", "pattern", name="uq_sms_learned_templates_sender_pattern"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    sender = Column(String(64), nullable=False, index=True)
+    pattern = Column(String, nullable=False)
+    transaction_type = Column(String(10), nullable=False, default="debit")
+    verified_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    promoted = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Merchant(Base):
+    """Canonical merchant per user (see merchant_index.py)"""
+    __tablename__ = "merchants"
+    __table_args__ = (UniqueConstraint("user_id", "normalized_key", name="uq_merchants_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    normalized_key = Column(String(120), nullable=False)
+    canonical_name = Column(String(120), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LLMUsageRollup(Base):
+    """Hourly LLM usage aggregates per call site (see llm_usage.py)"""
+    __tablename__ = "llm_usage_rollups"
+    __table_args__ = (
+        UniqueConstraint("hour", "route", "model", "outcome", "fallback_reason", name="uq_llm_usage_rollup"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    hour = Column(DateTime, nullable=False, index=True)
+    route = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False, default="")
+    outcome = Column(String(20), nullable=False)
+    fallback_reason = Column(String(100), nullable=False, default="")
+    calls = Column(Integer, default=0)
+    input_tokens = Column(BigInteger, default=0)
+    output_tokens = Column(BigInteger, default=0)
+    latency_total = Column(Float, default=0.0)  # seconds
+    latency_max = Column(Float, default=0.0)
+
+class SplitwisePayload(Base):
+    """Raw Splitwise expense JSON, zlib + preset dictionary (see splitwise_payloads.py)"""
+    __tablename__ = "splitwise_payloads"
+
+    pending_id = Column(Integer, ForeignKey("pending_transactions.id", ondelete="CASCADE"), primary_key=True)
+    dict_version = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ScheduledJobRun(Base):
+    """Last-run state and lock lease per scheduled job (see scheduler.py)"""
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String(64), primary_key=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_status = Column(String(20), nullable=True)
+    last_detail = Column(String(500), nullable=True)
+    last_duration = Column(Float, nullable=True)  # seconds
+    last_worker = Column(String(120), nullable=True)
+    run_count = Column(Integer, default=0)
+    locked_by = Column(String(120), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+class SplitwiseSyncJob(Base):
+    """Progress of a Splitwise sync-all job, readable from any worker (see splitwise_sync.py)"""
+    __tablename__ = "splitwise_sync_jobs"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False, default="running", index=True)
+    users = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    imported = Column(Integer, default=0)
+    errors = Column(String, nullable=True)  # JSON {user_id: message}
+    worker = Column(String(120), nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class MerchantModelRecord(Base):
+    """Per-user merchant -> category model (see merchant_classifier.py)"""
+    __tablename__ = "merchant_models"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    payload = Column(LargeBinary, nullable=False)  # np.savez_compressed
+    rows = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# ==========================================
+# SCHEMA UPGRADES
+# ==========================================
+
+# Columns added after the original Supabase schema was created.
+# (table, column, DDL type, indexed)
+SCHEMA_COLUMN_UPGRADES = [
+    ("expenses", "import_fingerprint", "VARCHAR(64)", True),
+    ("expenses", "merchant_id", "INTEGER", True),
+    ("pending_transactions", "merchant_id", "INTEGER", True),
+    ("pending_transactions", "source_sms", "TEXT", False),
+    ("pending_transactions", "sms_claimed_at", "TIMESTAMP", False),
+]
+
+# Indexes added after the original Supabase schema was created.
+# (index name, table, columns, unique)
+SCHEMA_INDEX_UPGRADES = [
+    ("uq_pending_transactions_user_splitwise", "pending_transactions", "user_id, splitwise_expense_id", True),
+    ("uq_sms_learned_templates_sender_pattern", "sms_learned_templates", "sender, pattern", True),
+]
+
+# Unique indexes whose table may already hold duplicates that are safe to drop
+# (the oldest row of each group is kept) before the index is created.
+SCHEMA_INDEX_DEDUPE = {"uq_sms_learned_templates_sender_pattern"}
+
+# Tables added after the original Supabase schema was created.
+SCHEMA_NEW_TABLES = [
+    SmsParseTemplate,
+    SmsLearnedTemplate,
+    Merchant,
+    MerchantModelRecord,
+    LLMUsageRollup,
+    SplitwisePayload,
+    ScheduledJobRun,
+    SplitwiseSyncJob,
+]
+
+def ensure_schema_upgrades():
+    """Add columns/tables introduced after the initial schema (idempotent)"""
+    schema = Base.metadata.schema if engine.dialect.name == "postgresql" else None
+    prefix = f"{schema}." if schema else ""
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table, column, ddl_type, indexed in SCHEMA_COLUMN_UPGRADES:
+            if not inspector.has_table(table, schema=schema):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table, schema=schema)}
+            if column in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {prefix}{table} ADD COLUMN {column} {ddl_type}"))
+            if indexed:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {prefix}{table} ({column})"
+                ))
+            print(f"🔧 Added column {table}.{column}")
+
+    for name, table, columns, unique in SCHEMA_INDEX_UPGRADES:
+        if not inspector.has_table(table, schema=schema):
+            continue
+        if name in {ix["name"] for ix in inspector.get_indexes(table, schema=schema)}:
+            continue
+        try:
+            with engine.begin() as conn:
+                if name in SCHEMA_INDEX_DEDUPE:
+                    conn.execute(text(
+                        f"DELETE FROM {prefix}{table} WHERE id NOT IN "
+                        f"(SELECT MIN(id) FROM {prefix}{table} GROUP BY {columns})"
+                    ))
+                conn.execute(text(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {prefix}{table} ({columns})"
+                ))
+            print(f"🔧 Added index {name}")
+        except Exception as e:
+            # e.g. existing duplicate rows; the app still works without it
+            print(f"⚠️  Could not create index {name}: {e}")
+
+    if SCHEMA_NEW_TABLES:
+        Base.metadata.create_all(
+            bind=engine,
+            tables=[model.__table__ for model in SCHEMA_NEW_TABLES],
+            checkfirst=True,
+        )
+
 # ==========================================
 # APP INITIALIZATION
 # ==========================================
@@ -375,6 +613,57 @@ app = FastAPI(title="Expense Tracker API", version="3.0.0")
 app.include_router(sms_router)
 app.include_router(voice_router)
 
+# ==========================================
+# SCHEDULED JOBS (see scheduler.py)
+# ==========================================
+
+SPLITWISE_SYNC_INTERVAL = timedelta(minutes=int(os.getenv("SPLITWISE_SYNC_INTERVAL_MINUTES", "60")))
+TOKEN_CLEANUP_INTERVAL = timedelta(hours=int(os.getenv("TOKEN_CLEANUP_INTERVAL_HOURS", "24")))
+
+def scheduled_splitwise_sync() -> str:
+    """Sync every connected user (same job as /api/splitwise/sync-all) and wait for it"""
+    job = sync_all_jobs.start()
+    result = sync_all_jobs.wait(job["job_id"], SPLITWISE_SYNC_INTERVAL.total_seconds()) or job
+    return f"{result['done']}/{result['users']} users, {result['imported']} imported, {result['failed']} failed"
+
+def cleanup_expired_tokens() -> str:
+    """Delete password reset tokens that are used or expired for more than a day"""
+    cutoff = datetime.utcnow() - timedelta(days=1)
+    db = SessionLocal()
+    try:
+        deleted = db.query(PasswordResetToken).filter(
+            (PasswordResetToken.expires_at < cutoff)
+            | ((PasswordResetToken.used == 1) & (PasswordResetToken.created_at < cutoff))
+        ).delete(synchronize_session=False)
+        db.commit()
+        return f"{deleted} password reset token(s) deleted"
+    finally:
+        db.close()
+
+scheduler.register("splitwise_sync", scheduled_splitwise_sync, SPLITWISE_SYNC_INTERVAL,
+                   lease=SPLITWISE_SYNC_INTERVAL * 2)
+scheduler.register("token_cleanup", cleanup_expired_tokens, TOKEN_CLEANUP_INTERVAL)
+
+def compact_splitwise_payloads():
+    try:
+        moved = splitwise_payloads.compact_legacy()
+        if moved:
+            print(f"🔧 Compacted {moved} Splitwise payload(s) into splitwise_payloads")
+    except Exception as e:
+        logger.exception(f"Splitwise payload compaction failed: {e}")
+
+def preload_sms_parsers():
+    try:
+        loaded = sms_parse_cache.preload()
+        print(f"🔧 Preloaded {loaded} SMS parse template(s)")
+    except Exception as e:
+        logger.exception(f"SMS parse cache preload failed: {e}")
+    try:
+        loaded = template_library.load()
+        print(f"🔧 Loaded {loaded} learned SMS template(s)")
+    except Exception as e:
+        logger.exception(f"SMS template library load failed: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     print("=" * 60)
@@ -386,6 +675,34 @@ async def startup_event():
     print(f"🔑 Secret key configured: {bool(SECRET_KEY and SECRET_KEY != 'your-secret-key-change-in-production-PLEASE')}")
     print("=" * 60)
 
+    try:
+        ensure_schema_upgrades()
+    except Exception as e:
+        logger.exception(f"Schema upgrade failed: {e}")
+
+    # Move raw Splitwise payloads out of pending_transactions (no-op once done)
+    threading.Thread(target=compact_splitwise_payloads, name="splitwise-payload-compact", daemon=True).start()
+    # SMS parse lookups are memory-only; fill the cache and templates without blocking startup
+    threading.Thread(target=preload_sms_parsers, name="sms-parse-preload", daemon=True).start()
+
+    if SMS_INGEST_ASYNC:
+        try:
+            await sms_ingest_queue.start()
+        except Exception as e:
+            logger.exception(f"SMS ingest queue failed to start: {e}")
+
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await scheduler.stop()
+    await sms_ingest_queue.stop()
+    llm_usage.flush()
+    sms_parse_cache.flush()
+    template_library.flush()
+    outbound_http.close()
+
 # CORS Configuration
 allowed_origins = [
     "http://localhost:5173",
@@ -462,6 +779,11 @@ def get_current_user(
     
     return user
 
+def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 def normalize(value: str | None) -> str | None:
     if not value:
         return None
@@ -491,6 +813,7 @@ def create_default_categories(db: Session, user_id: int):
         db.add(category)
     
     db.commit()
+    category_directory.invalidate(user_id)
 
 def send_email(to_email: str, subject: str, html_body: str) -> bool:
     BREVO_API_KEY = os.getenv("BREVO_API_KEY")
@@ -520,7 +843,7 @@ def send_email(to_email: str, subject: str, html_body: str) -> bool:
     }
 
     try:
-        res = requests.post(url, json=payload, headers=headers)
+        res = outbound_http.post(url, json=payload, headers=headers)
 
         if res.status_code >= 400:
             print("❌ Brevo error:", res.text)
@@ -544,6 +867,16 @@ try:
 except ImportError:
     EXCEL_AVAILABLE = False
 
+# Check if pyarrow is available
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+PARQUET_ROW_GROUP_SIZE = 10000
+
 def export_to_csv(expenses: List[Expense]) -> str:
     """Convert expenses to CSV format"""
     output = io.StringIO()
@@ -620,6 +953,124 @@ def export_to_excel(expenses: List[Expense]) -> bytes:
     output.seek(0)
     return output.read()
 
+class _ParquetStreamSink(io.RawIOBase):
+    """Write-only sink that hands written bytes back to a streaming response"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet footers record absolute offsets, so track the total written
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _parquet_schema():
+    return pa.schema([
+        ("date", pa.date32()),
+        ("amount", pa.float64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("description", pa.string()),
+        ("type", pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+def _parquet_row_group(rows: list, schema) -> "pa.Table":
+    return pa.table({
+        "date": pa.array([r.date for r in rows], pa.date32()),
+        "amount": pa.array([r.amount for r in rows], pa.float64()),
+        "category": pa.array([r.category for r in rows], pa.string()).dictionary_encode(),
+        "description": pa.array([r.description for r in rows], pa.string()),
+        "type": pa.array([r.type for r in rows], pa.string()).dictionary_encode(),
+    }, schema=schema)
+
+def stream_parquet_export(user_id: int, filters: list):
+    """
+    Yield a Parquet file in chunks, one zstd-compressed row group at a time.
+    Rows come from a server-side cursor in its own session, so memory stays
+    bounded by the row group size rather than the user's history.
+    """
+    schema = _parquet_schema()
+    sink = _ParquetStreamSink()
+    writer = pq.ParquetWriter(
+        sink,
+        schema,
+        compression="zstd",
+        use_dictionary=["category", "type"],
+    )
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Expense.date, Expense.amount, Expense.category, Expense.description, Expense.type)
+            .filter(Expense.user_id == user_id, *filters)
+            .order_by(Expense.date.desc())
+            .execution_options(stream_results=True)
+            .yield_per(PARQUET_ROW_GROUP_SIZE)
+        )
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(_parquet_row_group(batch, schema))
+                batch = []
+                yield sink.drain()
+
+        if batch:
+            writer.write_table(_parquet_row_group(batch, schema))
+        writer.close()
+        yield sink.drain()
+    finally:
+        db.close()
+
+def parse_parquet_file(file_content: bytes):
+    """
+    Parse a Parquet file lazily: returns an iterator yielding one list of
+    expense dicts per row group, so each group can be inserted in bulk
+    without materializing the whole file. Column checks happen up front.
+    """
+    if not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet support not available")
+
+    parquet_file = pq.ParquetFile(io.BytesIO(file_content))
+    columns = {name.lower(): name for name in parquet_file.schema_arrow.names}
+    required = ['date', 'amount', 'category', 'description', 'type']
+
+    if not all(col in columns for col in required):
+        raise HTTPException(status_code=400, detail="Parquet must have columns: date, amount, category, description, type")
+
+    def row_groups():
+        for i in range(parquet_file.num_row_groups):
+            group = parquet_file.read_row_group(i, columns=[columns[col] for col in required])
+            data = {col: group.column(columns[col]).to_pylist() for col in required}
+            yield [
+                {
+                    'date': exp_date.isoformat() if isinstance(exp_date, date_type) else str(exp_date),
+                    'amount': float(amount),
+                    'category': category,
+                    'description': description,
+                    'type': (exp_type or '').lower()
+                }
+                for exp_date, amount, category, description, exp_type in zip(
+                    data['date'], data['amount'], data['category'], data['description'], data['type']
+                )
+            ]
+
+    return row_groups()
+
 def parse_csv_file(file_content: bytes) -> List[dict]:
     """Parse CSV file and return list of expense dicts"""
     text_content = file_content.decode('utf-8')
@@ -646,6 +1097,64 @@ def normalize(name: str | None) -> str | None:
         return None
     return name.strip().lower()
 
+IMPORT_CHUNK_SIZE = 500
+
+def normalize_description(description: str | None) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for fingerprinting"""
+    cleaned = "".join(ch if ch.isalnum() else " " for ch in (description or "").lower())
+    return " ".join(cleaned.split())
+
+def import_content_key(exp_date: date_type, amount: float, description: str | None, exp_type: str) -> str:
+    """Normalized content of an imported row ("12.5" and "12.50", "Expense" and "expense" match)"""
+    return "|".join([
+        exp_date.isoformat(),
+        f"{float(amount):.2f}",
+        normalize_description(description),
+        (exp_type or "").strip().lower(),
+    ])
+
+def compute_import_fingerprint(user_id: int, content_key: str, occurrence: int = 1) -> str:
+    """
+    Content fingerprint for an imported row, from its import_content_key().
+    `occurrence` separates genuinely repeated rows inside one file (two identical
+    coffees on the same day) so that re-importing the file still skips both.
+    """
+    key = f"{user_id}|{content_key}"
+    if occurrence > 1:
+        key += f"|#{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def insert_imported_rows(db: Session, user_id: int, rows: List[dict]) -> tuple[int, int]:
+    """
+    Bulk insert fingerprinted rows, skipping those already imported.
+    Uses one IN lookup per chunk. Returns (inserted, skipped_duplicates).
+    """
+    inserted = 0
+    skipped = 0
+
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        chunk = rows[start:start + IMPORT_CHUNK_SIZE]
+        fingerprints = [row["import_fingerprint"] for row in chunk]
+
+        existing = {
+            fp for (fp,) in db.query(Expense.import_fingerprint).filter(
+                Expense.user_id == user_id,
+                Expense.import_fingerprint.in_(fingerprints)
+            )
+        }
+
+        new_rows = [row for row in chunk if row["import_fingerprint"] not in existing]
+        skipped += len(chunk) - len(new_rows)
+
+        if new_rows:
+            merchant_ids = merchant_registry.resolve_many(user_id, [row["description"] for row in new_rows])
+            for row, merchant_id in zip(new_rows, merchant_ids):
+                row["merchant_id"] = merchant_id
+            db.bulk_insert_mappings(Expense, new_rows)
+            inserted += len(new_rows)
+
+    return inserted, skipped
+
 
 def parse_excel_file(file_content: bytes) -> List[dict]:
     """Parse Excel file and return list of expense dicts"""
@@ -679,162 +1188,241 @@ def get_splitwise_auth_header(user: User, db: Session) -> dict:
             detail="Splitwise not connected. Please connect your account."
         )
 
+    # Refreshed shortly before expiry (splitwise_tokens.py)
+    try:
+        access_token = splitwise_tokens.access_token(user, db)
+    except SplitwiseAuthError:
+        raise HTTPException(
+            status_code=400,
+            detail="Splitwise authorization expired. Please reconnect your account."
+        )
+
     return {
-        "Authorization": f"Bearer {user.splitwise_access_token}"
+        "Authorization": f"Bearer {access_token}"
     }
 
 
+def map_keywords(text: str) -> str:
+    """Fallback keyword-based categorization (single pass, see keyword_matcher.py)"""
+    return match_category(text or "", DESCRIPTION_KEYWORDS)
+
+def learned_category(user_id: int, description: Optional[str], default: str) -> str:
+    """The user's learned category for this merchant if confident, else `default`"""
+    return merchant_classifier.predict(user_id, description or "") or default
 
-def categorize_with_ai(description: str, user: User, db: Session) -> str:
+def fetch_splitwise_expenses(headers: dict, params: dict, deadline: Optional[float] = None) -> Optional[list]:
     """
-    Use Claude AI to categorize expense based on description and user's categories
+    All get_expenses pages for `params` (limit/offset until exhausted), or None
+    on error. Requests go through the shared rate limiter and back off on 429;
+    TimeoutError once `deadline` (time.monotonic()) has passed and
+    SplitwiseAuthError on 401.
     """
-    ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-    
-    # Get user's categories
-    user_categories = db.query(Category).filter(
-        Category.user_id == user.id
-    ).all()
-    
-    category_names = [cat.name for cat in user_categories]
-    
-    # If no categories or no API key, use fallback
-    if not category_names or not ANTHROPIC_API_KEY:
-        return map_keywords(description)
-    
-    try:
-        import anthropic
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        
-        prompt = f"""You are categorizing an expense. Choose the BEST matching category from the user's list.
-
-Expense Description: "{description}"
-
-User's Categories:
-{', '.join(category_names)}
-
-Instructions:
-- Return ONLY the category name, nothing else
-- Choose the most appropriate category from the list above
-- If nothing matches well, use the most general category available
-- DO NOT return a category not in the list
-
-Category:"""
-
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=50,
-            messages=[{"role": "user", "content": prompt}]
+    expenses = []
+    offset = 0
+    attempt = 0
+    while True:
+        splitwise_throttle.wait(deadline)
+        resp = outbound_http.get(
+            f"{SPLITWISE_BASE_URL}/api/v3.0/get_expenses",
+            params={**params, "limit": SPLITWISE_PAGE_SIZE, "offset": offset},
+            headers=headers,
+            timeout=SPLITWISE_REQUEST_TIMEOUT,
         )
-        
-        category = message.content[0].text.strip()
-        
-        # Validate it's in user's categories
-        if category in category_names:
-            return category
-        
-        # If AI returned invalid category, use fallback
-        return map_keywords(description)
-        
-    except Exception as e:
-        print(f"AI categorization failed: {e}")
-        return map_keywords(description)
+        if resp.status_code == 429 and attempt < SPLITWISE_MAX_RETRIES:
+            attempt += 1
+            splitwise_throttle.backoff(attempt, resp.headers.get("Retry-After"))
+            continue
+        attempt = 0
+        if resp.status_code == 401:
+            raise SplitwiseAuthError(resp.text[:200])
+        if resp.status_code != 200:
+            print("Splitwise error:", resp.text)
+            return None
+
+        page = resp.json().get("expenses", [])
+        expenses.extend(page)
+        if len(page) < SPLITWISE_PAGE_SIZE:
+            return expenses
+        offset += len(page)
+
+def splitwise_owed_share(sw: dict, splitwise_user_id: Optional[int]) -> float:
+    """This user's owed share of a Splitwise expense (0 if they're not part of it)"""
+    for u in sw.get("users", []):
+        if u.get("user_id") == splitwise_user_id:
+            try:
+                return float(u.get("owed_share") or "0")
+            except ValueError:
+                return 0.0
+    return 0.0
 
+def insert_splitwise_pending(db: Session, rows: list) -> dict:
+    """
+    Bulk-insert new Splitwise pending rows, skipping any another sync inserted
+    first (ON CONFLICT DO NOTHING against uq_pending_transactions_user_splitwise).
+    Returns {splitwise_expense_id: pending id} for the rows actually inserted.
+    """
+    if not rows:
+        return {}
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    inserted = {}
+    for i in range(0, len(rows), SPLITWISE_ID_CHUNK_SIZE):
+        stmt = dialect_insert(PendingTransaction.__table__).values(
+            rows[i:i + SPLITWISE_ID_CHUNK_SIZE]
+        ).on_conflict_do_nothing().returning(
+            PendingTransaction.id, PendingTransaction.splitwise_expense_id
+        )
+        for pending_id, sw_id in db.execute(stmt):
+            inserted[sw_id] = pending_id
+    return inserted
 
-def map_keywords(text: str) -> str:
-    """Fallback keyword-based categorization"""
-    t = (text or "").lower()
-    if any(k in t for k in ["food", "restaurant", "dinner", "lunch", "pizza", "coffee"]):
-        return "Food"
-    if any(k in t for k in ["uber", "ola", "taxi", "train", "flight", "bus", "travel"]):
-        return "Transport"
-    if any(k in t for k in ["rent", "electricity", "wifi", "bill"]):
-        return "Bills"
-    if any(k in t for k in ["amazon", "shopping", "clothes", "shirt", "jeans"]):
-        return "Shopping"
-    return "Other"
-
-def sync_splitwise_for_user(db: Session, user: User, mode: str = "today") -> int:
+def sync_splitwise_for_user(db: Session, user: User, mode: str = "incremental",
+                            deadline: Optional[float] = None) -> int:
+    """
+    Import the user's Splitwise expenses as pending transactions.
+
+    mode="incremental" (default; "today" is accepted as an alias) fetches only
+    what changed since user.splitwise_last_sync_at via updated_after, or
+    today's expenses on the very first sync. mode="all" backfills the whole
+    history. Either way every page is fetched, edits and deletions are applied
+    to pending rows the user hasn't acted on yet, and the cursor only advances
+    when the sync completes. `deadline` (time.monotonic()) bounds the fetch.
+    """
     if not user.splitwise_access_token:
         return 0
 
     headers = get_splitwise_auth_header(user, db)
+    sync_started_at = datetime.utcnow()
 
     params = {}
-    if mode == "today":
-        start_of_today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        params["dated_after"] = start_of_today.isoformat()
+    if mode != "all":
+        if user.splitwise_last_sync_at:
+            params["updated_after"] = (user.splitwise_last_sync_at - SPLITWISE_SYNC_OVERLAP).isoformat()
+        else:
+            start_of_today = sync_started_at.replace(hour=0, minute=0, second=0, microsecond=0)
+            params["dated_after"] = start_of_today.isoformat()
 
-    resp = requests.get(
-        f"{SPLITWISE_BASE_URL}/api/v3.0/get_expenses",
-        params=params,
-        headers=headers,
-    )
-    if resp.status_code != 200:
-        print("Splitwise error:", resp.text)
+    try:
+        expenses = fetch_splitwise_expenses(headers, params, deadline=deadline)
+    except SplitwiseAuthError:
+        # Token revoked or expired early: refresh once, then give up until reconnect
+        try:
+            headers = {"Authorization": f"Bearer {splitwise_tokens.rejected(user, db)}"}
+            expenses = fetch_splitwise_expenses(headers, params, deadline=deadline)
+        except SplitwiseAuthError:
+            raise HTTPException(
+                status_code=400,
+                detail="Splitwise authorization expired. Please reconnect your account."
+            )
+    if expenses is None:
         return 0
 
-    data = resp.json()
-    expenses = data.get("expenses", [])
-    imported = 0
-
+    # Offset paging can repeat a row if the list shifts between pages
+    incoming = {}
     for sw in expenses:
-        sw_id = sw.get("id")
-        if sw_id is None:
-            continue
-
-        # Avoid duplicates
-        existing = db.query(PendingTransaction).filter(
+        if sw.get("id") is not None:
+            incoming.setdefault(sw["id"], sw)
+
+    # Known rows for the whole batch in one IN query instead of one SELECT per expense
+    known = {}
+    incoming_ids = list(incoming)
+    for i in range(0, len(incoming_ids), SPLITWISE_ID_CHUNK_SIZE):
+        for pending in db.query(PendingTransaction).filter(
             PendingTransaction.user_id == user.id,
-            PendingTransaction.splitwise_expense_id == sw_id,
-        ).first()
-        if existing:
-            continue
-
-        # Find this user’s record in the expense
-        me = None
-        for u in sw.get("users", []):
-            if u.get("user_id") == user.splitwise_user_id:
-                me = u
-                break
-
-        if not me:
-            continue
-
-        owed_raw = me.get("owed_share") or "0"
-        try:
-            owed = float(owed_raw)
-        except ValueError:
-            owed = 0.0
+            PendingTransaction.splitwise_expense_id.in_(incoming_ids[i:i + SPLITWISE_ID_CHUNK_SIZE]),
+        ):
+            known[pending.splitwise_expense_id] = pending
 
-        if owed <= 0:
-            continue
+    candidates = []
+    payloads = []  # (pending id, raw expense) for splitwise_payloads
+    updated = 0
+    removed = 0
 
+    for sw_id, sw in incoming.items():
+        owed = splitwise_owed_share(sw, user.splitwise_user_id)
         description = sw.get("description") or "Splitwise Expense"
         sw_date = sw.get("date") or datetime.utcnow().isoformat()
         date_str = sw_date.split("T")[0]
 
-        category = categorize_with_ai(description, user, db)
+        existing = known.get(sw_id)
+        if existing:
+            # Approved rows are the user's own expenses now; only touch untouched ones
+            if existing.status != "pending":
+                continue
+            if sw.get("deleted_at") or owed <= 0:
+                existing.status = "deleted"
+                removed += 1
+                continue
+            if description != existing.description:
+                existing.description = description
+                existing.merchant_id = merchant_registry.resolve(user.id, description)
+            existing.amount = owed
+            existing.date = date_str
+            existing.splitwise_group_name = (sw.get("group") or {}).get("name")
+            payloads.append((existing.id, sw))
+            updated += 1
+            continue
 
-        pending = PendingTransaction(
+        if sw.get("deleted_at") or owed <= 0:
+            continue
+
+        candidates.append((sw, sw_id, owed, description, date_str))
+
+    # Categorize everything in a few batched LLM calls instead of one per expense
+    category_names = category_directory.names(user.id)
+    # Repeat merchants come from the user's learned model; only the rest go to the LLM
+    categories = [
+        merchant_classifier.predict(user.id, description, allowed=category_names or None)
+        for _, _, _, description, _ in candidates
+    ]
+    unresolved = [i for i, category in enumerate(categories) if category is None]
+    if len(unresolved) < len(categories):
+        llm_usage.record_local("categorize_batch", "learned_category", user.id,
+                               count=len(categories) - len(unresolved))
+    if unresolved:
+        llm_categories = categorize_many(
+            [candidates[i][3] for i in unresolved],
+            category_names,
+            fallback=map_keywords,
             user_id=user.id,
-            token=token_urlsafe(16),
-            amount=owed,
-            description=description,
-            category=category,
-            date=date_str,
-            type="expense",
-            status="pending",
-            splitwise_expense_id=sw_id,
-            splitwise_group_name=(sw.get("group") or {}).get("name"),
-            splitwise_raw_json=json.dumps(sw),
         )
+        for i, category in zip(unresolved, llm_categories):
+            categories[i] = category
 
-        db.add(pending)
-        imported += 1
+    merchant_ids = merchant_registry.resolve_many(
+        user.id, [description for _, _, _, description, _ in candidates]
+    )
+
+    today = datetime.utcnow().date()
+    rows = [
+        {
+            "user_id": user.id,
+            "token": token_urlsafe(16),
+            "amount": owed,
+            "description": description,
+            "category": category,
+            "date": date_str,
+            "type": "expense",
+            "status": "pending",
+            "created_at": today,
+            "splitwise_expense_id": sw_id,
+            "splitwise_group_name": (sw.get("group") or {}).get("name"),
+            "merchant_id": merchant_id,
+        }
+        for (sw, sw_id, owed, description, date_str), category, merchant_id in zip(candidates, categories, merchant_ids)
+    ]
+    inserted = insert_splitwise_pending(db, rows)
+    imported = len(inserted)
+    payloads.extend((inserted[sw_id], sw) for sw, sw_id, _, _, _ in candidates if sw_id in inserted)
+    splitwise_payloads.store_payloads(db, payloads)
 
-    user.splitwise_last_sync_at = datetime.utcnow()
+    user.splitwise_last_sync_at = sync_started_at
     db.commit()
+    if updated or removed:
+        logger.info(f"Splitwise sync | user={user.id} | imported={imported} updated={updated} removed={removed}")
     return imported
 
 # ==========================================
@@ -876,19 +1464,23 @@ def sync_all_user(
     return {"imported": imported}
 
 @app.api_route("/api/splitwise/sync-all", methods=["GET", "POST"])
-def sync_all(secret: str, db: Session = Depends(get_db)):
+def sync_all(secret: str):
+    """Start (or join) a concurrent sync of every connected user; see splitwise_sync.py"""
     if secret != CRON_SECRET:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    users = db.query(User).filter(User.splitwise_access_token.isnot(None)).all()
-    total = 0
-    for user in users:
-        try:
-            total += sync_splitwise_for_user(db, user, mode="today")
-        except Exception as e:
-            print(f"Sync failed for user {user.id}: {e}")
+    return sync_all_jobs.start()
+
+@app.get("/api/splitwise/sync-all/{job_id}")
+def sync_all_status(job_id: str, secret: str):
+    """Progress of a sync-all job; stored in splitwise_sync_jobs, so any worker can answer"""
+    if secret != CRON_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
 
-    return {"users": len(users), "imported": total}
+    job = sync_all_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
 
 
 @app.post("/api/splitwise/sync")
@@ -901,20 +1493,6 @@ def trigger_splitwise_sync(
 
 CRON_SECRET = os.getenv("CRON_SECRET", "change-me")
 
-@app.post("/api/splitwise/sync-all")
-def sync_splitwise_all(
-    secret: str,
-    db: Session = Depends(get_db)
-):
-    if secret != CRON_SECRET:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    users = db.query(User).filter(User.splitwise_access_token.isnot(None)).all()
-    total = 0
-    for user in users:
-        total += sync_splitwise_for_user(db, user)
-    return {"total_imported": total, "users": len(users)}
-
 
 from urllib.parse import urlencode
 
@@ -960,7 +1538,7 @@ def splitwise_callback(code: str, state: str, db: Session = Depends(get_db)):
     print(f"   Client ID present: {bool(SPLITWISE_CLIENT_ID)}")
     print(f"   Client Secret present: {bool(SPLITWISE_CLIENT_SECRET)}")
     
-    resp = requests.post(token_url, data=data)
+    resp = outbound_http.post(token_url, data=data)
     if resp.status_code != 200:
         error_detail = resp.text
         print(f"❌ Splitwise token exchange failed!")
@@ -992,7 +1570,7 @@ def splitwise_callback(code: str, state: str, db: Session = Depends(get_db)):
 
     # Get current user from Splitwise API so we know their Splitwise user id
     headers = {"Authorization": f"Bearer {user.splitwise_access_token}"}
-    me_resp = requests.get(
+    me_resp = outbound_http.get(
         f"{SPLITWISE_BASE_URL}/api/v3.0/get_current_user",
         headers=headers,
     )
@@ -1196,6 +1774,62 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
 # iOS SHORTCUT SMS PARSER ENDPOINT
 # ==========================================
 
+def fill_pending_from_sms(db: Session, pending: PendingTransaction, parse_result: dict):
+    """
+    Copy an SMS parse into a pending transaction and mark it ready for review.
+    A description already on the row (the dedup tag) is kept as a suffix.
+    """
+    pending.status = "pending"
+    pending.source_sms = None
+    if not parse_result.get("success"):
+        return  # left for the user to fill in
+
+    data = parse_result["data"]
+    merchant = data.get("merchant", "Unknown")
+    pending.amount = data.get("amount")
+    pending.description = f"{merchant} {pending.description}" if pending.description else merchant
+    pending.category = learned_category(pending.user_id, merchant, data.get("category", "Other"))
+    pending.merchant_id = merchant_registry.resolve(pending.user_id, merchant)
+    pending.date = data.get("date", datetime.now().strftime("%Y-%m-%d"))
+    pending.type = "income" if data.get("transaction_type") == "credit" else "expense"
+
+async def ingest_sms(db: Session, user_id: int, sms: str, dedup_tag: Optional[str] = None):
+    """
+    Create the pending transaction for a shortcut SMS. Returns (pending, data).
+    SMS the local parsers handle are filled in right away. Ones that need the
+    LLM are queued in status "parsing" and data is None (see sms_ingest_queue.py).
+    """
+    from sms_parser_api import parse_sms_local, needs_llm, parse_sms_llm
+
+    pending = PendingTransaction(user_id=user_id, token=token_urlsafe(16), description=dedup_tag)
+    local_result = await run_in_threadpool(parse_sms_local, sms)
+
+    if not needs_llm(local_result):
+        parse_result = local_result
+    else:
+        if SMS_INGEST_ASYNC and sms_ingest_queue.running:
+            pending.status = "parsing"
+            pending.source_sms = sms
+            pending.sms_claimed_at = datetime.utcnow()
+            db.add(pending)
+            db.commit()
+            if sms_ingest_queue.enqueue(pending.id):
+                return pending, None
+        # Queue disabled or full: parse inline
+        parse_result = await parse_sms_llm(sms, None, local_result, user_id=user_id)
+
+    if not parse_result.get("success"):
+        if pending.id is not None:
+            db.delete(pending)
+            db.commit()
+        raise HTTPException(status_code=400, detail="Failed to parse SMS")
+
+    fill_pending_from_sms(db, pending, parse_result)
+    if pending.id is None:
+        db.add(pending)
+    db.commit()
+    return pending, parse_result["data"]
+
 @app.get("/api/user/sms-parse")
 async def user_sms_parse(
     sms: str = Query(..., description="SMS message text"),
@@ -1214,13 +1848,11 @@ async def user_sms_parse(
     {
         "success": true,
         "url": "https://webapp-expense.vercel.app/add-expense/{token}",
-        "parsed_data": {...},
+        "status": "pending" | "parsing",
+        "parsed_data": {...} | null (still parsing),
         "already_processed": false
     }
     """
-    from sms_parser_api import parse_sms_with_claude
-    import secrets
-    
     # Create hash of SMS to check for duplicates
     sms_hash = hashlib.sha256(sms.encode()).hexdigest()
     
@@ -1241,31 +1873,9 @@ async def user_sms_parse(
             "message": "This SMS was already processed"
         }
     
-    # Parse SMS using Claude AI
-    parse_result = parse_sms_with_claude(sms)
-    
-    if not parse_result.get("success"):
-        raise HTTPException(status_code=400, detail="Failed to parse SMS")
-    
-    data = parse_result["data"]
-    
-    # Create description with hash for deduplication
-    original_description = data.get("merchant", "Unknown")
-    description_with_hash = f"{original_description} [#{sms_hash[:16]}]"
-    
-    # Create pending transaction
-    pending = PendingTransaction(
-        user_id=current_user.id,
-        amount=data.get("amount"),
-        description=description_with_hash,  # Include hash for dedup
-        category=data.get("category", "Other"),
-        date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
-        type="income" if data.get("transaction_type") == "credit" else "expense",
-        token=secrets.token_urlsafe(16),
-        status="pending"
-    )
-    db.add(pending)
-    db.commit()
+    # Create the pending transaction (hash in description for dedup); parsing
+    # may finish in the background
+    pending, data = await ingest_sms(db, current_user.id, sms, dedup_tag=f"[#{sms_hash[:16]}]")
     
     # Return URL for the shortcut to open
     expense_url = f"{FRONTEND_URL}/add-expense/{pending.token}"
@@ -1273,8 +1883,9 @@ async def user_sms_parse(
     return {
         "success": True,
         "url": expense_url,
+        "status": pending.status,
         "parsed_data": data,
-        "confidence": data.get("confidence", 0.5),
+        "confidence": data.get("confidence", 0.5) if data else None,
         "already_processed": False
     }
 
@@ -1360,8 +1971,6 @@ async def user_sms_parse_public(
     
     This endpoint doesn't require Authorization header - token is in the URL
     """
-    import secrets
-    
     # Verify token
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -1376,28 +1985,8 @@ async def user_sms_parse_public(
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
-    # Parse SMS using Claude AI
-    from sms_parser_api import parse_sms_with_claude
-    parse_result = parse_sms_with_claude(sms)
-    
-    if not parse_result.get("success"):
-        raise HTTPException(status_code=400, detail="Failed to parse SMS")
-    
-    data = parse_result["data"]
-    
-    # Create pending transaction
-    pending = PendingTransaction(
-        user_id=user.id,
-        amount=data.get("amount"),
-        description=data.get("merchant", "Unknown"),
-        category=data.get("category", "Other"),
-        date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
-        type="income" if data.get("transaction_type") == "credit" else "expense",
-        token=secrets.token_urlsafe(16),
-        status="pending"
-    )
-    db.add(pending)
-    db.commit()
+    # Create the pending transaction; parsing may finish in the background
+    pending, data = await ingest_sms(db, user.id, sms)
     
     # Return URL for the shortcut to open
     expense_url = f"{FRONTEND_URL}/add-expense/{pending.token}"
@@ -1405,8 +1994,9 @@ async def user_sms_parse_public(
     return {
         "success": True,
         "url": expense_url,
+        "status": pending.status,
         "parsed_data": data,
-        "confidence": data.get("confidence", 0.5)
+        "confidence": data.get("confidence", 0.5) if data else None
     }
 
 # ==========================================
@@ -1419,18 +2009,15 @@ def get_categories(
     db: Session = Depends(get_db)
 ):
     """Get all categories for current user"""
-    categories = db.query(Category).filter(
-        Category.user_id == current_user.id
-    ).order_by(Category.name).all()
+    # Fresh read: another worker may have just changed them
+    categories = category_directory.get(current_user.id, fresh=True)
     
     # If user has no categories, create defaults
     if not categories:
         create_default_categories(db, current_user.id)
-        categories = db.query(Category).filter(
-            Category.user_id == current_user.id
-        ).order_by(Category.name).all()
+        categories = category_directory.get(current_user.id)
     
-    return categories
+    return categories.rows
 
 @app.post("/api/categories", response_model=CategoryResponse)
 def create_category(
@@ -1468,6 +2055,7 @@ def create_category(
     db.add(new_category)
     db.commit()
     db.refresh(new_category)
+    category_directory.invalidate(current_user.id)
     
     return new_category
 
@@ -1515,6 +2103,7 @@ def update_category(
     
     db.commit()
     db.refresh(category)
+    category_directory.invalidate(current_user.id)
     
     return category
 
@@ -1554,6 +2143,7 @@ def delete_category(
     
     db.delete(category)
     db.commit()
+    category_directory.invalidate(current_user.id)
     
     return {"message": f"Category '{category.name}' deleted successfully"}
 
@@ -1577,23 +2167,18 @@ def get_category_stats(
         .all()
     )
 
-    # 2. Fetch user categories for enrichment (OPTIONAL)
-    categories = {
-        c.name: c
-        for c in db.query(Category)
-        .filter(Category.user_id == current_user.id)
-        .all()
-    }
+    # 2. User categories for enrichment (OPTIONAL), matched on normalized name
+    categories = category_directory.get(current_user.id, fresh=True)
 
     # 3. Merge safely
     stats = []
     for category, count, total in expense_stats:
-        cat = categories.get(normalize(category))
+        cat = categories.get(category)
 
         stats.append({
             "category": category,
-            "color": cat.color if cat else "#999999",
-            "icon": cat.icon if cat else "📦",
+            "color": cat["color"] if cat else "#999999",
+            "icon": cat["icon"] if cat else "📦",
             "expense_count": count,
             "total_amount": float(total),
             "can_delete": count == 0 and category != "Income",
@@ -1601,6 +2186,47 @@ def get_category_stats(
 
     return stats
 
+@app.get("/api/merchants/stats")
+def get_merchant_stats(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Spend per canonical merchant (integer group-by on expenses.merchant_id)"""
+    totals = (
+        db.query(
+            Expense.merchant_id,
+            func.count(Expense.id).label("expense_count"),
+            func.sum(Expense.amount).label("total_amount"),
+        )
+        .filter(
+            Expense.user_id == current_user.id,
+            Expense.type == "expense",
+            Expense.merchant_id.isnot(None),
+        )
+        .group_by(Expense.merchant_id)
+        .order_by(func.sum(Expense.amount).desc())
+        .limit(limit)
+        .subquery()
+    )
+
+    rows = (
+        db.query(Merchant.id, Merchant.canonical_name, totals.c.expense_count, totals.c.total_amount)
+        .join(totals, totals.c.merchant_id == Merchant.id)
+        .order_by(totals.c.total_amount.desc())
+        .all()
+    )
+
+    return [
+        {
+            "merchant_id": merchant_id,
+            "merchant": name,
+            "expense_count": count,
+            "total_amount": float(total or 0),
+        }
+        for merchant_id, name, count, total in rows
+    ]
+
 # ==========================================
 # EXPENSE ROUTES
 # ==========================================
@@ -1645,11 +2271,13 @@ def create_expense(
         category=expense.category,
         description=expense.description,
         date=datetime.strptime(expense.date, "%Y-%m-%d").date(),
-        type=expense.type
+        type=expense.type,
+        merchant_id=merchant_registry.resolve(current_user.id, expense.description),
     )
     db.add(new_expense)
     db.commit()
     db.refresh(new_expense)
+    merchant_classifier.learn(current_user.id, new_expense.description, new_expense.category)
     
     return ExpenseResponse(
         id=new_expense.id,
@@ -1682,6 +2310,7 @@ def update_expense(
         db_expense.category = expense.category
     if expense.description is not None:
         db_expense.description = expense.description
+        db_expense.merchant_id = merchant_registry.resolve(current_user.id, expense.description)
     if expense.date is not None:
         db_expense.date = datetime.strptime(expense.date, "%Y-%m-%d").date()
     if expense.type is not None:
@@ -1812,60 +2441,123 @@ def export_expenses_excel(
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+@app.get("/api/export/parquet")
+def export_expenses_parquet(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    type: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Export expenses as Parquet (columnar, compressed, streamed)"""
+    if not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Parquet support not available. Install pyarrow.")
+    
+    filters = []
+    if start_date:
+        filters.append(Expense.date >= datetime.strptime(start_date, "%Y-%m-%d").date())
+    if end_date:
+        filters.append(Expense.date <= datetime.strptime(end_date, "%Y-%m-%d").date())
+    if category:
+        filters.append(Expense.category == category)
+    if type:
+        filters.append(Expense.type == type)
+    
+    has_rows = db.query(Expense.id).filter(Expense.user_id == current_user.id, *filters).first()
+    if not has_rows:
+        raise HTTPException(status_code=404, detail="No expenses found")
+    
+    filename = f"expenses_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+    
+    return StreamingResponse(
+        stream_parquet_export(current_user.id, filters),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @app.post("/api/import")
 async def import_expenses(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Import expenses from CSV or Excel file"""
+    """Import expenses from CSV, Excel or Parquet file"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
     file_ext = file.filename.split('.')[-1].lower()
     
-    if file_ext not in ['csv', 'xlsx', 'xls']:
-        raise HTTPException(status_code=400, detail="File must be CSV or Excel")
+    if file_ext not in ['csv', 'xlsx', 'xls', 'parquet']:
+        raise HTTPException(status_code=400, detail="File must be CSV, Excel or Parquet")
     
     content = await file.read()
     
-    # Parse file
+    # Parse file into batches: one per Parquet row group, one for CSV/Excel
     try:
         if file_ext == 'csv':
-            expenses_data = parse_csv_file(content)
+            batches = [parse_csv_file(content)]
+        elif file_ext == 'parquet':
+            batches = parse_parquet_file(content)
         else:
-            expenses_data = parse_excel_file(content)
+            batches = [parse_excel_file(content)]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to parse file: {str(e)}")
     
-    # Import expenses
-    imported = 0
     failed = 0
     errors = []
+    occurrences = {}  # across batches, so repeats split over row groups still count
+    total = imported = skipped_duplicates = 0
     
-    for idx, exp_data in enumerate(expenses_data, 1):
-        try:
-            new_expense = Expense(
-                user_id=current_user.id,
-                amount=exp_data['amount'],
-                category=exp_data['category'],
-                description=exp_data['description'],
-                date=datetime.strptime(exp_data['date'], "%Y-%m-%d").date(),
-                type=exp_data['type']
-            )
-            db.add(new_expense)
-            imported += 1
-        except Exception as e:
-            failed += 1
-            errors.append(f"Row {idx}: {str(e)}")
-    
+    try:
+        for expenses_data in batches:
+            # Build fingerprinted rows
+            rows = []
+            for exp_data in expenses_data:
+                total += 1
+                try:
+                    exp_date = datetime.strptime(exp_data['date'], "%Y-%m-%d").date()
+                    # Same normalization for counting repeats and for the fingerprint
+                    content_key = import_content_key(exp_date, exp_data['amount'],
+                                                     exp_data['description'], exp_data['type'])
+                    occurrences[content_key] = occurrences.get(content_key, 0) + 1
+                    fingerprint = compute_import_fingerprint(
+                        current_user.id, content_key, occurrence=occurrences[content_key]
+                    )
+                    rows.append({
+                        "user_id": current_user.id,
+                        "amount": exp_data['amount'],
+                        "category": exp_data['category'],
+                        "description": exp_data['description'],
+                        "date": exp_date,
+                        "type": exp_data['type'],
+                        "import_fingerprint": fingerprint,
+                    })
+                except Exception as e:
+                    failed += 1
+                    errors.append(f"Row {total}: {str(e)}")
+            
+            # Import this batch, skipping rows already imported earlier
+            batch_imported, batch_skipped = insert_imported_rows(db, current_user.id, rows)
+            imported += batch_imported
+            skipped_duplicates += batch_skipped
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        # A later Parquet row group failed to read
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Failed to parse file: {str(e)}")
     db.commit()
     
     return {
         "message": "Import completed",
         "imported": imported,
+        "skipped_duplicates": skipped_duplicates,
         "failed": failed,
-        "total": len(expenses_data),
+        "total": total,
         "errors": errors[:10]  # Return first 10 errors
     }
 
@@ -1907,7 +2599,7 @@ def get_pending_transactions(
 def get_pending_transaction(token: str, db: Session = Depends(get_db)):
     pending = db.query(PendingTransaction).filter(
         PendingTransaction.token == token,
-        PendingTransaction.status == "pending"
+        PendingTransaction.status.in_(["pending", "parsing"])
     ).first()
     
     if not pending:
@@ -1915,6 +2607,7 @@ def get_pending_transaction(token: str, db: Session = Depends(get_db)):
     
     return {
         "token": pending.token,
+        "status": pending.status,  # "parsing" until the SMS ingest worker fills it in
         "amount": pending.amount,
         "category": pending.category,
         "description": pending.description,
@@ -1942,6 +2635,7 @@ def update_pending_transaction(
         pending.category = data.category
     if data.description is not None:
         pending.description = data.description
+        pending.merchant_id = merchant_registry.resolve(pending.user_id, data.description)
     if data.date is not None:
         pending.date = data.date
     if data.type is not None:
@@ -1969,12 +2663,14 @@ def approve_pending_transaction(token: str, db: Session = Depends(get_db)):
         category=pending.category,
         description=pending.description,
         date=datetime.strptime(pending.date, "%Y-%m-%d").date(),
-        type=pending.type
+        type=pending.type,
+        merchant_id=pending.merchant_id or merchant_registry.resolve(pending.user_id, pending.description),
     )
     db.add(new_expense)
     
     pending.status = "approved"
     db.commit()
+    merchant_classifier.learn(pending.user_id, pending.description, pending.category)
     
     return {"message": "Transaction approved"}
 
@@ -1992,6 +2688,111 @@ def delete_pending_transaction(token: str, db: Session = Depends(get_db)):
     
     return {"message": "Transaction deleted"}
 
+PENDING_BULK_MAX = 500
+
+@app.post("/api/pending-transactions/bulk")
+def bulk_pending_transactions(
+    request: PendingBulkAction,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Approve, reject or edit-then-approve many pending transactions at once.
+    One transaction: the rows are locked (FOR UPDATE) and only those still
+    "pending" are touched, so concurrent requests can't approve a token twice.
+    Approval is a single INSERT ... SELECT into expenses plus one UPDATE.
+    """
+    if request.action not in ("approve", "reject", "edit_approve"):
+        raise HTTPException(status_code=400, detail="action must be approve, reject or edit_approve")
+
+    tokens = list(dict.fromkeys(request.tokens))
+    if not tokens:
+        raise HTTPException(status_code=400, detail="No transactions selected")
+    if len(tokens) > PENDING_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PENDING_BULK_MAX} transactions per request")
+
+    try:
+        rows = db.query(PendingTransaction).filter(
+            PendingTransaction.user_id == current_user.id,
+            PendingTransaction.token.in_(tokens),
+            PendingTransaction.status == "pending",
+        ).with_for_update().all()
+        found = {row.token for row in rows}
+        skipped = [token for token in tokens if token not in found]
+
+        if request.action == "reject":
+            # Kept as "rejected" (not deleted) so Splitwise sync won't re-import them
+            if rows:
+                db.query(PendingTransaction).filter(
+                    PendingTransaction.id.in_([row.id for row in rows])
+                ).update({PendingTransaction.status: "rejected"}, synchronize_session=False)
+            db.commit()
+            return {"approved": 0, "rejected": len(rows), "skipped": skipped, "incomplete": []}
+
+        if request.action == "edit_approve":
+            for row in rows:
+                edit = (request.edits or {}).get(row.token)
+                if edit is None:
+                    continue
+                for field, value in edit.model_dump(exclude_none=True).items():
+                    setattr(row, field, value)
+                if edit.description is not None:
+                    row.merchant_id = None  # re-resolved below
+
+        approvable, incomplete = [], []
+        for row in rows:
+            try:
+                complete = all([row.amount, row.category, row.description, row.date, row.type])
+                complete = complete and bool(datetime.strptime(row.date, "%Y-%m-%d"))
+            except ValueError:
+                complete = False
+            (approvable if complete else incomplete).append(row)
+
+        missing = [row for row in approvable if not row.merchant_id]
+        for row, merchant_id in zip(missing, merchant_registry.resolve_many(
+            current_user.id, [row.description for row in missing]
+        )):
+            row.merchant_id = merchant_id
+        db.flush()
+
+        approve_ids = [row.id for row in approvable]
+        if approve_ids:
+            pending_date = (
+                cast(PendingTransaction.date, Date) if engine.dialect.name == "postgresql"
+                else PendingTransaction.date
+            )
+            db.execute(insert(Expense).from_select(
+                ["user_id", "amount", "category", "description", "date", "type", "merchant_id"],
+                select(
+                    PendingTransaction.user_id,
+                    PendingTransaction.amount,
+                    PendingTransaction.category,
+                    PendingTransaction.description,
+                    pending_date,
+                    PendingTransaction.type,
+                    PendingTransaction.merchant_id,
+                ).where(PendingTransaction.id.in_(approve_ids)),
+            ))
+            db.query(PendingTransaction).filter(
+                PendingTransaction.id.in_(approve_ids)
+            ).update({PendingTransaction.status: "approved"}, synchronize_session=False)
+        # Read before commit expires the instances
+        learned = [(row.description, row.category) for row in approvable]
+        incomplete_tokens = [row.token for row in incomplete]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    merchant_classifier.learn_many(current_user.id, learned)
+
+    return {
+        "approved": len(learned),
+        "rejected": 0,
+        "skipped": skipped,
+        "incomplete": incomplete_tokens,
+    }
+
 
 # ==========================================
 # PROFILE ROUTES
@@ -2100,17 +2901,14 @@ def create_categories_batch(
     
     created_count = 0
     skipped_count = 0
+    existing_names = set(category_directory.names(current_user.id, fresh=True))
     
     for example in examples:
         # Check if user already has this category
-        existing = db.query(Category).filter(
-            Category.user_id == current_user.id,
-            Category.name == example.name
-        ).first()
-        
-        if existing:
+        if example.name in existing_names:
             skipped_count += 1
             continue
+        existing_names.add(example.name)
         
         # Create category for user
         new_category = Category(
@@ -2123,6 +2921,7 @@ def create_categories_batch(
         created_count += 1
     
     db.commit()
+    category_directory.invalidate(current_user.id)
     
     return {
         "message": "Categories created successfully",
@@ -2146,15 +2945,9 @@ def migrate_category(
     Useful before deleting a category
     """
     # Check if both categories exist and belong to user
-    from_category = db.query(Category).filter(
-        Category.user_id == current_user.id,
-        Category.name == migration.from_category_name
-    ).first()
-    
-    to_category = db.query(Category).filter(
-        Category.user_id == current_user.id,
-        Category.name == migration.to_category_name
-    ).first()
+    user_categories = category_directory.get(current_user.id, fresh=True)
+    from_category = migration.from_category_name in user_categories.names
+    to_category = migration.to_category_name in user_categories.names
     
     if not from_category:
         raise HTTPException(status_code=404, detail=f"Source category '{migration.from_category_name}' not found")
@@ -2174,6 +2967,7 @@ def migrate_category(
     
     affected_count = result.scalar()
     db.commit()
+    category_directory.invalidate(current_user.id)
     
     return CategoryMigrateResponse(
         message=f"Successfully migrated {affected_count} transaction(s)",
@@ -2221,12 +3015,7 @@ def delete_category_enhanced(
     # If migration specified, migrate first
     if migrate_to:
         # Verify target category exists
-        target = db.query(Category).filter(
-            Category.user_id == current_user.id,
-            Category.name == migrate_to
-        ).first()
-        
-        if not target:
+        if migrate_to not in category_directory.names(current_user.id, fresh=True):
             raise HTTPException(status_code=404, detail=f"Migration target category '{migrate_to}' not found")
         
         # Migrate
@@ -2243,6 +3032,7 @@ def delete_category_enhanced(
     # Delete category
     db.delete(category)
     db.commit()
+    category_directory.invalidate(current_user.id)
     
     if migrate_to:
         return {
@@ -2302,31 +3092,8 @@ async def parse_user_sms_authenticated(
     
     Returns: Direct URL to approve transaction
     """
-    from sms_parser_api import parse_sms_with_claude
-    
-    # Parse SMS
-    parse_result = parse_sms_with_claude(sms)
-    
-    if not parse_result.get("success"):
-        raise HTTPException(status_code=400, detail="Failed to parse SMS")
-    
-    data = parse_result["data"]
-    
-    # Create pending transaction
-    pending = PendingTransaction(
-        user_id=current_user.id,
-        token=token_urlsafe(16),
-        amount=data.get("amount"),
-        description=data.get("merchant", "Unknown"),
-        category=data.get("category", "Other"),
-        date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
-        type="income" if data.get("transaction_type") == "credit" else "expense",
-        status="pending"
-    )
-    
-    db.add(pending)
-    db.commit()
-    db.refresh(pending)
+    # Create the pending transaction; parsing may finish in the background
+    pending, data = await ingest_sms(db, current_user.id, sms)
     
     # Return URL for approval
     approval_url = f"{FRONTEND_URL}/add-expense/{pending.token}"
@@ -2334,9 +3101,13 @@ async def parse_user_sms_authenticated(
     return {
         "success": True,
         "url": approval_url,
+        "status": pending.status,
         "parsed_data": data,
         "transaction_id": pending.id,
-        "message": "Transaction parsed successfully. Open URL to approve."
+        "message": (
+            "Transaction parsed successfully. Open URL to approve."
+            if data else "Transaction received and is being parsed. Open URL to approve."
+        )
     }
 
 # ==========================================
@@ -2354,8 +3125,8 @@ def read_root():
             "Password Reset",
             "Expenses CRUD",
             "Categories CRUD",
-            "Export (CSV/Excel)",
-            "Import (CSV/Excel)",
+            "Export (CSV/Excel/Parquet)",
+            "Import (CSV/Excel/Parquet)",
             "Pending Transactions",
             "SMS Parsing"
         ]
@@ -2363,4 +3134,98 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/llm")
+def llm_health():
+    """Circuit breaker state and recent LLM latency (see llm_client.py)"""
+    return llm_client.stats()
+
+# ==========================================
+# ADMIN ROUTES
+# ==========================================
+
+@app.get("/api/admin/llm-usage")
+def get_llm_usage(
+    days: int = Query(7, ge=1, le=90),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    LLM calls, tokens and latency per call site.
+    "recent" is this process's ring buffer (with p50/p95/p99); "rollup" is the
+    hourly table summed over the last `days` days across all workers.
+    """
+    llm_usage.flush()
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.query(
+            LLMUsageRollup.route,
+            LLMUsageRollup.outcome,
+            LLMUsageRollup.fallback_reason,
+            func.sum(LLMUsageRollup.calls),
+            func.sum(LLMUsageRollup.input_tokens),
+            func.sum(LLMUsageRollup.output_tokens),
+            func.sum(LLMUsageRollup.latency_total),
+            func.max(LLMUsageRollup.latency_max),
+        )
+        .filter(LLMUsageRollup.hour >= since)
+        .group_by(LLMUsageRollup.route, LLMUsageRollup.outcome, LLMUsageRollup.fallback_reason)
+        .all()
+    )
+
+    rollup = {}
+    for route, outcome, reason, calls, tokens_in, tokens_out, latency_total, latency_max in rows:
+        entry = rollup.setdefault(route, {
+            "calls": 0, "input_tokens": 0, "output_tokens": 0, "latency_total": 0.0,
+            "latency_max": 0.0, "outcomes": {}, "fallback_reasons": {},
+        })
+        entry["outcomes"][outcome] = entry["outcomes"].get(outcome, 0) + int(calls or 0)
+        if reason:
+            entry["fallback_reasons"][reason] = entry["fallback_reasons"].get(reason, 0) + int(calls or 0)
+        if outcome in ("fallback", "local", "short_circuited"):
+            continue
+        entry["calls"] += int(calls or 0)
+        entry["input_tokens"] += int(tokens_in or 0)
+        entry["output_tokens"] += int(tokens_out or 0)
+        entry["latency_total"] += float(latency_total or 0)
+        entry["latency_max"] = max(entry["latency_max"], float(latency_max or 0))
+
+    for entry in rollup.values():
+        entry["latency_avg"] = entry["latency_total"] / entry["calls"] if entry["calls"] else None
+
+    return {
+        "recent": llm_usage.summary(),
+        "rollup": {"days": days, "routes": rollup},
+        "breaker": llm_client.stats()["breaker"],
+    }
+
+@app.get("/api/admin/http-stats")
+def get_http_stats(admin: User = Depends(get_admin_user)):
+    """Outbound HTTP (Splitwise, Brevo) requests, errors, retries and latency per host"""
+    return outbound_http.stats()
+
+@app.get("/api/admin/splitwise-payloads/stats")
+def get_splitwise_payload_stats(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Bytes saved by compressing raw Splitwise payloads"""
+    return splitwise_payloads.storage_report(db)
+
+@app.get("/api/admin/splitwise-payloads/{pending_id}")
+def get_splitwise_payload(
+    pending_id: int,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Raw Splitwise expense behind a pending transaction (debugging)"""
+    payload = splitwise_payloads.load_payload(db, pending_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="No Splitwise payload for this transaction")
+    return payload
+
+@app.get("/api/admin/scheduler")
+def get_scheduler_status(admin: User = Depends(get_admin_user)):
+    """Registered periodic jobs with their persisted last-run state"""
+    return scheduler.status()
\ No newline at end of file
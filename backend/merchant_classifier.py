@@ -0,0 +1,281 @@
+"""
+Per-user merchant -> category classifier
+
+Learned from the user's own approved expenses, so categorizing a merchant
+they've seen before costs microseconds instead of a Claude call:
+
+1. Exact memory: canonical merchant key (merchant_index.py) -> category counts.
+2. Multinomial naive Bayes over hashed character n-grams (NumPy), for
+   variants of known merchants ("SWIGGY*ORDER 123" vs "Swiggy").
+
+Models are updated incrementally on every approval and stored per user as a
+compressed blob in merchant_models. Updates lock the row and merge into the
+latest stored model, so examples learned on other workers aren't lost; a
+worker's cached copy picks up others' updates after MODEL_TTL_SECONDS.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from merchant_index import merchant_registry
+
+N_FEATURES = 2 ** 12
+NGRAM_MIN, NGRAM_MAX = 2, 4
+ALPHA = 0.5  # Laplace smoothing
+
+MIN_CONFIDENCE = float(os.getenv("MERCHANT_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+MIN_TRAINING_ROWS = int(os.getenv("MERCHANT_CLASSIFIER_MIN_ROWS", "20"))
+MODEL_CACHE_SIZE = int(os.getenv("MERCHANT_CLASSIFIER_CACHE_SIZE", "256"))
+MODEL_TTL_SECONDS = int(os.getenv("MERCHANT_CLASSIFIER_TTL", "60"))
+
+def featurize(text: str) -> np.ndarray:
+    """Hashed character n-gram indices (with repeats) for a normalized text"""
+    padded = f" {text} "
+    grams = [
+        padded[i:i + n]
+        for n in range(NGRAM_MIN, NGRAM_MAX + 1)
+        for i in range(len(padded) - n + 1)
+    ]
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) % N_FEATURES for g in grams),
+        dtype=np.int64,
+        count=len(grams),
+    )
+
+
+class MerchantModel:
+    def __init__(self):
+        self.classes: List[str] = []
+        self.counts = np.zeros((0, N_FEATURES), dtype=np.float32)
+        self.class_counts = np.zeros(0, dtype=np.float32)
+        self.memory = {}  # normalized text -> {category: count}
+        self._log_theta = None
+        self._log_prior = None
+        self._seen = None
+
+    @property
+    def rows(self) -> int:
+        return int(self.class_counts.sum())
+
+    def _class_index(self, category: str) -> int:
+        try:
+            return self.classes.index(category)
+        except ValueError:
+            self.classes.append(category)
+            self.counts = np.vstack([self.counts, np.zeros((1, N_FEATURES), dtype=np.float32)])
+            self.class_counts = np.append(self.class_counts, np.float32(0))
+            return len(self.classes) - 1
+
+    def learn(self, key: str, category: str):
+        self.learn_many([key], [category])
+
+    def learn_many(self, keys: List[str], categories: List[str]):
+        """Train on canonical merchant keys (see merchant_index.normalize_merchant)"""
+        for text, category in zip(keys, categories):
+            if not text or not category:
+                continue
+            ci = self._class_index(category)
+            np.add.at(self.counts[ci], featurize(text), 1)
+            self.class_counts[ci] += 1
+            seen = self.memory.setdefault(text, {})
+            seen[category] = seen.get(category, 0) + 1
+        self._log_theta = None
+
+    def _ensure_fitted(self):
+        if self._log_theta is None and self.classes:
+            smoothed = self.counts + ALPHA
+            self._log_theta = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+            self._log_prior = np.log(self.class_counts / self.class_counts.sum())
+            self._seen = self.counts.sum(axis=0) > 0
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, str]:
+        """(category, confidence, source) - category None if nothing learned yet"""
+        if not text or not self.classes:
+            return None, 0.0, "none"
+
+        seen = self.memory.get(text)
+        if seen:
+            category, count = max(seen.items(), key=lambda kv: kv[1])
+            return category, count / sum(seen.values()), "exact"
+
+        if self.rows < MIN_TRAINING_ROWS:
+            return None, 0.0, "none"
+
+        self._ensure_fitted()
+        features = featurize(text)
+        scores = self._log_prior + self._log_theta[:, features].sum(axis=1)
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        # NB posteriors are overconfident on text it has barely seen; scale by
+        # the share of n-grams that occurred in training at all
+        coverage = float(self._seen[features].mean())
+        return self.classes[best], float(probs[best]) * coverage, "naive_bayes"
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        meta = json.dumps({"classes": self.classes, "memory": self.memory})
+        np.savez_compressed(
+            buf,
+            counts=self.counts.astype(np.uint16 if self.counts.max(initial=0) < 65535 else np.float32),
+            class_counts=self.class_counts,
+            meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "MerchantModel":
+        data = np.load(io.BytesIO(payload))
+        meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        model = cls()
+        model.classes = meta["classes"]
+        model.memory = meta["memory"]
+        model.counts = data["counts"].astype(np.float32)
+        model.class_counts = data["class_counts"].astype(np.float32)
+        return model
+
+
+class MerchantClassifier:
+    """Per-user models with an in-process LRU in front of the merchant_models table"""
+
+    def __init__(self, cache_size: int = MODEL_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._models = OrderedDict()  # user_id -> (model, loaded_at)
+        self._lock = threading.Lock()
+        self.local_predictions = 0
+
+    def _train_from_expenses(self, db, user_id: int) -> MerchantModel:
+        from main import Expense
+        rows = db.query(Expense.description, Expense.category).filter(
+            Expense.user_id == user_id
+        ).all()
+        model = MerchantModel()
+        model.learn_many(
+            [merchant_registry.canonical_key(user_id, r[0]) for r in rows],
+            [r[1] for r in rows],
+        )
+        return model
+
+    def _load(self, user_id: int) -> MerchantModel:
+        # Own session: predict() runs in the middle of callers' transactions
+        # (Splitwise sync, SMS ingest), which a model save must not commit
+        from main import SessionLocal, MerchantModelRecord
+        db = SessionLocal()
+        try:
+            record = db.get(MerchantModelRecord, user_id)
+            if record and record.payload:
+                try:
+                    return MerchantModel.from_bytes(record.payload)
+                except Exception as e:
+                    print(f"Merchant model load failed for user {user_id}: {e}")
+        finally:
+            db.close()
+        # First use: train from history (and store it) under the row lock
+        return self._update(user_id, [], [])
+
+    def _update(self, user_id: int, keys: List[str], categories: List[str]) -> MerchantModel:
+        """
+        Add examples to the stored model: lock the row, reload the latest blob
+        (other workers may have learned since we cached it), merge, write back.
+        Returns the merged model.
+        """
+        from sqlalchemy.exc import IntegrityError
+        from main import SessionLocal, MerchantModelRecord
+        for attempt in range(2):
+            db = SessionLocal()
+            try:
+                record = db.query(MerchantModelRecord).filter(
+                    MerchantModelRecord.user_id == user_id
+                ).with_for_update().first()
+                model = None
+                if record is not None and record.payload:
+                    try:
+                        model = MerchantModel.from_bytes(record.payload)
+                    except Exception as e:
+                        print(f"Merchant model load failed for user {user_id}: {e}")
+                if model is None:
+                    # Training reads committed expenses, which already include
+                    # the approvals being learned here
+                    model = self._train_from_expenses(db, user_id)
+                else:
+                    model.learn_many(keys, categories)
+
+                if record is None:
+                    record = MerchantModelRecord(user_id=user_id)
+                    db.add(record)
+                record.payload = model.to_bytes()
+                record.rows = model.rows
+                record.updated_at = datetime.utcnow()
+                db.commit()
+                return model
+            except IntegrityError:
+                db.rollback()  # another worker created the row first; merge into theirs
+                if attempt:
+                    raise
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+    def _cache(self, user_id: int, model: MerchantModel):
+        with self._lock:
+            self._models[user_id] = (model, time.monotonic())
+            self._models.move_to_end(user_id)
+            while len(self._models) > self.cache_size:
+                self._models.popitem(last=False)
+
+    def get_model(self, user_id: int) -> MerchantModel:
+        with self._lock:
+            cached = self._models.get(user_id)
+            if cached and time.monotonic() - cached[1] < MODEL_TTL_SECONDS:
+                self._models.move_to_end(user_id)
+                return cached[0]
+
+        model = self._load(user_id)
+        self._cache(user_id, model)
+        return model
+
+    def predict(self, user_id: int, description: str,
+                allowed: Optional[List[str]] = None,
+                min_confidence: float = MIN_CONFIDENCE) -> Optional[str]:
+        """Category if the user's model is confident enough, else None"""
+        try:
+            key = merchant_registry.canonical_key(user_id, description)
+            category, confidence, _ = self.get_model(user_id).predict(key)
+        except Exception as e:
+            print(f"Merchant classifier failed for user {user_id}: {e}")
+            return None
+        if category is None or confidence < min_confidence:
+            return None
+        if allowed is not None and category not in allowed:
+            return None
+        self.local_predictions += 1
+        return category
+
+    def learn(self, user_id: int, description: str, category: str):
+        """Incrementally update a user's model after an approval"""
+        self.learn_many(user_id, [(description, category)])
+
+    def learn_many(self, user_id: int, examples: List[Tuple[str, str]]):
+        """learn() for several (description, category) pairs with a single save"""
+        examples = [(d, c) for d, c in examples if d and c]
+        if not examples:
+            return
+        try:
+            keys = [merchant_registry.canonical_key(user_id, d) for d, _ in examples]
+            self._cache(user_id, self._update(user_id, keys, [c for _, c in examples]))
+        except Exception as e:
+            print(f"Merchant classifier update failed for user {user_id}: {e}")
+
+
+merchant_classifier = MerchantClassifier()
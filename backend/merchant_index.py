@@ -0,0 +1,253 @@
+"""
+Merchant canonicalization
+
+"M S SHREEJEE FO", "SHREEJEE FOODS" and "Shreejee" should be one merchant.
+Descriptions are normalized (case, punctuation, legal suffixes, UPI handles
+and references), then matched against the user's known merchants through a
+character trigram inverted index. Expenses and pending transactions store the
+resulting merchant_id, so per-merchant reports are an integer group-by and
+the category classifier sees one key per merchant.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+MERCHANT_MATCH_THRESHOLD = float(os.getenv("MERCHANT_MATCH_THRESHOLD", "0.75"))
+MERCHANT_INDEX_CACHE_SIZE = int(os.getenv("MERCHANT_INDEX_CACHE_SIZE", "256"))
+MERCHANT_INDEX_TTL = int(os.getenv("MERCHANT_INDEX_TTL", "300"))
+
+# Containment ("shreejee" inside "shreejee foods") only counts for keys this long
+MIN_CONTAINMENT_LENGTH = 6
+
+_SMS_HASH = re.compile(r"\[#[0-9a-f]+\]")  # dedup suffix added by /api/sms-parser/user/parse
+_UPI_HANDLE = re.compile(r"([a-z0-9._-]+)@[a-z]+")
+_UPI_REF = re.compile(r"\b(?:upi|imps|neft|rtgs|pos|vpa|ach)\b[\s/:-]*(?:\d+[\s/:-]*)?")
+_MS_PREFIX = re.compile(r"^(?:m\s*/\s*s|m\s+s|ms)\b\.?\s*")
+_NON_ALPHA = re.compile(r"[^a-z]+")
+
+LEGAL_SUFFIXES = {
+    "pvt", "private", "ltd", "limited", "llp", "inc", "co", "corp",
+    "corporation", "company", "india", "pl", "opc",
+}
+
+
+def normalize_merchant(text: Optional[str]) -> str:
+    """Canonical key for a raw description, or "" if nothing merchant-like is left"""
+    t = _SMS_HASH.sub(" ", (text or "").lower())
+    t = _UPI_HANDLE.sub(r" \1 ", t)
+    t = _UPI_REF.sub(" ", t)
+    t = _MS_PREFIX.sub("", t.strip())
+    tokens = [tok for tok in _NON_ALPHA.sub(" ", t).split() if tok not in LEGAL_SUFFIXES]
+    return " ".join(tokens)
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MerchantIndex:
+    """One user's merchants, with a trigram -> merchant ids inverted index"""
+
+    def __init__(self):
+        self.by_key = {}  # normalized key -> merchant id
+        self.grams = {}  # merchant id -> trigram set
+        self.keys = {}  # merchant id -> normalized key
+        self.postings = defaultdict(set)  # trigram -> merchant ids
+
+    def add(self, merchant_id: int, key: str):
+        self.by_key[key] = merchant_id
+        self.keys[merchant_id] = key
+        grams = trigrams(key)
+        self.grams[merchant_id] = grams
+        for gram in grams:
+            self.postings[gram].add(merchant_id)
+
+    def find(self, key: str, threshold: float = MERCHANT_MATCH_THRESHOLD) -> Tuple[Optional[int], float]:
+        """Best matching merchant id for a normalized key, and its score"""
+        if key in self.by_key:
+            return self.by_key[key], 1.0
+
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for merchant_id in self.postings.get(gram, ()):
+                shared[merchant_id] += 1
+
+        best_id, best_score = None, 0.0
+        for merchant_id, overlap in shared.items():
+            other = self.grams[merchant_id]
+            score = 2 * overlap / (len(grams) + len(other))  # Dice
+            shorter = min(len(key), len(self.keys[merchant_id]))
+            if shorter >= MIN_CONTAINMENT_LENGTH:
+                score = max(score, 0.9 * overlap / min(len(grams), len(other)))
+            if score > best_score:
+                best_id, best_score = merchant_id, score
+
+        if best_score >= threshold:
+            return best_id, best_score
+        return None, best_score
+
+
+class MerchantRegistry:
+    """
+    Per-user MerchantIndex cache in front of the merchants table. Uses its own
+    sessions so resolving never commits or rolls back the caller's work.
+    """
+
+    def __init__(self, cache_size: int = MERCHANT_INDEX_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._indexes = OrderedDict()  # user_id -> (MerchantIndex, loaded_at)
+        self._lock = threading.Lock()
+
+    def _load(self, user_id: int) -> MerchantIndex:
+        from main import SessionLocal, Merchant
+        index = MerchantIndex()
+        db = SessionLocal()
+        try:
+            for merchant_id, key in db.query(Merchant.id, Merchant.normalized_key).filter(
+                Merchant.user_id == user_id
+            ):
+                index.add(merchant_id, key)
+        finally:
+            db.close()
+        return index
+
+    def get_index(self, user_id: int) -> MerchantIndex:
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached and time.monotonic() - cached[1] < MERCHANT_INDEX_TTL:
+                self._indexes.move_to_end(user_id)
+                return cached[0]
+
+        index = self._load(user_id)
+        with self._lock:
+            self._indexes[user_id] = (index, time.monotonic())
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _create(self, user_id: int, key: str, display_name: str) -> int:
+        from main import SessionLocal, Merchant
+        from sqlalchemy.exc import IntegrityError
+        db = SessionLocal()
+        try:
+            merchant = Merchant(
+                user_id=user_id,
+                normalized_key=key,
+                canonical_name=display_name[:120],
+                created_at=datetime.utcnow(),
+            )
+            db.add(merchant)
+            db.commit()
+            return merchant.id
+        except IntegrityError:
+            # Another worker created it first
+            db.rollback()
+            return db.query(Merchant.id).filter(
+                Merchant.user_id == user_id,
+                Merchant.normalized_key == key,
+            ).scalar()
+        finally:
+            db.close()
+
+    def resolve(self, user_id: int, text: Optional[str], create: bool = True) -> Optional[int]:
+        """Merchant id for a raw description, creating the merchant if it's new"""
+        key = normalize_merchant(text)
+        if not key or user_id is None:
+            return None
+        try:
+            index = self.get_index(user_id)
+            merchant_id, _ = index.find(key)
+            if merchant_id is not None or not create:
+                return merchant_id
+
+            merchant_id = self._create(user_id, key, key.title())
+            if merchant_id is not None:
+                with self._lock:
+                    index.add(merchant_id, key)
+            return merchant_id
+        except Exception as e:
+            print(f"Merchant resolve failed for user {user_id}: {e}")
+            return None
+
+    def resolve_many(self, user_id: int, texts: List[Optional[str]]) -> List[Optional[int]]:
+        """resolve() for a batch; new merchants are created in one transaction"""
+        keys = [normalize_merchant(text) for text in texts]
+        if user_id is None or not any(keys):
+            return [None] * len(keys)
+        try:
+            index = self.get_index(user_id)
+            results = [index.find(key)[0] if key else None for key in keys]
+
+            # Cluster the unknown keys among themselves before creating anything,
+            # so "Shreejee" and "SHREEJEE FOODS" in one import become one merchant
+            fresh = MerchantIndex()
+            placeholders = {}
+            for i, key in enumerate(keys):
+                if not key or results[i] is not None:
+                    continue
+                placeholder, _ = fresh.find(key)
+                if placeholder is None:
+                    placeholder = -(len(fresh.keys) + 1)
+                    fresh.add(placeholder, key)
+                placeholders[i] = placeholder
+
+            if placeholders:
+                created = self._create_many(user_id, fresh.keys)
+                with self._lock:
+                    for placeholder, merchant_id in created.items():
+                        index.add(merchant_id, fresh.keys[placeholder])
+                for i, placeholder in placeholders.items():
+                    results[i] = created.get(placeholder)
+            return results
+        except Exception as e:
+            print(f"Merchant batch resolve failed for user {user_id}: {e}")
+            return [None] * len(keys)
+
+    def _create_many(self, user_id: int, keys: dict) -> dict:
+        """Insert {placeholder: key} merchants, returning {placeholder: merchant id}"""
+        from main import SessionLocal, Merchant
+        from sqlalchemy.exc import IntegrityError
+        db = SessionLocal()
+        try:
+            merchants = {
+                placeholder: Merchant(
+                    user_id=user_id,
+                    normalized_key=key,
+                    canonical_name=key.title()[:120],
+                    created_at=datetime.utcnow(),
+                )
+                for placeholder, key in keys.items()
+            }
+            db.add_all(merchants.values())
+            db.commit()
+            return {placeholder: merchant.id for placeholder, merchant in merchants.items()}
+        except IntegrityError:
+            # Raced with another worker; fall back to one-by-one
+            db.rollback()
+            return {placeholder: self._create(user_id, key, key.title()) for placeholder, key in keys.items()}
+        finally:
+            db.close()
+
+    def canonical_key(self, user_id: int, text: Optional[str]) -> str:
+        """Key of the known merchant `text` matches, else its own normalized key"""
+        key = normalize_merchant(text)
+        if not key or user_id is None:
+            return key
+        try:
+            index = self.get_index(user_id)
+            merchant_id, _ = index.find(key)
+            return index.keys.get(merchant_id, key)
+        except Exception as e:
+            print(f"Merchant lookup failed for user {user_id}: {e}")
+            return key
+
+
+merchant_registry = MerchantRegistry()
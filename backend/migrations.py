@@ -1,6 +1,29 @@
-import os
-import psycopg2
+"""
+Database dump / restore tool
+
+Dump:     python migrations.py dump [--workers 4] [--out DIR] [--tables t1 t2] [--force]
+Restore:  python migrations.py restore DIR [--tables t1 t2]
+
+Postgres tables are streamed with COPY ... TO STDOUT / COPY ... FROM STDIN,
+so memory use does not grow with table size. SQLite falls back to batched
+SELECT / executemany. Dumps are written as gzip-compressed CSV, one file per
+table, dumped in parallel on a bounded thread pool. A table whose .csv.gz
+already exists is skipped, so an interrupted dump can be resumed.
+Restore accepts both .csv.gz and plain .csv files (e.g. supabase_export_postgres/).
+
+Binary columns are written in Postgres' bytea hex format ("\\x" + hex), which
+COPY reads back natively, and listed in a <table>.meta.json next to the dump
+so a SQLite restore can decode them back to bytes.
+"""
+
+import argparse
 import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
@@ -8,53 +31,275 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL not set")
 
-# Parse DB name (for folder naming)
-db_name = urlparse(DATABASE_URL).path.lstrip("/") or "postgres"
+SQLITE_BATCH_SIZE = 5000
+
+# Parents first so foreign keys resolve during restore
+RESTORE_PRIORITY = ["users", "example_categories", "categories"]
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def connect(url: str):
+    if is_sqlite(url):
+        path = url.split("///", 1)[-1]
+        return sqlite3.connect(path)
+
+    import psycopg2
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return psycopg2.connect(url)
+
+
+def binary_columns(conn, url: str, table: str) -> list:
+    """Columns declared as BLOB / bytea"""
+    cur = conn.cursor()
+    if is_sqlite(url):
+        cur.execute(f'PRAGMA table_info("{table}")')
+        return [row[1] for row in cur.fetchall() if "BLOB" in (row[2] or "").upper()]
+    cur.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s AND data_type = 'bytea'
+    """, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def encode_bytes(value: bytes) -> str:
+    return "\\x" + value.hex()
+
+
+def decode_bytes(value: str) -> bytes:
+    return bytes.fromhex(value[2:]) if value.startswith("\\x") else value.encode("utf-8")
+
+
+def meta_path(output_dir: str, table: str) -> str:
+    return os.path.join(output_dir, f"{table}.meta.json")
+
+
+def list_tables(url: str) -> list:
+    conn = connect(url)
+    try:
+        cur = conn.cursor()
+        if is_sqlite(url):
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        else:
+            cur.execute("""
+                SELECT tablename
+                FROM pg_tables
+                WHERE schemaname = 'public'
+            """)
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+# ==========================================
+# DUMP
+# ==========================================
+
+def dump_table(url: str, table: str, output_dir: str, force: bool = False) -> str:
+    final_path = os.path.join(output_dir, f"{table}.csv.gz")
+    partial_path = final_path + ".partial"
+
+    if os.path.exists(final_path) and not force:
+        return f"⏭️  {table} already dumped, skipping"
+
+    conn = connect(url)
+    try:
+        binary = set(binary_columns(conn, url, table))
+        with gzip.open(partial_path, "wt", newline="", encoding="utf-8") as f:
+            cur = conn.cursor()
+            if is_sqlite(url):
+                cur.execute(f'SELECT * FROM "{table}"')
+                header = [desc[0] for desc in cur.description]
+                writer = csv.writer(f)
+                writer.writerow(header)
+                while True:
+                    rows = cur.fetchmany(SQLITE_BATCH_SIZE)
+                    if not rows:
+                        break
+                    # csv would write bytes as their repr; SQLite columns aren't strictly typed
+                    for row in rows:
+                        writer.writerow([
+                            encode_bytes(value) if isinstance(value, bytes) else value for value in row
+                        ])
+                        binary.update(header[i] for i, value in enumerate(row) if isinstance(value, bytes))
+            else:
+                # COPY writes bytea in hex format already
+                cur.copy_expert(f'COPY public."{table}" TO STDOUT WITH CSV HEADER', f)
+    finally:
+        conn.close()
+
+    with open(meta_path(output_dir, table), "w", encoding="utf-8") as f:
+        json.dump({"binary_columns": sorted(binary)}, f)
+    os.replace(partial_path, final_path)
+    return f"✅ {table} → {final_path}"
+
+
+def dump(url: str, output_dir: str, workers: int, tables: list = None, force: bool = False):
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"📦 Exporting database → {output_dir}")
+
+    tables = tables or list_tables(url)
+    if not tables:
+        print("⚠️ No tables found in public schema")
+        return
+
+    print(f"🗂️ Found tables: {tables}")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(dump_table, url, table, output_dir, force): table for table in tables}
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                print(future.result())
+            except Exception as e:
+                failed.append(table)
+                print(f"❌ {table} failed: {e}")
+
+    if failed:
+        print(f"⚠️ Export incomplete, re-run to resume: {failed}")
+    else:
+        print("✅ Export complete")
+
+
+# ==========================================
+# RESTORE
+# ==========================================
+
+def open_dump_file(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, "r", newline="", encoding="utf-8")
+
+
+def find_dump_files(input_dir: str) -> dict:
+    files = {}
+    for name in os.listdir(input_dir):
+        for ext in (".csv.gz", ".csv"):
+            if name.endswith(ext):
+                files.setdefault(name[: -len(ext)], os.path.join(input_dir, name))
+                break
+    return files
+
+
+def restore_order(tables: list) -> list:
+    priority = {name: i for i, name in enumerate(RESTORE_PRIORITY)}
+    return sorted(tables, key=lambda t: (priority.get(t, len(priority)), t))
+
+
+def dumped_binary_columns(path: str, table: str) -> set:
+    """Binary columns recorded at dump time (none for dumps made before .meta.json)"""
+    try:
+        with open(meta_path(os.path.dirname(path), table), encoding="utf-8") as f:
+            return set(json.load(f).get("binary_columns", []))
+    except FileNotFoundError:
+        return set()
+
+
+def restore_table(conn, url: str, table: str, path: str) -> int:
+    cur = conn.cursor()
+    with open_dump_file(path) as f:
+        header = next(csv.reader(io.StringIO(f.readline())), None)
+        if not header:
+            return 0
+        columns = ", ".join(f'"{col}"' for col in header)
+
+        if is_sqlite(url):
+            placeholders = ", ".join("?" for _ in header)
+            sql = f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})'
+            binary = dumped_binary_columns(path, table) | set(binary_columns(conn, url, table))
+            binary_idx = {i for i, col in enumerate(header) if col in binary}
+            reader = csv.reader(f)
+            total = 0
+            batch = []
+            for row in reader:
+                batch.append([
+                    None if value == "" else decode_bytes(value) if i in binary_idx else value
+                    for i, value in enumerate(row)
+                ])
+                if len(batch) >= SQLITE_BATCH_SIZE:
+                    cur.executemany(sql, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                cur.executemany(sql, batch)
+                total += len(batch)
+            return total
+
+        # Header already consumed above, so COPY reads data rows only
+        cur.copy_expert(f'COPY public."{table}" ({columns}) FROM STDIN WITH CSV', f)
+        total = cur.rowcount
+
+        # Keep serial ids ahead of the restored rows
+        if "id" in header:
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('public.\"{table}\"', 'id'), "
+                f'COALESCE((SELECT MAX(id) FROM public."{table}"), 1))'
+            )
+        return total
+
 
-OUTPUT_DIR = f"supabase_export_{db_name}"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+def restore(url: str, input_dir: str, tables: list = None):
+    files = find_dump_files(input_dir)
+    if tables:
+        files = {t: p for t, p in files.items() if t in tables}
 
-print(f"📦 Exporting database → {OUTPUT_DIR}")
+    if not files:
+        print(f"⚠️ No dump files found in {input_dir}")
+        return
 
-# Connect
-conn = psycopg2.connect(DATABASE_URL)
-cur = conn.cursor()
+    existing = set(list_tables(url))
+    conn = connect(url)
+    try:
+        for table in restore_order(list(files)):
+            if table not in existing:
+                print(f"⏭️  {table} does not exist in target database, skipping")
+                continue
+            print(f"➡️ Restoring {table}...")
+            count = restore_table(conn, url, table, files[table])
+            conn.commit()
+            print(f"✅ {table}: {count} rows")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-# Get all public tables
-cur.execute("""
-    SELECT tablename
-    FROM pg_tables
-    WHERE schemaname = 'public'
-""")
+    print("✅ Restore complete")
 
-tables = [row[0] for row in cur.fetchall()]
 
-if not tables:
-    print("⚠️ No tables found in public schema")
-    exit(0)
+def main():
+    parser = argparse.ArgumentParser(description="Dump or restore the expense tracker database")
+    sub = parser.add_subparsers(dest="command", required=True)
 
-print(f"🗂️ Found tables: {tables}")
+    dump_cmd = sub.add_parser("dump", help="Dump all tables to gzip CSV")
+    dump_cmd.add_argument("--out", help="Output directory (default: supabase_export_<db>)")
+    dump_cmd.add_argument("--workers", type=int, default=4, help="Tables dumped in parallel")
+    dump_cmd.add_argument("--tables", nargs="*", help="Only these tables")
+    dump_cmd.add_argument("--force", action="store_true", help="Re-dump tables already on disk")
 
-for table in tables:
-    print(f"➡️ Exporting {table}...")
+    restore_cmd = sub.add_parser("restore", help="Load a dump directory into the database")
+    restore_cmd.add_argument("input_dir")
+    restore_cmd.add_argument("--tables", nargs="*", help="Only these tables")
 
-    with open(f"{OUTPUT_DIR}/{table}.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
+    args = parser.parse_args()
 
-        # Fetch column names
-        cur.execute(f'SELECT * FROM "{table}" LIMIT 0')
-        colnames = [desc[0] for desc in cur.description]
-        writer.writerow(colnames)
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
 
-        # Fetch data
-        cur.execute(f'SELECT * FROM "{table}"')
-        for row in cur.fetchall():
-            writer.writerow(row)
+    if args.command == "dump":
+        # Parse DB name (for folder naming)
+        db_name = urlparse(DATABASE_URL).path.lstrip("/") or "postgres"
+        output_dir = args.out or f"supabase_export_{db_name}"
+        dump(DATABASE_URL, output_dir, max(1, args.workers), args.tables, args.force)
+    else:
+        restore(DATABASE_URL, args.input_dir, args.tables)
 
-print("✅ Export complete")
 
-cur.close()
-conn.close()
+if __name__ == "__main__":
+    main()
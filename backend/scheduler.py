@@ -0,0 +1,219 @@
+"""
+In-process scheduler for periodic jobs
+
+Started from startup_event, so periodic work (Splitwise sync, expired
+token cleanup) no longer depends on an external cron keeping one long HTTP
+request alive. Every worker process runs the loop, but each run of a job is
+guarded twice:
+
+1. A lock per job: a lease on the job's row in scheduled_jobs (locked_by /
+   locked_until), taken with one conditional UPDATE and released when the
+   run ends. No connection is held while the job runs, so a long sync
+   doesn't take a pooled connection away from its own workers; if the
+   process dies mid-run the lease simply expires after `lease`.
+2. Persisted last-run state in scheduled_jobs: after taking the lock a
+   worker re-checks last_started_at, so a job another worker just finished
+   isn't run again.
+
+Intervals get random jitter so workers (and jobs) don't all wake together.
+Jobs are plain functions run on a thread; an exception marks the run
+"failed" and the job is retried at its next interval.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import or_
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+
+
+class ScheduledJob:
+    def __init__(self, name: str, func: Callable[[], Optional[str]], interval: timedelta,
+                 jitter: float = 0.1, lease: Optional[timedelta] = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter  # fraction of the interval
+        self.lease = lease or interval  # lock expiry, in case a worker dies mid-run
+        self.next_run = time.monotonic() + self._jittered(initial=True)
+        self.running = False
+
+    def _jittered(self, initial: bool = False) -> float:
+        seconds = self.interval.total_seconds()
+        if initial:
+            # Spread first runs after a deploy instead of firing them all at boot
+            return random.uniform(0, seconds * max(self.jitter, 0.1))
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def schedule_next(self):
+        self.next_run = time.monotonic() + self._jittered()
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, func: Callable[[], Optional[str]], interval: timedelta, **kwargs):
+        self.jobs[name] = ScheduledJob(name, func, interval, **kwargs)
+
+    async def start(self):
+        if self._task is None and self.jobs:
+            self._task = asyncio.create_task(self._loop(), name="scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            now = time.monotonic()
+            for job in list(self.jobs.values()):
+                # A long job (a big sync) doesn't hold up the others
+                if job.next_run <= now and not job.running:
+                    job.schedule_next()
+                    asyncio.create_task(self._run_in_thread(job), name=f"scheduler-{job.name}")
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _run_in_thread(self, job: ScheduledJob):
+        job.running = True
+        try:
+            await asyncio.to_thread(self.run_job, job)
+        except Exception as e:
+            print(f"Scheduler: job {job.name} crashed: {e}")
+        finally:
+            job.running = False
+
+    # ---- one run -------------------------------------------------------
+
+    def run_job(self, job: ScheduledJob, force: bool = False) -> str:
+        """Run `job` if this worker gets its lock and it isn't already done; returns what happened"""
+        if not self._acquire_lease(job):
+            return "locked"
+        try:
+            return self._run_if_due(job, force)
+        finally:
+            self._release_lease(job)
+
+    def _run_if_due(self, job: ScheduledJob, force: bool) -> str:
+        from main import SessionLocal, ScheduledJobRun
+        db = SessionLocal()
+        try:
+            state = self._state(db, job)
+            # Another worker ran it recently (we only hold the lock, not the schedule)
+            min_gap = job.interval * (1 - job.jitter) * 0.9
+            if not force and state.last_started_at and datetime.utcnow() - state.last_started_at < min_gap:
+                db.rollback()
+                return "skipped"
+            state.last_started_at = datetime.utcnow()
+            state.last_status = "running"
+            state.last_worker = self.worker_id
+            db.commit()
+        finally:
+            db.close()
+
+        started = time.monotonic()
+        status, detail = "ok", None
+        try:
+            detail = job.func()
+        except Exception as e:
+            status, detail = "failed", f"{type(e).__name__}: {e}"
+            print(f"Scheduler: job {job.name} failed: {e}")
+
+        db = SessionLocal()
+        try:
+            state = db.get(ScheduledJobRun, job.name)
+            state.last_finished_at = datetime.utcnow()
+            state.last_status = status
+            state.last_detail = (detail or "")[:500] or None
+            state.last_duration = time.monotonic() - started
+            state.run_count = (state.run_count or 0) + 1
+            db.commit()
+        finally:
+            db.close()
+        return status
+
+    def _state(self, db, job: ScheduledJob):
+        from main import ScheduledJobRun
+        from sqlalchemy.exc import IntegrityError
+        state = db.get(ScheduledJobRun, job.name)
+        if state is None:
+            try:
+                db.add(ScheduledJobRun(name=job.name, run_count=0))
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # created by another worker
+            state = db.get(ScheduledJobRun, job.name)
+        return state
+
+    def _acquire_lease(self, job: ScheduledJob) -> bool:
+        from main import SessionLocal, ScheduledJobRun
+        db = SessionLocal()
+        try:
+            self._state(db, job)
+            now = datetime.utcnow()
+            acquired = db.query(ScheduledJobRun).filter(
+                ScheduledJobRun.name == job.name,
+                or_(ScheduledJobRun.locked_until.is_(None), ScheduledJobRun.locked_until < now),
+            ).update({
+                ScheduledJobRun.locked_by: self.worker_id,
+                ScheduledJobRun.locked_until: now + job.lease,
+            }, synchronize_session=False)
+            db.commit()
+            return acquired == 1
+        finally:
+            db.close()
+
+    def _release_lease(self, job: ScheduledJob):
+        from main import SessionLocal, ScheduledJobRun
+        db = SessionLocal()
+        try:
+            db.query(ScheduledJobRun).filter(
+                ScheduledJobRun.name == job.name,
+                ScheduledJobRun.locked_by == self.worker_id,
+            ).update({
+                ScheduledJobRun.locked_by: None,
+                ScheduledJobRun.locked_until: None,
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def status(self) -> dict:
+        """Persisted state of every registered job"""
+        from main import SessionLocal, ScheduledJobRun
+        db = SessionLocal()
+        try:
+            rows = {row.name: row for row in db.query(ScheduledJobRun).all()}
+        finally:
+            db.close()
+        jobs = {}
+        for name, job in self.jobs.items():
+            row = rows.get(name)
+            jobs[name] = {
+                "interval_seconds": job.interval.total_seconds(),
+                "next_run_in": round(max(0.0, job.next_run - time.monotonic())),
+                "last_started_at": row.last_started_at.isoformat() if row and row.last_started_at else None,
+                "last_finished_at": row.last_finished_at.isoformat() if row and row.last_finished_at else None,
+                "last_status": row.last_status if row else None,
+                "last_detail": row.last_detail if row else None,
+                "last_duration": row.last_duration if row else None,
+                "last_worker": row.last_worker if row else None,
+                "run_count": row.run_count if row else 0,
+            }
+        return {"enabled": SCHEDULER_ENABLED, "running": self._task is not None,
+                "worker": self.worker_id, "jobs": jobs}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,168 @@
+"""
+Accept-then-parse SMS ingestion
+
+The iOS Shortcut routes create a PendingTransaction in status "parsing" and
+return the approval URL right away when an SMS needs the LLM. A small pool
+of worker tasks on the server's event loop parses the queued SMS and fills
+in the pending row (status -> "pending"); the approval page polls
+GET /api/pending-transaction/{token} until then.
+
+Rows still "parsing" when the process stops are picked up again on startup,
+but only once their sms_claimed_at is older than SMS_INGEST_STALE_SECONDS:
+other live workers stamp the rows they queue and parse, and startup claims
+each stale row with a conditional UPDATE so only one worker requeues it.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, update
+
+SMS_INGEST_ASYNC = os.getenv("SMS_INGEST_ASYNC", "true").lower() == "true"
+SMS_INGEST_WORKERS = int(os.getenv("SMS_INGEST_WORKERS", "4"))
+SMS_INGEST_QUEUE_SIZE = int(os.getenv("SMS_INGEST_QUEUE_SIZE", "1000"))
+# A "parsing" row untouched this long belongs to a worker that went away
+SMS_INGEST_STALE_SECONDS = int(os.getenv("SMS_INGEST_STALE_SECONDS", "600"))
+
+
+class SmsIngestQueue:
+    def __init__(self, workers: int = SMS_INGEST_WORKERS, maxsize: int = SMS_INGEST_QUEUE_SIZE):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def start(self):
+        """Start the worker pool and requeue rows left in "parsing" by a worker that's gone"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"sms-ingest-{i}")
+            for i in range(self.workers)
+        ]
+        for pending_id in await asyncio.to_thread(self._stale_ids):
+            self.enqueue(pending_id)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def enqueue(self, pending_id: int) -> bool:
+        """Queue a pending row for parsing; False if the queue isn't running or is full"""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(pending_id)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _stale_ids(self) -> list:
+        """Claim abandoned "parsing" rows; each is claimed by exactly one worker"""
+        from main import SessionLocal, PendingTransaction
+        now = datetime.utcnow()
+        is_stale = (
+            (PendingTransaction.status == "parsing")
+            & or_(PendingTransaction.sms_claimed_at.is_(None),
+                  PendingTransaction.sms_claimed_at < now - timedelta(seconds=SMS_INGEST_STALE_SECONDS))
+        )
+        db = SessionLocal()
+        try:
+            candidates = [
+                pending_id for (pending_id,) in db.query(PendingTransaction.id).filter(is_stale).limit(self.maxsize)
+            ]
+            if not candidates:
+                return []
+            # Re-checked per row under its lock, so a worker that claimed it first wins
+            claimed = db.execute(
+                update(PendingTransaction)
+                .where(PendingTransaction.id.in_(candidates), is_stale)
+                .values(sms_claimed_at=now)
+                .returning(PendingTransaction.id)
+            ).scalars().all()
+            db.commit()
+            return claimed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _load_sms(self, pending_id: int) -> Optional[tuple]:
+        """(sms, user_id) for a row still waiting to be parsed"""
+        from main import SessionLocal, PendingTransaction
+        db = SessionLocal()
+        try:
+            pending = db.get(PendingTransaction, pending_id)
+            if pending is None or pending.status != "parsing":
+                return None
+            loaded = pending.source_sms, pending.user_id
+            # Keep the claim fresh so a restarting worker doesn't requeue it mid-parse
+            pending.sms_claimed_at = datetime.utcnow()
+            db.commit()
+            return loaded
+        finally:
+            db.close()
+
+    def _apply(self, pending_id: int, parse_result: dict):
+        from main import SessionLocal, PendingTransaction, fill_pending_from_sms
+        db = SessionLocal()
+        try:
+            pending = db.get(PendingTransaction, pending_id)
+            if pending is None or pending.status != "parsing":
+                return  # deleted or already handled while we were parsing
+            fill_pending_from_sms(db, pending, parse_result)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _worker(self):
+        from sms_parser_api import parse_sms_with_claude
+        while True:
+            pending_id = await self._queue.get()
+            try:
+                loaded = await asyncio.to_thread(self._load_sms, pending_id)
+                if loaded is not None:
+                    sms, user_id = loaded
+                    parse_result = await parse_sms_with_claude(sms, user_id=user_id)
+                    await asyncio.to_thread(self._apply, pending_id, parse_result)
+                    self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"SMS ingest failed for pending transaction {pending_id}: {e}")
+                try:
+                    await asyncio.to_thread(self._apply, pending_id, {"success": False})
+                except Exception:
+                    pass
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SMS_INGEST_ASYNC,
+            "running": self.running,
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+sms_ingest_queue = SmsIngestQueue()
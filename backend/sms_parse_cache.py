@@ -0,0 +1,377 @@
+"""
+Template-keyed parse cache for bank SMS
+
+Bank SMS come from a handful of fixed templates that only differ in amounts,
+dates and account digits. We mask those out to get a template signature,
+remember which masked slot held the amount/date when Claude parsed a message
+of that shape, and fill them in locally for the next message with the same
+signature - no LLM call needed.
+
+The merchant is not masked: nothing in an unseen message says where the
+payee name starts and ends, so the signature keeps it as literal text and
+an entry only serves repeats of the same template *and* merchant. Templates
+that generalise over merchants are learned per sender in sms_templates.py,
+which locates the merchant from Claude's answer and turns it into a regex
+group.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+SMS_PARSE_CACHE_SIZE = int(os.getenv("SMS_PARSE_CACHE_SIZE", "2048"))
+SMS_PARSE_CACHE_PERSIST = os.getenv("SMS_PARSE_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+SMS_PARSE_CACHE_FLUSH_SECONDS = float(os.getenv("SMS_PARSE_CACHE_FLUSH_SECONDS", "15"))
+
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+
+# Order matters: dates and times before amounts, amounts before bare digits
+SLOT_PATTERN = re.compile(
+    r"(?P<date>\b\d{4}-\d{2}-\d{2}\b"
+    r"|\b\d{1,2}[-/ ]" + _MONTHS + r"[-/ ,]*\d{2,4}\b"
+    r"|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b)"
+    r"|(?P<time>\b\d{1,2}:\d{2}(?::\d{2})?\b)"
+    r"|(?P<amt_prefix>(?:rs\.?|inr|₹)\s*)(?P<amt>\d[\d,]*(?:\.\d+)?)"
+    r"|(?P<dec>\b\d[\d,]*\.\d{1,2}\b)"
+    r"|(?P<num>\d+)",
+    re.IGNORECASE,
+)
+
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d-%b-%y", "%d-%b-%Y", "%d %b %y", "%d %b %Y", "%d%b%y", "%d%b%Y",
+    "%d-%B-%y", "%d-%B-%Y", "%d %B %Y",
+    "%d/%m/%y", "%d/%m/%Y", "%d-%m-%y", "%d-%m-%Y", "%d.%m.%y", "%d.%m.%Y",
+]
+
+
+def normalize_sms_date(raw: str) -> Optional[str]:
+    """Parse a date as it appears in bank SMS into YYYY-MM-DD"""
+    cleaned = re.sub(r"[\s,]+", " ", raw.strip())
+    for candidate in (cleaned, cleaned.replace(" ", "-")):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    try:
+        return float(raw.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def extract_template(sms_text: str) -> tuple[str, list]:
+    """
+    Mask the variable parts of an SMS.
+    Returns (signature, slots) where slots is a list of (kind, raw_value).
+    """
+    parts = []
+    slots = []
+    last = 0
+
+    for match in SLOT_PATTERN.finditer(sms_text):
+        parts.append(sms_text[last:match.start()])
+        if match.group("date"):
+            kind, value = "DATE", match.group("date")
+        elif match.group("time"):
+            kind, value = "TIME", match.group("time")
+        elif match.group("amt"):
+            parts.append(match.group("amt_prefix"))
+            kind, value = "AMT", match.group("amt")
+        elif match.group("dec"):
+            kind, value = "AMT", match.group("dec")
+        else:
+            kind, value = "N", match.group("num")
+        parts.append("{" + kind + "}")
+        slots.append((kind, value))
+        last = match.end()
+
+    parts.append(sms_text[last:])
+    signature = " ".join("".join(parts).lower().split())
+    return signature, slots
+
+
+def signature_key(signature: str) -> str:
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()
+
+
+def build_entry(slots: list, parsed: dict) -> Optional[dict]:
+    """
+    Work out how to rebuild `parsed` from the slots of its own message.
+    Returns None when the amount/date can't be tied to a slot.
+    """
+    amount = parsed.get("amount")
+    if amount is None:
+        return None
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return None
+
+    amount_slot = next(
+        (i for i, (kind, value) in enumerate(slots)
+         if kind in ("AMT", "N") and parse_amount(value) == amount),
+        None,
+    )
+    if amount_slot is None:
+        return None
+
+    date_slot = None
+    parsed_date = parsed.get("date")
+    for i, (kind, value) in enumerate(slots):
+        if kind == "DATE" and normalize_sms_date(value) == parsed_date:
+            date_slot = i
+            break
+    if date_slot is None and parsed_date != datetime.now().strftime("%Y-%m-%d"):
+        return None
+
+    return {
+        "amount_slot": amount_slot,
+        "date_slot": date_slot,
+        "merchant": parsed.get("merchant"),
+        "transaction_type": parsed.get("transaction_type", "debit"),
+        "category": parsed.get("category", "Other"),
+        "confidence": parsed.get("confidence", 0.9),
+    }
+
+
+def fill_entry(entry: dict, slots: list) -> Optional[dict]:
+    """Apply a cached entry to the slots of a new message"""
+    amount_slot = entry["amount_slot"]
+    if amount_slot >= len(slots):
+        return None
+    amount = parse_amount(slots[amount_slot][1])
+    if amount is None:
+        return None
+
+    if entry.get("date_slot") is None:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    else:
+        if entry["date_slot"] >= len(slots):
+            return None
+        date_str = normalize_sms_date(slots[entry["date_slot"]][1])
+        if not date_str:
+            return None
+
+    return {
+        "amount": amount,
+        "merchant": entry.get("merchant"),
+        "transaction_type": entry.get("transaction_type", "debit"),
+        "category": entry.get("category", "Other"),
+        "date": date_str,
+        "confidence": entry.get("confidence", 0.9),
+    }
+
+
+def merchant_in_slot(sms_text: str, merchant: Optional[str]) -> bool:
+    """
+    True if the merchant is made of masked digits (e.g. a phone-number UPI
+    handle). Messages with the same signature would then get this payee.
+    """
+    if not merchant or not any(ch.isdigit() for ch in merchant):
+        return False
+    found = re.search(re.escape(merchant.strip()), sms_text, re.IGNORECASE)
+    if not found:
+        return True  # digits we can't place; don't risk it
+    return any(
+        match.start() < found.end() and match.end() > found.start()
+        for match in SLOT_PATTERN.finditer(sms_text)
+    )
+
+
+class SMSParseCache:
+    """
+    Bounded LRU of template signature -> entry, optionally backed by a DB table.
+
+    Lookups never touch the database (they run on the event loop): the most
+    recently used persisted templates are preloaded at startup, and new
+    entries and hit counts are written behind by a background thread every
+    SMS_PARSE_CACHE_FLUSH_SECONDS.
+    """
+
+    def __init__(self, max_size: int = SMS_PARSE_CACHE_SIZE, persist: bool = SMS_PARSE_CACHE_PERSIST,
+                 flush_interval: float = SMS_PARSE_CACHE_FLUSH_SECONDS):
+        self.max_size = max_size
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = {}  # key -> (signature, entry)
+        self._unsaved_hits = {}  # key -> hits since the last flush
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self.hits = 0
+        self.misses = 0
+        self.preloaded = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def preload(self) -> int:
+        """Fill the LRU with the most recently used persisted templates (run off the event loop)"""
+        if not self.persist:
+            return 0
+        from sqlalchemy import func
+        from main import SessionLocal, SmsParseTemplate
+        db = SessionLocal()
+        try:
+            rows = db.query(SmsParseTemplate.signature_hash, SmsParseTemplate.payload).order_by(
+                func.coalesce(SmsParseTemplate.last_hit_at, SmsParseTemplate.created_at).desc()
+            ).limit(self.max_size).all()
+        finally:
+            db.close()
+
+        loaded = 0
+        with self._lock:
+            # Oldest first so the most recent end up at the hot end of the LRU;
+            # entries stored since startup win
+            for key, payload in reversed(rows):
+                if key in self._entries or len(self._entries) >= self.max_size:
+                    continue
+                try:
+                    self._entries[key] = json.loads(payload)
+                except ValueError:
+                    continue
+                self._entries.move_to_end(key, last=False)
+                loaded += 1
+            self.preloaded += loaded
+        return loaded
+
+    def _flush_if_due(self):
+        if not self.persist:
+            return
+        with self._lock:
+            due = (not self._flushing and (self._unsaved or self._unsaved_hits)
+                   and time.monotonic() - self._last_flush >= self.flush_interval)
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self.flush, name="sms-parse-cache-flush", daemon=True).start()
+
+    def flush(self):
+        """Write new entries and hit counts to sms_parse_templates"""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+            hits, self._unsaved_hits = self._unsaved_hits, {}
+            self._last_flush = time.monotonic()
+
+        try:
+            if self.persist and (unsaved or hits):
+                self._write(unsaved, hits)
+        except Exception as e:
+            print(f"SMS parse cache flush failed: {e}")
+            with self._lock:
+                # Keep them for the next attempt; newer stores win
+                for key, value in unsaved.items():
+                    self._unsaved.setdefault(key, value)
+                for key, count in hits.items():
+                    self._unsaved_hits[key] = self._unsaved_hits.get(key, 0) + count
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def _write(self, unsaved: dict, hits: dict):
+        from main import SessionLocal, SmsParseTemplate
+        db = SessionLocal()
+        try:
+            keys = set(unsaved) | set(hits)
+            rows = {
+                row.signature_hash: row
+                for row in db.query(SmsParseTemplate).filter(SmsParseTemplate.signature_hash.in_(keys))
+            }
+            now = datetime.utcnow()
+            for key, (signature, entry) in unsaved.items():
+                row = rows.get(key)
+                if row is None:
+                    row = SmsParseTemplate(signature_hash=key, signature=signature, hits=0)
+                    db.add(row)
+                    rows[key] = row
+                row.payload = json.dumps(entry)
+            for key, count in hits.items():
+                row = rows.get(key)
+                if row is not None:
+                    row.hits = (row.hits or 0) + count
+                    row.last_hit_at = now
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def lookup(self, sms_text: str) -> Optional[dict]:
+        """Return parsed data for a known template, or None"""
+        signature, slots = extract_template(sms_text)
+        key = signature_key(signature)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        data = fill_entry(entry, slots) if entry is not None else None
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._unsaved_hits[key] = self._unsaved_hits.get(key, 0) + 1
+        self._flush_if_due()
+        return data
+
+    def store(self, sms_text: str, parsed: dict) -> bool:
+        """Remember how an LLM parse maps onto this message's template"""
+        if merchant_in_slot(sms_text, parsed.get("merchant")):
+            return False
+        signature, slots = extract_template(sms_text)
+        entry = build_entry(slots, parsed)
+        if entry is None:
+            return False
+
+        key = signature_key(signature)
+        self._remember(key, entry)
+        with self._lock:
+            if self.persist:
+                self._unsaved[key] = (signature, entry)
+            self.stores += 1
+        self._flush_if_due()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            total = hits + misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "persisted": self.persist,
+                "hits": hits,
+                "misses": misses,
+                "preloaded": self.preloaded,
+                "unsaved": len(self._unsaved),
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+
+
+sms_parse_cache = SMSParseCache()
@@ -4,26 +4,30 @@ Uses Claude AI to parse bank SMS messages and extract transaction details
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import os
 import re
 import json
 from datetime import datetime
 from urllib.parse import urlencode
 
+from sms_parse_cache import SLOT_PATTERN, normalize_sms_date, parse_amount, sms_parse_cache
+from sms_templates import template_library
+from merchant_index import merchant_registry
+from keyword_matcher import SMS_KEYWORDS, TRANSACTION_TYPE_KEYWORDS, get_matcher, match_category
+from voice_transaction_api import authenticate_user
+
 # Initialize router
 router = APIRouter(prefix="/api/sms-parser", tags=["SMS Parser"])
 
-# Initialize Claude AI client
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if ANTHROPIC_API_KEY:
-    import anthropic
-    claude_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-else:
-    claude_client = None
+# Claude AI goes through the shared async client (llm_client.py)
+import llm_client
+from llm_usage import usage as llm_usage
 
 
 # ✅ CRITICAL: Define get_db FIRST before using it
@@ -41,6 +45,7 @@ def get_db():
 class SMSParseRequest(BaseModel):
     sms_text: str
     account_last_four: Optional[str] = None
+    sender: Optional[str] = None  # SMS sender ID, e.g. "AX-HDFCBK"
 
 
 class SMSParseResponse(BaseModel):
@@ -51,17 +56,71 @@ class SMSParseResponse(BaseModel):
     category: Optional[str] = None
     date: Optional[str] = None
     confidence: float  # 0.0 to 1.0
+    tier: Optional[str] = None  # 'local' or 'llm'
     raw_parsing: dict
 
 
-def parse_sms_with_claude(sms_text: str) -> dict:
+# Local parses scoring at least this much skip the LLM
+SMS_LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("SMS_LOCAL_CONFIDENCE_THRESHOLD", "0.8"))
+
+
+def parse_sms_local(sms_text: str, sender: Optional[str] = None) -> dict:
     """
-    Use Claude AI to parse bank SMS and extract transaction details
+    Local tiers, cheapest first: template cache, learned templates, regex.
+    The regex result carries a completeness score in data["confidence"].
     """
-    if not claude_client:
-        # Fallback to regex-based parsing if no API key
-        return parse_sms_regex(sms_text)
+    # Known template? Fill it in locally and skip the LLM
+    cached = sms_parse_cache.lookup(sms_text)
+    if cached:
+        return {
+            "success": True,
+            "data": cached,
+            "method": "template_cache",
+            "tier": "local"
+        }
+    
+    # Learned template for this sender that has proven accurate
+    learned = template_library.match(sms_text, sender)
+    if learned:
+        learned["category"] = detect_sms_category(sms_text.lower())
+        return {
+            "success": True,
+            "data": learned,
+            "method": "learned_template",
+            "tier": "local"
+        }
     
+    return parse_sms_regex(sms_text)
+
+
+def needs_llm(local_result: dict) -> bool:
+    """True if a local parse is too incomplete to use and Claude is available"""
+    if local_result["method"] != "regex":
+        return False
+    if local_result["data"]["confidence"] >= SMS_LOCAL_CONFIDENCE_THRESHOLD:
+        return False
+    # Without an API key, or while the LLM breaker is open, the regex result is the best we have
+    return llm_client.is_available()
+
+
+async def parse_sms_with_claude(sms_text: str, sender: Optional[str] = None,
+                                user_id: Optional[int] = None) -> dict:
+    """
+    Parse bank SMS and extract transaction details.
+    Tries the local parsers first and only asks Claude AI when the local
+    result is incomplete (score below SMS_LOCAL_CONFIDENCE_THRESHOLD).
+    """
+    # Regex tiers are CPU work; keep them off the event loop
+    local_result = await run_in_threadpool(parse_sms_local, sms_text, sender)
+    if not needs_llm(local_result):
+        llm_usage.record_local("sms_parse", local_result["method"], user_id)
+        return local_result
+    return await parse_sms_llm(sms_text, sender, local_result, user_id=user_id)
+
+
+async def parse_sms_llm(sms_text: str, sender: Optional[str], local_result: dict,
+                        user_id: Optional[int] = None) -> dict:
+    """Ask Claude AI; falls back to `local_result` on any failure"""
     try:
         # Create a structured prompt for Claude
         prompt = f"""Parse this bank SMS message and extract transaction details. Return ONLY a valid JSON object with no additional text.
@@ -90,12 +149,14 @@ Rules:
 Return ONLY the JSON object, nothing else."""
 
         # Call Claude API
-        message = claude_client.messages.create(
+        message = await llm_client.create_message(
             model="claude-sonnet-4-20250514",
             max_tokens=500,
             messages=[
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            route="sms_parse",
+            user_id=user_id,
         )
         
         # Extract the response
@@ -107,16 +168,65 @@ Return ONLY the JSON object, nothing else."""
         # Parse JSON
         parsed_data = json.loads(response_text)
         
+        # Learn this template for next time
+        sms_parse_cache.store(sms_text, parsed_data)
+        template_library.observe(sms_text, parsed_data, sender)
+        
         return {
             "success": True,
             "data": parsed_data,
-            "method": "claude_ai"
+            "method": "claude_ai",
+            "tier": "llm",
+            "local_score": local_result["data"]["confidence"]
         }
         
     except Exception as e:
         print(f"Claude AI parsing failed: {e}")
+        llm_usage.record_fallback("sms_parse", type(e).__name__, user_id)
         # Fallback to regex
-        return parse_sms_regex(sms_text)
+        return local_result
+
+
+# Compiled once at import rather than on every parse
+AMOUNT_PATTERNS = [
+    re.compile(r'rs\.?\s*(\d[\d,]*(?:\.\d{1,2})?)'),
+    re.compile(r'inr\.?\s*(\d[\d,]*(?:\.\d{1,2})?)'),
+    re.compile(r'₹\s*(\d[\d,]*(?:\.\d{1,2})?)'),
+    re.compile(r'debited.*?(\d[\d,]*(?:\.\d{1,2})?)'),
+    re.compile(r'credited.*?(\d[\d,]*(?:\.\d{1,2})?)'),
+]
+
+MERCHANT_PATTERNS = [
+    re.compile(r'at\s+([a-z\s]+?)(?:\.|avl|available|balance|on\s+\d)'),
+    re.compile(r'to\s+([a-z\s]+?)(?:\.|avl|available|balance)'),
+    re.compile(r'(?:debited|credited).*?(?:at|to)\s+([a-z\s]+)'),
+]
+
+
+# Weights for how complete a local parse is (sum to 1.0)
+SCORE_AMOUNT = 0.4
+SCORE_TRANSACTION_TYPE = 0.2
+SCORE_MERCHANT = 0.25
+SCORE_DATE = 0.15
+
+
+def score_local_parse(amount_found: bool, type_found: bool, merchant: Optional[str], date_ok: bool) -> float:
+    """Completeness score of a local parse, 0.0 to 1.0"""
+    score = 0.0
+    if amount_found:
+        score += SCORE_AMOUNT
+    if type_found:
+        score += SCORE_TRANSACTION_TYPE
+    if merchant and len(merchant) > 3:
+        score += SCORE_MERCHANT
+    if date_ok:
+        score += SCORE_DATE
+    return round(score, 2)
+
+
+def detect_sms_category(text_lower: str) -> str:
+    """Keyword-based category guess, "Other" if nothing matches"""
+    return match_category(text_lower, SMS_KEYWORDS)
 
 
 def parse_sms_regex(sms_text: str) -> dict:
@@ -136,60 +246,49 @@ def parse_sms_regex(sms_text: str) -> dict:
     text_lower = sms_text.lower()
     
     # Extract amount (Rs. 500, Rs 500, INR 500, 500.00, etc.)
-    amount_patterns = [
-        r'rs\.?\s*(\d+(?:\.\d{2})?)',
-        r'inr\.?\s*(\d+(?:\.\d{2})?)',
-        r'₹\s*(\d+(?:\.\d{2})?)',
-        r'debited.*?(\d+(?:\.\d{2})?)',
-        r'credited.*?(\d+(?:\.\d{2})?)',
-    ]
-    
-    for pattern in amount_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in AMOUNT_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
-            result["amount"] = float(match.group(1))
+            result["amount"] = parse_amount(match.group(1))
             break
     
     # Determine transaction type
-    if any(word in text_lower for word in ['debited', 'debit', 'paid', 'purchase', 'withdrawn']):
-        result["transaction_type"] = "debit"
-    elif any(word in text_lower for word in ['credited', 'credit', 'received', 'deposit']):
-        result["transaction_type"] = "credit"
+    transaction_type = get_matcher(TRANSACTION_TYPE_KEYWORDS).match(text_lower)
+    result["transaction_type"] = transaction_type or "debit"
     
     # Try to extract merchant (text after 'at' or before 'avl bal')
-    merchant_patterns = [
-        r'at\s+([a-z\s]+?)(?:\.|avl|available|balance|on\s+\d)',
-        r'to\s+([a-z\s]+?)(?:\.|avl|available|balance)',
-        r'(?:debited|credited).*?(?:at|to)\s+([a-z\s]+)',
-    ]
-    
-    for pattern in merchant_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in MERCHANT_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             merchant = match.group(1).strip()
             if len(merchant) > 3:  # Valid merchant name
                 result["merchant"] = merchant.title()
                 break
     
+    # Transaction date, if the SMS has one (otherwise today is right)
+    date_match = next((m for m in SLOT_PATTERN.finditer(sms_text) if m.group("date")), None)
+    date_ok = date_match is None
+    if date_match:
+        parsed_date = normalize_sms_date(date_match.group("date"))
+        if parsed_date:
+            result["date"] = parsed_date
+            date_ok = True
+    
     # Smart category detection based on keywords
-    category_keywords = {
-        "Food": ["restaurant", "cafe", "starbucks", "mcdonald", "food", "swiggy", "zomato", "dining"],
-        "Transport": ["uber", "ola", "fuel", "petrol", "metro", "taxi", "rapido"],
-        "Shopping": ["amazon", "flipkart", "mall", "store", "shop", "myntra"],
-        "Bills": ["electricity", "water", "gas", "mobile", "recharge", "jio", "airtel"],
-        "Entertainment": ["movie", "netflix", "spotify", "hotstar", "pvr", "cinema"],
-    }
+    result["category"] = detect_sms_category(text_lower)
     
-    for category, keywords in category_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            result["category"] = category
-            result["confidence"] = 0.7
-            break
+    result["confidence"] = score_local_parse(
+        result["amount"] is not None,
+        transaction_type is not None,
+        result["merchant"],
+        date_ok,
+    )
     
     return {
         "success": True,
         "data": result,
-        "method": "regex"
+        "method": "regex",
+        "tier": "local"
     }
 
 
@@ -219,7 +318,7 @@ async def parse_sms_message(request: SMSParseRequest):
     """
     
     # Parse SMS using Claude AI (with regex fallback)
-    parse_result = parse_sms_with_claude(request.sms_text)
+    parse_result = await parse_sms_with_claude(request.sms_text, request.sender)
     
     if not parse_result.get("success"):
         raise HTTPException(status_code=400, detail="Failed to parse SMS")
@@ -234,10 +333,177 @@ async def parse_sms_message(request: SMSParseRequest):
         category=data.get("category", "Other"),
         date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
         confidence=data.get("confidence", 0.5),
+        tier=parse_result.get("tier"),
         raw_parsing=parse_result
     )
 
 
+SMS_BATCH_MAX = int(os.getenv("SMS_BATCH_MAX", "200"))
+SMS_BATCH_LLM_CONCURRENCY = int(os.getenv("SMS_BATCH_LLM_CONCURRENCY", "4"))
+
+
+class SMSBatchItem(BaseModel):
+    sms_text: str
+    sender: Optional[str] = None
+
+
+class SMSBatchParseRequest(BaseModel):
+    messages: List[SMSBatchItem]
+    create_pending: bool = False
+
+
+def _pending_error(result: dict) -> Optional[str]:
+    """Why a parse can't become a pending transaction, or None if it can"""
+    data = result.get("data") or {}
+    if not result.get("success") or not data.get("amount"):
+        return "No transaction amount found"
+    try:
+        confidence = float(data.get("confidence", 0))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    if confidence < SMS_LOCAL_CONFIDENCE_THRESHOLD:
+        return "Parse confidence too low"
+    return None
+
+
+def _batch_line(result: dict, indexes: List[int], token: Optional[str],
+                error: Optional[str] = None) -> str:
+    data = result.get("data") or {}
+    return json.dumps({
+        "indexes": indexes,
+        "success": result.get("success", False),
+        "amount": data.get("amount"),
+        "merchant": data.get("merchant"),
+        "transaction_type": data.get("transaction_type", "debit"),
+        "category": data.get("category", "Other"),
+        "date": data.get("date"),
+        "confidence": data.get("confidence", 0.5),
+        "method": result.get("method"),
+        "tier": result.get("tier"),
+        "pending_token": token,
+        "error": error,
+    }) + "\n"
+
+
+@router.post("/parse-batch")
+async def parse_sms_batch(
+    request: SMSBatchParseRequest,
+    current_user = Depends(authenticate_user)
+):
+    """
+    Parse many SMS in one call, streamed back as NDJSON (one line per distinct SMS)
+    
+    Identical texts are parsed once; each line lists every input index it covers.
+    Local/cached parses are sent immediately, the rest go to Claude with at most
+    SMS_BATCH_LLM_CONCURRENCY calls in flight and are sent as each one finishes.
+    With create_pending=true, one PendingTransaction per distinct SMS that has an
+    amount and a confidence of at least SMS_LOCAL_CONFIDENCE_THRESHOLD is created
+    in a single bulk insert; the others get an "error" on their line. The last
+    line reports how many were created.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+    if len(request.messages) > SMS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SMS_BATCH_MAX} messages per batch")
+    
+    # Deduplicate identical texts, remembering every original position
+    unique = {}
+    for idx, item in enumerate(request.messages):
+        key = (item.sms_text.strip(), item.sender)
+        unique.setdefault(key, []).append(idx)
+    
+    user_id = current_user.id
+    create_pending = request.create_pending
+    
+    async def stream():
+        from main import PendingTransaction, SessionLocal
+        import secrets
+        
+        pending_rows = []
+        semaphore = asyncio.Semaphore(SMS_BATCH_LLM_CONCURRENCY)
+        
+        def emit(result: dict, indexes: List[int]) -> str:
+            token = error = None
+            data = result.get("data") or {}
+            if create_pending:
+                error = _pending_error(result)
+            if create_pending and not error:
+                token = secrets.token_urlsafe(16)
+                pending_rows.append({
+                    "user_id": user_id,
+                    "token": token,
+                    "amount": data.get("amount"),
+                    "description": data.get("merchant") or "Unknown",
+                    "category": data.get("category") or "Other",
+                    "date": data.get("date") or datetime.now().strftime("%Y-%m-%d"),
+                    "type": "income" if data.get("transaction_type") == "credit" else "expense",
+                    "status": "pending",
+                })
+            return _batch_line(result, indexes, token, error)
+        
+        async def run_llm(sms_text, sender, local_result, indexes):
+            async with semaphore:
+                return await parse_sms_llm(sms_text, sender, local_result, user_id=user_id), indexes
+        
+        # The whole local tier in one worker thread rather than on the event loop
+        local_results = await run_in_threadpool(
+            lambda: [parse_sms_local(sms_text, sender) for sms_text, sender in unique]
+        )
+        
+        tasks = []
+        for ((sms_text, sender), indexes), local_result in zip(unique.items(), local_results):
+            if needs_llm(local_result):
+                tasks.append(asyncio.create_task(run_llm(sms_text, sender, local_result, indexes)))
+            else:
+                llm_usage.record_local("sms_parse_batch", local_result["method"], user_id)
+                yield emit(local_result, indexes)
+        
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result, indexes = await finished
+                yield emit(result, indexes)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        summary = {"done": True, "total": len(request.messages), "distinct": len(unique)}
+        if create_pending:
+            def insert_pending():
+                db = SessionLocal()
+                try:
+                    if pending_rows:
+                        merchant_ids = merchant_registry.resolve_many(
+                            user_id, [row["description"] for row in pending_rows]
+                        )
+                        for row, merchant_id in zip(pending_rows, merchant_ids):
+                            row["merchant_id"] = merchant_id
+                        db.bulk_insert_mappings(PendingTransaction, pending_rows)
+                        db.commit()
+                    summary["pending_created"] = len(pending_rows)
+                except Exception as e:
+                    db.rollback()
+                    print(f"Batch pending insert failed: {e}")
+                    summary["pending_created"] = 0
+                    summary["error"] = "Failed to create pending transactions"
+                finally:
+                    db.close()
+            
+            # Merchant lookups and the bulk insert are blocking DB calls; keep them off the event loop
+            await run_in_threadpool(insert_pending)
+        yield json.dumps(summary) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/cache-stats")
+async def get_sms_parse_cache_stats():
+    """Hit/miss counters for the template parse cache and learned templates"""
+    return {
+        **sms_parse_cache.stats(),
+        "learned_templates": template_library.stats(),
+    }
+
+
 @router.get("/generate-url/{token}")
 async def generate_expense_url_from_sms(
     token: str,
@@ -270,7 +536,7 @@ async def generate_expense_url_from_sms(
         raise HTTPException(status_code=404, detail="Invalid token")
     
     # Parse the SMS
-    parse_result = parse_sms_with_claude(sms)
+    parse_result = await parse_sms_with_claude(sms)
     
     if not parse_result.get("success"):
         # If parsing fails, just redirect to basic URL
@@ -0,0 +1,425 @@
+"""
+Learned per-sender SMS extraction templates
+
+When Claude parses an SMS with high confidence we turn that message into a
+compiled regex: literal text stays literal, the amount/date/merchant become
+named groups and other numbers become wildcards. New templates start as
+candidates and are checked against Claude's answer on later messages of the
+same shape. Once a template has been right often enough it is promoted and
+answers matching messages locally, without a network round trip.
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_
+
+from sms_parse_cache import SLOT_PATTERN, normalize_sms_date, parse_amount
+
+LEARN_MIN_CONFIDENCE = float(os.getenv("SMS_TEMPLATE_LEARN_MIN_CONFIDENCE", "0.85"))
+PROMOTE_AFTER = int(os.getenv("SMS_TEMPLATE_PROMOTE_AFTER", "3"))
+PROMOTE_MIN_ACCURACY = float(os.getenv("SMS_TEMPLATE_PROMOTE_MIN_ACCURACY", "0.9"))
+MAX_TEMPLATES_PER_SENDER = int(os.getenv("SMS_TEMPLATE_MAX_PER_SENDER", "50"))
+SMS_TEMPLATE_FLUSH_SECONDS = float(os.getenv("SMS_TEMPLATE_FLUSH_SECONDS", "15"))
+
+DEFAULT_SENDER = "*"
+
+SLOT_REGEX = {
+    "DATE": r"[0-9A-Za-z][0-9A-Za-z/ .,-]*?",
+    "TIME": r"\d{1,2}:\d{2}(?::\d{2})?",
+    "AMT": r"\d[\d,]*(?:\.\d+)?",
+    "N": r"\d+",
+}
+
+
+def _literal(text: str) -> str:
+    """Escape literal text, allowing any run of whitespace to vary"""
+    if not text:
+        return ""
+    return r"\s+".join(re.escape(part) for part in re.split(r"\s+", text))
+
+
+def _normalize_merchant(value: Optional[str]) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def derive_pattern(sms_text: str, parsed: dict) -> Optional[str]:
+    """
+    Build an extraction regex for this message shape from an LLM parse.
+    Returns None if the amount, date or merchant can't be located in the text.
+    """
+    try:
+        amount = float(parsed.get("amount"))
+    except (TypeError, ValueError):
+        return None
+
+    merchant = (parsed.get("merchant") or "").strip()
+    merchant_span = None
+    if merchant:
+        found = re.search(re.escape(merchant), sms_text, re.IGNORECASE)
+        if found:
+            merchant_span = (found.start(), found.end())
+
+    # (start, end, regex) segments for everything that is not literal text
+    segments = []
+    if merchant_span:
+        segments.append((merchant_span[0], merchant_span[1], r"(?P<merchant>.+?)"))
+
+    amount_taken = False
+    date_taken = False
+    for match in SLOT_PATTERN.finditer(sms_text):
+        if match.group("amt"):
+            start, end, kind, value = match.start("amt"), match.end("amt"), "AMT", match.group("amt")
+        elif match.group("dec"):
+            start, end, kind, value = match.start(), match.end(), "AMT", match.group("dec")
+        elif match.group("date"):
+            start, end, kind, value = match.start(), match.end(), "DATE", match.group("date")
+        elif match.group("time"):
+            start, end, kind, value = match.start(), match.end(), "TIME", match.group("time")
+        else:
+            start, end, kind, value = match.start(), match.end(), "N", match.group("num")
+
+        if merchant_span and start < merchant_span[1] and end > merchant_span[0]:
+            continue  # digits inside the merchant name
+
+        regex = SLOT_REGEX[kind]
+        if not amount_taken and kind in ("AMT", "N") and parse_amount(value) == amount:
+            regex = r"(?P<amount>" + SLOT_REGEX["AMT"] + ")"
+            amount_taken = True
+        elif not date_taken and kind == "DATE" and normalize_sms_date(value) == parsed.get("date"):
+            regex = r"(?P<date>" + SLOT_REGEX["DATE"] + ")"
+            date_taken = True
+        segments.append((start, end, regex))
+
+    if not amount_taken:
+        return None
+
+    segments.sort()
+    pattern = []
+    last = 0
+    for start, end, regex in segments:
+        pattern.append(_literal(sms_text[last:start]))
+        pattern.append(regex)
+        last = end
+    pattern.append(_literal(sms_text[last:]))
+    return "".join(pattern)
+
+
+class LearnedTemplate:
+    def __init__(self, sender: str, pattern: str, transaction_type: str,
+                 verified: int = 0, failed: int = 0, promoted: bool = False, db_id: Optional[int] = None):
+        self.sender = sender
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        self.transaction_type = transaction_type
+        self.verified = verified
+        self.failed = failed
+        self.promoted = promoted
+        self.db_id = db_id
+        self.hits = 0
+        self.last_used = time.monotonic()
+        self.evicted = False
+        # Counts observed since the last flush, added to the stored ones on write
+        self.unsaved_verified = 0
+        self.unsaved_failed = 0
+
+    @property
+    def accuracy(self) -> float:
+        total = self.verified + self.failed
+        return self.verified / total if total else 0.0
+
+    @property
+    def qualifies(self) -> bool:
+        """Proven often and accurately enough to answer locally"""
+        return self.verified >= PROMOTE_AFTER and self.accuracy >= PROMOTE_MIN_ACCURACY
+
+    def extract(self, sms_text: str) -> Optional[dict]:
+        match = self.regex.fullmatch(sms_text.strip())
+        if not match:
+            return None
+
+        groups = match.groupdict()
+        amount = parse_amount(groups["amount"])
+        if amount is None:
+            return None
+
+        if groups.get("date") is not None:
+            date_str = normalize_sms_date(groups["date"])
+            if not date_str:
+                return None
+        else:
+            date_str = datetime.now().strftime("%Y-%m-%d")
+
+        merchant = groups.get("merchant")
+        return {
+            "amount": amount,
+            "merchant": merchant.strip() if merchant else None,
+            "transaction_type": self.transaction_type,
+            "category": None,
+            "date": date_str,
+            "confidence": round(self.accuracy, 2),
+        }
+
+    def agrees_with(self, extracted: dict, parsed: dict) -> bool:
+        try:
+            same_amount = float(parsed.get("amount")) == extracted["amount"]
+        except (TypeError, ValueError):
+            return False
+        return (
+            same_amount
+            and extracted["date"] == parsed.get("date")
+            and extracted["transaction_type"] == parsed.get("transaction_type")
+            and _normalize_merchant(extracted["merchant"]) == _normalize_merchant(parsed.get("merchant"))
+        )
+
+
+class TemplateLibrary:
+    """
+    Per-sender set of learned templates, persisted to sms_learned_templates.
+
+    match() and observe() run on the event loop, so they never touch the
+    database: the library is loaded once at startup (load(), on a thread)
+    and changes are written behind every SMS_TEMPLATE_FLUSH_SECONDS. Until
+    the load finishes every message simply goes to the LLM.
+    """
+
+    def __init__(self, flush_interval: float = SMS_TEMPLATE_FLUSH_SECONDS):
+        self._by_sender = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.flush_interval = flush_interval
+        self._dirty = set()  # templates changed since the last flush
+        self._deleted = set()  # db ids of evicted templates
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self.local_hits = 0
+        self.learned = 0
+        self.promotions = 0
+        self.demotions = 0
+        self.evictions = 0
+
+    def load(self):
+        """Read every learned template (run off the event loop)"""
+        from main import SessionLocal, SmsLearnedTemplate
+        db = SessionLocal()
+        try:
+            rows = db.query(SmsLearnedTemplate).all()
+        finally:
+            db.close()
+
+        by_sender = {}
+        for row in rows:
+            by_sender.setdefault(row.sender, []).append(LearnedTemplate(
+                sender=row.sender,
+                pattern=row.pattern,
+                transaction_type=row.transaction_type,
+                verified=row.verified_count or 0,
+                failed=row.failed_count or 0,
+                promoted=bool(row.promoted),
+                db_id=row.id,
+            ))
+        with self._lock:
+            self._by_sender = by_sender
+            self._loaded = True
+        return len(rows)
+
+    def _mark_dirty(self, template: LearnedTemplate):
+        with self._lock:
+            self._dirty.add(template)
+            due = not self._flushing and time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self.flush, name="sms-template-flush", daemon=True).start()
+
+    def flush(self):
+        """Add changed templates' new counts to the stored ones and drop evicted ones"""
+        with self._lock:
+            dirty = []
+            for template in self._dirty:
+                dirty.append((template, template.unsaved_verified, template.unsaved_failed))
+                template.unsaved_verified = template.unsaved_failed = 0
+            self._dirty = set()
+            deleted, self._deleted = self._deleted, set()
+            self._last_flush = time.monotonic()
+
+        try:
+            if dirty or deleted:
+                self._write(dirty, deleted)
+        except Exception as e:
+            print(f"SMS template save failed: {e}")
+            with self._lock:
+                # Keep the counts for the next attempt
+                for template, verified, failed in dirty:
+                    template.unsaved_verified += verified
+                    template.unsaved_failed += failed
+                    if not template.evicted:
+                        self._dirty.add(template)
+                self._deleted |= deleted
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def _write(self, dirty: list, deleted: set):
+        """
+        Upsert on (sender, pattern) so every worker's counts add up in one row,
+        then pick up the merged totals (including other workers' observations).
+        """
+        from main import SessionLocal, SmsLearnedTemplate, engine
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        table = SmsLearnedTemplate.__table__
+        db = SessionLocal()
+        try:
+            if deleted:
+                db.query(SmsLearnedTemplate).filter(
+                    SmsLearnedTemplate.id.in_(deleted)
+                ).delete(synchronize_session=False)
+            saved = []
+            for template, verified, failed in dirty:
+                stmt = dialect_insert(table).values(
+                    sender=template.sender,
+                    pattern=template.pattern,
+                    transaction_type=template.transaction_type,
+                    verified_count=verified,
+                    failed_count=failed,
+                    promoted=template.qualifies,
+                )
+                verified_total = table.c.verified_count + stmt.excluded.verified_count
+                failed_total = table.c.failed_count + stmt.excluded.failed_count
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.sender, table.c.pattern],
+                    set_={
+                        "verified_count": verified_total,
+                        "failed_count": failed_total,
+                        "promoted": and_(
+                            verified_total >= PROMOTE_AFTER,
+                            verified_total >= PROMOTE_MIN_ACCURACY * (verified_total + failed_total),
+                        ),
+                        "updated_at": datetime.utcnow(),
+                    },
+                ).returning(table.c.id, table.c.verified_count, table.c.failed_count)
+                saved.append((template, db.execute(stmt).one()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            for template, (row_id, verified_count, failed_count) in saved:
+                template.db_id = row_id
+                template.verified = verified_count + template.unsaved_verified
+                template.failed = failed_count + template.unsaved_failed
+                template.promoted = template.qualifies
+                if template.evicted:
+                    # Evicted while this write was in flight
+                    self._deleted.add(row_id)
+
+    def _evict(self, templates: list):
+        """Make room in a full sender: drop the least useful, least recently used template"""
+        victim = min(templates, key=lambda t: (t.promoted, t.verified + t.hits, t.last_used))
+        templates.remove(victim)
+        victim.evicted = True
+        self._dirty.discard(victim)
+        if victim.db_id:
+            self._deleted.add(victim.db_id)
+        self.evictions += 1
+
+    def _find(self, sms_text: str, sender: str) -> tuple[Optional[LearnedTemplate], Optional[dict]]:
+        """First matching template, trying promoted ones before candidates"""
+        templates = list(self._by_sender.get(sender, []))
+        for template in sorted(templates, key=lambda t: not t.promoted):
+            extracted = template.extract(sms_text)
+            if extracted:
+                return template, extracted
+        return None, None
+
+    def match(self, sms_text: str, sender: Optional[str] = None) -> Optional[dict]:
+        """Parse with a promoted template, or None if the LLM is still needed"""
+        if not self._loaded:
+            return None
+        template, extracted = self._find(sms_text, sender or DEFAULT_SENDER)
+        if template is None or not template.promoted:
+            return None
+        template.hits += 1
+        template.last_used = time.monotonic()
+        self.local_hits += 1
+        return extracted
+
+    def observe(self, sms_text: str, parsed: dict, sender: Optional[str] = None):
+        """Feed an LLM parse back in: verify a matching template or learn a new one"""
+        if not self._loaded:
+            return
+        sender = sender or DEFAULT_SENDER
+
+        template, extracted = self._find(sms_text, sender)
+        if template is not None:
+            template.last_used = time.monotonic()
+            agrees = template.agrees_with(extracted, parsed)
+            with self._lock:
+                if agrees:
+                    template.verified += 1
+                    template.unsaved_verified += 1
+                else:
+                    template.failed += 1
+                    template.unsaved_failed += 1
+
+            if not template.promoted and template.qualifies:
+                template.promoted = True
+                self.promotions += 1
+            elif template.promoted and template.accuracy < PROMOTE_MIN_ACCURACY:
+                template.promoted = False
+                self.demotions += 1
+            self._mark_dirty(template)
+            return
+
+        try:
+            confidence = float(parsed.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if confidence < LEARN_MIN_CONFIDENCE:
+            return
+
+        pattern = derive_pattern(sms_text, parsed)
+        if not pattern:
+            return
+
+        template = LearnedTemplate(sender, pattern, parsed.get("transaction_type", "debit"))
+        extracted = template.extract(sms_text)
+        if not extracted or not template.agrees_with(extracted, parsed):
+            return
+
+        template.verified = template.unsaved_verified = 1
+        with self._lock:
+            templates = self._by_sender.setdefault(sender, [])
+            if len(templates) >= MAX_TEMPLATES_PER_SENDER:
+                self._evict(templates)
+            templates.append(template)
+        self.learned += 1
+        self._mark_dirty(template)
+
+    def stats(self) -> dict:
+        templates = [t for group in self._by_sender.values() for t in group]
+        return {
+            "senders": len(self._by_sender),
+            "templates": len(templates),
+            "promoted": sum(1 for t in templates if t.promoted),
+            "local_hits": self.local_hits,
+            "learned": self.learned,
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+            "evictions": self.evictions,
+            "unsaved": len(self._dirty),
+        }
+
+
+template_library = TemplateLibrary()
@@ -0,0 +1,176 @@
+"""
+Compressed storage for raw Splitwise expense payloads
+
+The raw get_expenses JSON is only ever needed for debugging, so it no
+longer lives in pending_transactions (which every pending list scans).
+It goes to splitwise_payloads, keyed by pending transaction id, as zlib
+with a preset dictionary: a skeleton of a Splitwise expense with every key
+and the common fixed strings, so even a single small payload compresses
+well (plain zlib can't reuse anything across rows).
+
+A dictionary can never change once payloads have been written with it.
+To improve it, add a new entry to ZDICTS and bump CURRENT_DICT_VERSION;
+every row records the version it was compressed with.
+
+compact_legacy() moves payloads still in the old
+pending_transactions.splitwise_raw_json column (run in the background at
+startup).
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+COMPACT_BATCH_SIZE = 500
+
+
+def _expense_skeleton() -> list:
+    # json.dumps() of these produces the same separators and key order as the
+    # payloads the sync stores, so long runs match the dictionary verbatim.
+    picture = {
+        "small": "https://s3.amazonaws.com/splitwise/uploads/user/default_avatars/avatar-blue1-50px.png",
+        "medium": "https://s3.amazonaws.com/splitwise/uploads/user/default_avatars/avatar-blue1-100px.png",
+        "large": "https://s3.amazonaws.com/splitwise/uploads/user/default_avatars/avatar-blue1-200px.png",
+    }
+    person = {"id": 0, "first_name": "", "last_name": "", "picture": picture}
+    # Most frequent material goes last: zlib prefers the closest match
+    return [
+        {"creation_method": "split", "category": {"id": 13, "name": "Dining out"}},
+        {"category": {"id": 15, "name": "Groceries"}, "currency_code": "USD"},
+        {"repeat_interval": "monthly", "creation_method": "unequal", "custom_picture": False},
+        {
+            "id": 0, "group_id": None, "friendship_id": None, "expense_bundle_id": None,
+            "description": "", "repeats": False, "repeat_interval": "never",
+            "email_reminder": False, "email_reminder_in_advance": -1, "next_repeat": None,
+            "details": None, "comments_count": 0, "payment": False,
+            "creation_method": "equal", "transaction_method": "offline",
+            "transaction_confirmed": False, "transaction_id": None, "transaction_status": None,
+            "cost": "0.0", "currency_code": "INR",
+            "repayments": [{"from": 0, "to": 0, "amount": "0.0"}],
+            "date": "2024-01-01T00:00:00Z", "created_at": "2024-01-01T00:00:00Z",
+            "created_by": person, "updated_at": "2024-01-01T00:00:00Z", "updated_by": None,
+            "deleted_at": None, "deleted_by": None,
+            "category": {"id": 18, "name": "General"},
+            "receipt": {"large": None, "original": None},
+            "users": [
+                {"user": {"id": 0, "first_name": "", "last_name": "", "picture": {"medium": picture["medium"]}},
+                 "user_id": 0, "paid_share": "0.0", "owed_share": "0.0", "net_balance": "0.0"},
+            ],
+            "comments": [],
+            "group": {"name": ""},
+        },
+    ]
+
+
+ZDICTS = {
+    1: json.dumps(_expense_skeleton()).encode("utf-8"),
+}
+CURRENT_DICT_VERSION = 1
+
+
+def compress_payload(payload: dict) -> Tuple[int, bytes, int]:
+    """(dictionary version, compressed bytes, uncompressed size)"""
+    raw = json.dumps(payload).encode("utf-8")
+    compressor = zlib.compressobj(level=9, zdict=ZDICTS[CURRENT_DICT_VERSION])
+    return CURRENT_DICT_VERSION, compressor.compress(raw) + compressor.flush(), len(raw)
+
+
+def decompress_payload(blob: bytes, dict_version: int) -> dict:
+    decompressor = zlib.decompressobj(zdict=ZDICTS[dict_version])
+    return json.loads(decompressor.decompress(blob) + decompressor.flush())
+
+
+def store_payloads(db, payloads: Iterable[Tuple[int, dict]]):
+    """
+    Add or replace payloads for (pending id, raw expense) pairs in the caller's
+    session, so they commit together with the pending rows.
+    """
+    from main import SplitwisePayload
+    rows = []
+    for pending_id, payload in payloads:
+        dict_version, blob, raw_bytes = compress_payload(payload)
+        rows.append({
+            "pending_id": pending_id,
+            "dict_version": dict_version,
+            "raw_bytes": raw_bytes,
+            "payload": blob,
+            "created_at": datetime.utcnow(),
+        })
+    if not rows:
+        return
+    db.query(SplitwisePayload).filter(
+        SplitwisePayload.pending_id.in_([row["pending_id"] for row in rows])
+    ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(SplitwisePayload, rows)
+
+
+def load_payload(db, pending_id: int) -> Optional[dict]:
+    """The raw Splitwise expense for a pending transaction, if one was stored"""
+    from main import SplitwisePayload, PendingTransaction
+    row = db.get(SplitwisePayload, pending_id)
+    if row is not None:
+        return decompress_payload(row.payload, row.dict_version)
+    legacy = db.query(PendingTransaction.splitwise_raw_json).filter(
+        PendingTransaction.id == pending_id
+    ).scalar()
+    return json.loads(legacy) if legacy else None
+
+
+def compact_legacy(batch_size: int = COMPACT_BATCH_SIZE) -> int:
+    """Move payloads out of pending_transactions.splitwise_raw_json; returns rows moved"""
+    from main import SessionLocal, PendingTransaction
+    moved = 0
+    while True:
+        db = SessionLocal()
+        try:
+            legacy = db.query(PendingTransaction.id, PendingTransaction.splitwise_raw_json).filter(
+                PendingTransaction.splitwise_raw_json.isnot(None)
+            ).limit(batch_size).all()
+            if not legacy:
+                return moved
+
+            payloads = []
+            for pending_id, raw in legacy:
+                try:
+                    payloads.append((pending_id, json.loads(raw)))
+                except ValueError:
+                    pass  # not JSON; nothing worth keeping
+            store_payloads(db, payloads)
+            db.query(PendingTransaction).filter(
+                PendingTransaction.id.in_([pending_id for pending_id, _ in legacy])
+            ).update({PendingTransaction.splitwise_raw_json: None}, synchronize_session=False)
+            db.commit()
+            moved += len(legacy)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def storage_report(db) -> dict:
+    """Bytes stored vs. uncompressed, plus anything not yet compacted"""
+    from sqlalchemy import func
+    from main import SplitwisePayload, PendingTransaction
+    rows, raw_bytes, stored_bytes = db.query(
+        func.count(SplitwisePayload.pending_id),
+        func.coalesce(func.sum(SplitwisePayload.raw_bytes), 0),
+        func.coalesce(func.sum(func.length(SplitwisePayload.payload)), 0),
+    ).one()
+    legacy_rows, legacy_bytes = db.query(
+        func.count(PendingTransaction.id),
+        func.coalesce(func.sum(func.length(PendingTransaction.splitwise_raw_json)), 0),
+    ).filter(PendingTransaction.splitwise_raw_json.isnot(None)).one()
+
+    raw_bytes, stored_bytes = int(raw_bytes), int(stored_bytes)
+    return {
+        "payloads": rows,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "bytes_saved": raw_bytes - stored_bytes,
+        "compression_ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+        "dict_version": CURRENT_DICT_VERSION,
+        "legacy_rows": legacy_rows,
+        "legacy_bytes": int(legacy_bytes),
+    }
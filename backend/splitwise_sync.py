@@ -0,0 +1,307 @@
+"""
+Splitwise sync-all orchestrator
+
+The cron-driven /api/splitwise/sync-all used to sync every connected user
+one after another inside the request, on one Session. Now it starts a
+SyncAllJob and returns its id right away; the job syncs users concurrently
+on a bounded thread pool, each with its own short-lived session, and
+records per-user results so progress can be polled. Progress is saved to
+splitwise_sync_jobs every SPLITWISE_SYNC_JOB_SAVE_SECONDS, so any worker
+process can report on (or join) a job another worker is running, and job
+history survives restarts.
+
+All Splitwise API calls go through splitwise_throttle, a process-wide
+token bucket that keeps us under Splitwise's rate limit. A 429 pauses every
+worker (Retry-After, or exponential backoff with jitter), not just the one
+that hit it. Each user sync has a deadline so one slow account can't hold
+the job open.
+"""
+
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Optional
+
+SPLITWISE_SYNC_WORKERS = int(os.getenv("SPLITWISE_SYNC_WORKERS", "4"))
+SPLITWISE_USER_TIMEOUT = float(os.getenv("SPLITWISE_USER_TIMEOUT", "120"))
+# Requests per second across all workers (token bucket refill rate) and burst size
+SPLITWISE_RATE_LIMIT = float(os.getenv("SPLITWISE_RATE_LIMIT", "2"))
+SPLITWISE_RATE_BURST = int(os.getenv("SPLITWISE_RATE_BURST", "5"))
+SPLITWISE_MAX_RETRIES = int(os.getenv("SPLITWISE_MAX_RETRIES", "4"))
+SPLITWISE_BACKOFF_BASE = 1.0
+SPLITWISE_BACKOFF_MAX = 60.0
+SYNC_JOB_HISTORY = 20
+SPLITWISE_SYNC_JOB_SAVE_SECONDS = float(os.getenv("SPLITWISE_SYNC_JOB_SAVE_SECONDS", "5"))
+# A "running" job whose progress hasn't been saved for this long lost its worker
+SPLITWISE_SYNC_JOB_STALE_SECONDS = float(os.getenv("SPLITWISE_SYNC_JOB_STALE_SECONDS", "120"))
+
+
+class SplitwiseThrottle:
+    """Process-wide token bucket with a shared pause for 429 backoff"""
+
+    def __init__(self, rate: float = SPLITWISE_RATE_LIMIT, burst: int = SPLITWISE_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def wait(self, deadline: Optional[float] = None):
+        """Block until a request may be sent; TimeoutError if that's past `deadline`"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TimeoutError("Splitwise sync deadline exceeded")
+            time.sleep(delay)
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None):
+        """Pause all callers after a 429"""
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(SPLITWISE_BACKOFF_MAX, SPLITWISE_BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.5)
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.throttled += 1
+
+
+class SyncAllJob:
+    def __init__(self, user_ids: list):
+        self.id = uuid.uuid4().hex
+        self.user_ids = user_ids
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.imported = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = {}  # user_id -> message
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, user_id: int, imported: int = 0, error: Optional[str] = None):
+        with self._lock:
+            if error is None:
+                self.succeeded += 1
+                self.imported += imported
+            else:
+                self.failed += 1
+                self.errors[user_id] = error
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "users": len(self.user_ids),
+                "done": self.succeeded + self.failed,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "imported": self.imported,
+                "errors": dict(self.errors),
+                "started_at": self.started_at.isoformat(),
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+
+def _row_dict(row) -> dict:
+    """Same shape as SyncAllJob.to_dict(), from a splitwise_sync_jobs row"""
+    return {
+        "job_id": row.id,
+        "status": row.status,
+        "users": row.users or 0,
+        "done": (row.succeeded or 0) + (row.failed or 0),
+        "succeeded": row.succeeded or 0,
+        "failed": row.failed or 0,
+        "imported": row.imported or 0,
+        "errors": json.loads(row.errors) if row.errors else {},
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+
+class SyncAllOrchestrator:
+    """
+    Runs sync-all jobs in this process and keeps their progress in
+    splitwise_sync_jobs. start()/get()/wait() return job dicts
+    (SyncAllJob.to_dict() shape) whichever worker owns the job.
+    """
+
+    def __init__(self, workers: int = SPLITWISE_SYNC_WORKERS):
+        self.workers = workers
+        self._jobs = OrderedDict()  # job id -> SyncAllJob started here, most recent last
+        self._lock = threading.Lock()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> dict:
+        """Start a sync-all job, or return the one already running on any worker"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == "running":
+                    return job.to_dict()
+            # Two workers starting at the same instant can both get here; that
+            # only costs a duplicate pass, since pending inserts skip conflicts.
+            running = self._running_elsewhere()
+            if running is not None:
+                return running
+            job = SyncAllJob(self._connected_user_ids())
+            self._save(job)
+            self._jobs[job.id] = job
+            while len(self._jobs) > SYNC_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+
+        threading.Thread(target=self._run, args=(job,), name=f"splitwise-sync-{job.id[:8]}", daemon=True).start()
+        return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        from main import SessionLocal, SplitwiseSyncJob
+        db = SessionLocal()
+        try:
+            row = db.get(SplitwiseSyncJob, job_id)
+            return _row_dict(row) if row else None
+        finally:
+            db.close()
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Block until the job finishes or `timeout` passes; returns its latest state"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+            return job.to_dict()
+
+        # Running on another worker: poll its saved progress
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if state is None or state["status"] != "running" or remaining <= 0:
+                return state
+            time.sleep(min(SPLITWISE_SYNC_JOB_SAVE_SECONDS, remaining))
+
+    def _running_elsewhere(self) -> Optional[dict]:
+        """A job another worker is still running; jobs it stopped saving are marked abandoned"""
+        from main import SessionLocal, SplitwiseSyncJob
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            for row in db.query(SplitwiseSyncJob).filter(SplitwiseSyncJob.status == "running"):
+                if (now - row.updated_at).total_seconds() < SPLITWISE_SYNC_JOB_STALE_SECONDS:
+                    return _row_dict(row)
+                row.status = "abandoned"
+                row.finished_at = now
+            db.commit()
+            return None
+        finally:
+            db.close()
+
+    def _save(self, job: SyncAllJob):
+        """Write the job's progress; a new job also trims history to SYNC_JOB_HISTORY"""
+        from main import SessionLocal, SplitwiseSyncJob
+        state = job.to_dict()
+        db = SessionLocal()
+        try:
+            row = db.get(SplitwiseSyncJob, job.id)
+            if row is None:
+                keep = [
+                    job_id for (job_id,) in db.query(SplitwiseSyncJob.id)
+                    .order_by(SplitwiseSyncJob.started_at.desc()).limit(SYNC_JOB_HISTORY - 1)
+                ]
+                db.query(SplitwiseSyncJob).filter(
+                    SplitwiseSyncJob.status != "running", SplitwiseSyncJob.id.notin_(keep)
+                ).delete(synchronize_session=False)
+                row = SplitwiseSyncJob(id=job.id, worker=self.worker_id, started_at=job.started_at)
+                db.add(row)
+            row.status = state["status"]
+            row.users = state["users"]
+            row.succeeded = state["succeeded"]
+            row.failed = state["failed"]
+            row.imported = state["imported"]
+            row.errors = json.dumps({str(k): v for k, v in state["errors"].items()}) if state["errors"] else None
+            row.finished_at = job.finished_at
+            row.updated_at = datetime.utcnow()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _save_progress(self, job: SyncAllJob):
+        try:
+            self._save(job)
+        except Exception as e:
+            print(f"Saving Splitwise sync-all job {job.id} failed: {e}")
+
+    def _connected_user_ids(self) -> list:
+        from main import SessionLocal, User
+        db = SessionLocal()
+        try:
+            return [
+                user_id for (user_id,) in db.query(User.id).filter(User.splitwise_access_token.isnot(None))
+            ]
+        finally:
+            db.close()
+
+    def _sync_user(self, job: SyncAllJob, user_id: int):
+        from main import SessionLocal, User, sync_splitwise_for_user
+        db = SessionLocal()
+        try:
+            user = db.get(User, user_id)
+            if user is None:
+                job.record(user_id)
+                return
+            imported = sync_splitwise_for_user(
+                db, user, deadline=time.monotonic() + SPLITWISE_USER_TIMEOUT
+            )
+            job.record(user_id, imported)
+        except Exception as e:
+            db.rollback()
+            print(f"Sync failed for user {user_id}: {e}")
+            job.record(user_id, error=f"{type(e).__name__}: {e}"[:300])
+        finally:
+            db.close()
+
+    def _run(self, job: SyncAllJob):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="splitwise-sync") as pool:
+                pending = {pool.submit(self._sync_user, job, user_id) for user_id in job.user_ids}
+                while pending:
+                    _, pending = wait(pending, timeout=SPLITWISE_SYNC_JOB_SAVE_SECONDS)
+                    self._save_progress(job)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Splitwise sync-all job {job.id} failed: {e}")
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._save_progress(job)
+            job.done.set()
+            print(f"Splitwise sync-all {job.id}: {job.to_dict()['done']}/{len(job.user_ids)} users, "
+                  f"{job.imported} imported, {job.failed} failed")
+
+
+splitwise_throttle = SplitwiseThrottle()
+sync_all_jobs = SyncAllOrchestrator()
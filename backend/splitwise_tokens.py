@@ -0,0 +1,139 @@
+"""
+Splitwise OAuth token manager
+
+access_token() returns a usable access token for a user, refreshing it with
+the stored refresh token shortly before splitwise_token_expires_at instead
+of letting a sync fail on a guaranteed 401.
+
+Refreshes are single-flight: an in-process lock per user stops concurrent
+syncs (sync-all workers, a manual sync) from refreshing at the same time,
+and the refresh runs under a row lock on the user, so another worker that
+already refreshed is noticed and its tokens reused. The new access token,
+refresh token and expiry are committed together.
+
+The refresh uses the caller's session (the one `user` was loaded in) rather
+than opening a second one, so a sync thread never holds two pooled
+connections here. It commits that session, so call it before making changes.
+
+Tokens Splitwise has rejected (a real 401) and that can't be refreshed are
+remembered, so syncs fail fast until the user reconnects (which stores a
+new token). A failed proactive refresh only logs and keeps the current
+token, retrying after SPLITWISE_REFRESH_RETRY_SECONDS.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from http_client import http as outbound_http
+
+SPLITWISE_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("SPLITWISE_REFRESH_MARGIN_SECONDS", "300")))
+# After a failed proactive refresh, wait this long before trying again
+SPLITWISE_REFRESH_RETRY_SECONDS = float(os.getenv("SPLITWISE_REFRESH_RETRY_SECONDS", "900"))
+
+
+class SplitwiseAuthError(Exception):
+    """The user's Splitwise authorization is gone; they need to reconnect"""
+
+
+class SplitwiseTokenManager:
+    def __init__(self):
+        self._locks = {}  # user_id -> threading.Lock
+        self._locks_guard = threading.Lock()
+        self._rejected = {}  # user_id -> access token Splitwise rejected
+        self._retry_at = {}  # user_id -> monotonic time of the next proactive refresh attempt
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _lock_for(self, user_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _needs_refresh(self, expires_at: Optional[datetime]) -> bool:
+        return expires_at is not None and expires_at - SPLITWISE_REFRESH_MARGIN <= datetime.utcnow()
+
+    def access_token(self, user, db) -> str:
+        """A usable access token for `user` (refreshed first if about to expire)"""
+        token = user.splitwise_access_token
+        if self._rejected.get(user.id) == token:
+            raise SplitwiseAuthError("Splitwise authorization expired")
+        if (self._needs_refresh(user.splitwise_token_expires_at) and user.splitwise_refresh_token
+                and time.monotonic() >= self._retry_at.get(user.id, 0)):
+            token = self._refresh(user, db, force=False)
+        return token
+
+    def rejected(self, user, db) -> str:
+        """Splitwise returned 401 for the current token: refresh once or give up"""
+        if not user.splitwise_refresh_token:
+            self._rejected[user.id] = user.splitwise_access_token
+            raise SplitwiseAuthError("Splitwise authorization expired")
+        return self._refresh(user, db, force=True)
+
+    def _refresh(self, user, db, force: bool) -> str:
+        from main import User, SPLITWISE_BASE_URL, SPLITWISE_CLIENT_ID, SPLITWISE_CLIENT_SECRET
+        stale_token = user.splitwise_access_token
+        user_id = user.id
+
+        with self._lock_for(user_id):
+            try:
+                # populate_existing: `row` is the caller's `user`, reloaded under the lock
+                row = db.query(User).filter(User.id == user_id).with_for_update().populate_existing().first()
+                if row is None or not row.splitwise_access_token:
+                    raise SplitwiseAuthError("Splitwise not connected")
+
+                # Someone else refreshed while we waited for the lock
+                already_refreshed = row.splitwise_access_token != stale_token
+                if already_refreshed or not (force or self._needs_refresh(row.splitwise_token_expires_at)):
+                    token = row.splitwise_access_token
+                    db.commit()  # release the row lock
+                    return token
+
+                resp = outbound_http.post(
+                    f"{SPLITWISE_BASE_URL}/oauth/token",
+                    data={
+                        "grant_type": "refresh_token",
+                        "refresh_token": row.splitwise_refresh_token,
+                        "client_id": SPLITWISE_CLIENT_ID,
+                        "client_secret": SPLITWISE_CLIENT_SECRET,
+                    },
+                )
+                if resp.status_code != 200:
+                    db.commit()  # release the row lock
+                    self.refresh_failures += 1
+                    print(f"Splitwise token refresh failed for user {user_id}: {resp.status_code} {resp.text[:200]}")
+                    if force and resp.status_code in (400, 401):
+                        # Splitwise already rejected the access token and the
+                        # refresh token is dead too (invalid_grant)
+                        self._rejected[user_id] = stale_token
+                        raise SplitwiseAuthError("Splitwise authorization expired")
+                    # A proactive refresh failing says nothing about the access
+                    # token (our expiry may just be a guess); keep using it
+                    if not force:
+                        self._retry_at[user_id] = time.monotonic() + SPLITWISE_REFRESH_RETRY_SECONDS
+                    return stale_token
+
+                tokens = resp.json()
+                token = tokens["access_token"]
+                row.splitwise_access_token = token
+                row.splitwise_refresh_token = tokens.get("refresh_token") or row.splitwise_refresh_token
+                row.splitwise_token_expires_at = datetime.utcnow() + timedelta(seconds=tokens.get("expires_in", 3600))
+                db.commit()
+                self.refreshes += 1
+                self._rejected.pop(user_id, None)
+                self._retry_at.pop(user_id, None)
+                return token
+            except Exception:
+                db.rollback()
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "rejected_users": len(self._rejected),
+        }
+
+
+splitwise_tokens = SplitwiseTokenManager()
@@ -0,0 +1,33 @@
+import sqlite3
+
+import migrations
+
+PAYLOAD = b"\x00\x01PK\xff"
+
+
+def make_db(path, rows=()):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE merchant_models (user_id INTEGER PRIMARY KEY, payload BLOB NOT NULL, rows INTEGER)")
+    conn.executemany("INSERT INTO merchant_models VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_binary_columns_survive_dump_and_restore(tmp_path):
+    source, target, out = tmp_path / "source.db", tmp_path / "target.db", tmp_path / "dump"
+    make_db(source, [(1, PAYLOAD, 3), (2, b"", None)])
+    make_db(target)
+
+    migrations.dump(f"sqlite:///{source}", str(out), workers=1)
+    migrations.restore(f"sqlite:///{target}", str(out))
+
+    conn = sqlite3.connect(target)
+    restored = conn.execute("SELECT user_id, payload, typeof(payload), rows FROM merchant_models ORDER BY user_id").fetchall()
+    conn.close()
+    assert restored[0] == (1, PAYLOAD, "blob", 3)
+    assert restored[1] == (2, b"", "blob", None)
+
+
+def test_bytes_encoding_matches_postgres_bytea_hex():
+    assert migrations.encode_bytes(PAYLOAD) == "\\x0001504bff"
+    assert migrations.decode_bytes("\\x0001504bff") == PAYLOAD
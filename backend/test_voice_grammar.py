@@ -0,0 +1,50 @@
+from datetime import date
+
+from voice_grammar import parse_amount_tokens, parse_utterance
+
+CATEGORIES = ["Bills", "Education", "Entertainment", "Food", "Health", "Income", "Shopping", "Transport"]
+TODAY = date(2026, 10, 19)
+
+
+def parse(text):
+    return parse_utterance(text, CATEGORIES, today=TODAY)
+
+
+def test_saath_is_not_sixty_next_to_a_digit_amount():
+    [item] = parse("dost ke saath 500 ka dinner")
+    assert item["amount"] == 500.0
+    assert item["category"] == "Food"
+
+
+def test_ambiguous_words_next_to_digits_are_words():
+    for text in ("do 300 lunch", "che 100 lunch", "das 200 ka lunch", "500 ka saath lunch"):
+        [item] = parse(text)
+        assert item["amount"] in (100.0, 200.0, 300.0, 500.0)
+        assert str(int(item["amount"])) in text
+
+
+def test_number_words_without_digits():
+    assert parse("do sau pachas ka lunch")[0]["amount"] == 250.0
+    assert parse("das hazaar rent")[0]["amount"] == 10_000.0
+    assert parse("paanch hazaar rent")[0]["amount"] == 5_000.0
+
+
+def test_digits_are_never_added_together():
+    assert parse_amount_tokens(["300", "200"]) is None
+    assert parse_amount_tokens(["500", "saath"]) is None
+    assert parse_amount_tokens(["ek", "150"]) is None
+    assert parse("300 200 lunch") is None
+
+
+def test_digit_scales_still_combine():
+    assert parse_amount_tokens(["1", "lakh", "50", "thousand"]) == 150_000.0
+    assert parse_amount_tokens(["2.5k"]) == 2_500.0
+    assert parse_amount_tokens(["5", "hundred"]) == 500.0
+
+
+def test_several_items_with_shared_date():
+    items = parse("kal 300 ka lunch aur 200 uber")
+    assert [(i["amount"], i["category"], i["date"]) for i in items] == [
+        (300.0, "Food", "2026-10-18"),
+        (200.0, "Transport", "2026-10-18"),
+    ]
@@ -0,0 +1,264 @@
+"""
+Local fast path for simple voice utterances
+
+Handles entries like "500 on groceries", "kal 300 ka lunch aur 200 uber"
+or "paanch hazaar rent" without calling the LLM:
+
+- amounts: digits (1,500 / 2.5), k / thousand / hazaar / lakh suffixes,
+  and English + Hindi/Hinglish number words ("do sau pachas", "five hundred")
+- dates: today/aaj, yesterday/kal, day before yesterday/parso, last week,
+  and weekday names (English and Hindi), resolved to the most recent one
+- several items split on "and" / "aur" / commas
+- categories from a precomputed lookup over the user's category names, then
+  the caller's learned classifier, then the keyword lists (keyword_matcher.py)
+
+parse_utterance() returns None whenever any word can't be accounted for, so
+anything unusual still goes to the LLM.
+"""
+
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from keyword_matcher import DESCRIPTION_KEYWORDS, SMS_KEYWORDS, match_category
+
+NUMBER_WORDS = {
+    # English
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    # Hindi / Hinglish
+    "ek": 1, "teen": 3, "char": 4, "chaar": 4, "paanch": 5, "panch": 5,
+    "chhe": 6, "saat": 7, "aath": 8, "nau": 9, "dus": 10,
+    "gyarah": 11, "barah": 12, "pandrah": 15, "bees": 20, "pachees": 25,
+    "tees": 30, "chalis": 40, "chaalis": 40, "pachas": 50, "pachaas": 50,
+    "sattar": 70, "assi": 80, "nabbe": 90,
+    "dedh": 1.5, "dhai": 2.5, "dhaai": 2.5,
+}
+# Number spellings that are also everyday words ("saath" = with, "do", "das").
+# Only read as numbers right before sau/hazaar/lakh ("do sau", "das hazaar"),
+# otherwise "dost ke saath 500 ka dinner" would come out as 560.
+AMBIGUOUS_NUMBER_WORDS = {"do": 2, "das": 10, "che": 6, "saath": 60}
+HUNDRED_WORDS = {"hundred", "sau"}
+SCALE_WORDS = {
+    "thousand": 1_000, "hazaar": 1_000, "hazar": 1_000, "hajar": 1_000, "k": 1_000,
+    "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000,
+}
+
+WEEKDAYS = {
+    "monday": 0, "somvar": 0, "somwar": 0,
+    "tuesday": 1, "mangalvar": 1, "mangalwar": 1,
+    "wednesday": 2, "budhvar": 2, "budhwar": 2,
+    "thursday": 3, "guruvar": 3, "guruwar": 3, "brihaspativar": 3,
+    "friday": 4, "shukravar": 4, "shukrawar": 4,
+    "saturday": 5, "shanivar": 5, "shaniwar": 5,
+    "sunday": 6, "ravivar": 6, "raviwar": 6, "itvaar": 6, "itwar": 6,
+}
+
+# Multi-word date phrases first, longest first
+DATE_PHRASES = [
+    ("day before yesterday", 2), ("last week", 7), ("pichle hafte", 7),
+    ("today", 0), ("aaj", 0), ("yesterday", 1), ("kal", 1), ("parso", 2), ("parson", 2),
+]
+
+INCOME_VERBS = {"received", "got", "mila", "mile", "credited", "earned"}
+INCOME_WORDS = INCOME_VERBS | {"income", "salary"}
+
+# Words that carry no information for the transaction
+FILLER_WORDS = {
+    "on", "for", "of", "at", "to", "in", "the", "a", "an", "i", "my", "me", "was", "is",
+    "spent", "spend", "paid", "pay", "bought", "buy", "gave", "worth", "expense", "expenses",
+    "rs", "rupees", "rupee", "rupaye", "rupaiye", "rupay", "rupiya", "inr", "bucks",
+    "ka", "ki", "ke", "ko", "me", "mein", "pe", "par", "se", "liye", "diya", "diye",
+    "kiya", "kharcha", "kharch", "liya", "maine", "mera", "meri", "hua", "huye", "tha",
+    "last", "this", "pichle",
+}
+
+_DIGIT_GROUPING = re.compile(r"(?<=\d),(?=\d)")
+_ITEM_SPLIT = re.compile(r"\s*(?:,|;|\band\b|\baur\b|&|\bplus\b|\bthen\b)\s*")
+_NUMBER_TOKEN = re.compile(r"^(\d+(?:\.\d+)?)(k|l)?$")
+_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?[kl]?")
+
+
+def relative_date(phrase: str, today: Optional[date] = None) -> Optional[date]:
+    """Date for a spoken date word/phrase, or None if it isn't one"""
+    today = today or date.today()
+    text = phrase.lower()
+    for words, days_ago in DATE_PHRASES:
+        if re.search(rf"\b{words}\b", text):
+            return today - timedelta(days=days_ago)
+    for word, weekday in WEEKDAYS.items():
+        if re.search(rf"\b{word}\b", text):
+            return today - timedelta(days=(today.weekday() - weekday) % 7)
+    return None
+
+
+def _category_words(name: str) -> set:
+    words = set(re.findall(r"[a-z]+", name.lower())) - {"and", "the", "of"}
+    # Naive singular forms so "grocery" matches "Groceries" and "bill" matches "Bills"
+    for word in list(words):
+        if word.endswith("ies"):
+            words.add(word[:-3] + "y")
+        elif word.endswith("s") and len(word) > 3:
+            words.add(word[:-1])
+    return words
+
+
+@lru_cache(maxsize=512)
+def build_category_lookup(category_names: tuple) -> dict:
+    """word -> category name, built once per distinct category list"""
+    lookup = {}
+    for name in category_names:
+        lookup.setdefault(name.lower(), name)
+        for word in _category_words(name):
+            lookup.setdefault(word, name)
+    return lookup
+
+
+def parse_amount_tokens(tokens: List[str]) -> Optional[float]:
+    """
+    Combine number tokens ("paanch", "sau", "pachas") into one amount. Digits
+    are never added to number words or to other digits ("300 200" is None).
+    """
+    total, current, seen = 0.0, 0.0, False
+    has_digits = any(_NUMBER_TOKEN.match(token) for token in tokens)
+    for token in tokens:
+        match = _NUMBER_TOKEN.match(token)
+        if match:
+            if current:
+                return None
+            value = float(match.group(1))
+            if match.group(2) == "k":
+                value *= 1_000
+            elif match.group(2) == "l":
+                value *= 100_000
+            current += value
+        elif token in NUMBER_WORDS or token in AMBIGUOUS_NUMBER_WORDS:
+            if has_digits:
+                return None
+            current += NUMBER_WORDS[token] if token in NUMBER_WORDS else AMBIGUOUS_NUMBER_WORDS[token]
+        elif token in HUNDRED_WORDS:
+            current = (current or 1) * 100
+        elif token in SCALE_WORDS:
+            total += (current or 1) * SCALE_WORDS[token]
+            current = 0
+        else:
+            return None
+        seen = True
+    return total + current if seen else None
+
+
+def _number_token_flags(tokens: List[str]) -> List[bool]:
+    """Which tokens are part of an amount"""
+    # With a digit amount present, number words are just words ("ek coffee 150")
+    words_allowed = not any(_NUMBER_TOKEN.match(token) for token in tokens)
+    flags = []
+    for index, token in enumerate(tokens):
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if _NUMBER_TOKEN.match(token) or token in HUNDRED_WORDS or token in SCALE_WORDS:
+            flags.append(True)
+        elif token in NUMBER_WORDS:
+            flags.append(words_allowed)
+        elif token in AMBIGUOUS_NUMBER_WORDS:
+            flags.append(words_allowed and (following in HUNDRED_WORDS or following in SCALE_WORDS))
+        else:
+            flags.append(False)
+    return flags
+
+
+def _parse_item(item: str, lookup: dict,
+                classify: Optional[Callable[[str], Optional[str]]]) -> Optional[dict]:
+    tokens = _TOKEN.findall(item)
+    if len(tokens) != len(item.split()):
+        return None  # punctuation or glued tokens we don't understand
+
+    # Exactly one contiguous run of number tokens is the amount
+    runs, run = [], []
+    for index, is_number in enumerate(_number_token_flags(tokens)):
+        if is_number:
+            run.append(index)
+        elif run:
+            runs.append(run)
+            run = []
+    if run:
+        runs.append(run)
+    if len(runs) != 1:
+        return None
+    amount = parse_amount_tokens([tokens[i] for i in runs[0]])
+    if not amount or amount <= 0:
+        return None
+
+    rest = [t for i, t in enumerate(tokens) if i not in runs[0]]
+    trans_type = "income" if any(t in INCOME_WORDS for t in rest) else "expense"
+
+    words, category = [], None
+    for token in rest:
+        if token in FILLER_WORDS or token in INCOME_VERBS or token in WEEKDAYS:
+            continue
+        if any(token == phrase for phrase, _ in DATE_PHRASES) or token in {"day", "before", "week", "hafte"}:
+            continue
+        words.append(token)
+
+    if not words and trans_type == "income":
+        words = ["income"]
+    if not words:
+        return None
+    description = " ".join(words)
+
+    # The user's own category names first, then what they've taught us, then keywords
+    for word in words:
+        if word in lookup:
+            category = lookup[word]
+            break
+    if category is None and classify is not None:
+        category = classify(description)
+    for keywords in (DESCRIPTION_KEYWORDS, SMS_KEYWORDS):
+        if category is not None:
+            break
+        label = match_category(description, keywords, default=None)
+        if label:
+            category = lookup.get(label.lower())
+    if category is None and trans_type == "income":
+        category = lookup.get("income")
+    if category is None:
+        return None
+
+    return {
+        "amount": amount,
+        "category": category,
+        "description": description.capitalize(),
+        "type": trans_type,
+    }
+
+
+def parse_utterance(text: str, category_names: List[str],
+                    classify: Optional[Callable[[str], Optional[str]]] = None,
+                    today: Optional[date] = None) -> Optional[List[dict]]:
+    """
+    Transactions for a simple utterance, or None if any part of it isn't
+    understood (the caller should then ask the LLM). `classify` maps a
+    description to one of the user's categories or None.
+    """
+    today = today or date.today()
+    normalized = _DIGIT_GROUPING.sub("", (text or "").lower())
+    normalized = normalized.replace("₹", " rs ").replace("/-", " ")
+    normalized = re.sub(r"[.!?]+(\s|$)", " ", normalized).strip()
+    if not normalized:
+        return None
+
+    items = [item for item in _ITEM_SPLIT.split(normalized) if item.strip()]
+    if not items:
+        return None
+
+    lookup = build_category_lookup(tuple(category_names))
+    shared_date = relative_date(normalized, today)
+    transactions = []
+    for item in items:
+        parsed = _parse_item(item, lookup, classify)
+        if parsed is None:
+            return None
+        parsed["date"] = (relative_date(item, today) or shared_date or today).isoformat()
+        transactions.append(parsed)
+    return transactions
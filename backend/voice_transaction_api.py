@@ -12,18 +12,18 @@ import json
 from datetime import datetime, timedelta
 import anthropic
 
+import llm_client
+from llm_usage import usage as llm_usage
+from merchant_index import merchant_registry
+from merchant_classifier import merchant_classifier
+from category_directory import category_directory
+from voice_grammar import parse_utterance, relative_date
+
 router = APIRouter(prefix="/api/voice", tags=["Voice Transactions"])
 
 # Security
 security = HTTPBearer()
 
-# Initialize Claude AI client
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if ANTHROPIC_API_KEY:
-    claude_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-else:
-    claude_client = None
-
 
 def get_db():
     """Get database session"""
@@ -76,16 +76,10 @@ def parse_relative_date(date_text: str) -> str:
     """Convert relative dates like 'yesterday', 'today' to YYYY-MM-DD"""
     today = datetime.now().date()
     
-    date_lower = date_text.lower()
-    
-    if "today" in date_lower:
-        return today.isoformat()
-    elif "yesterday" in date_lower:
-        return (today - timedelta(days=1)).isoformat()
-    elif "day before yesterday" in date_lower:
-        return (today - timedelta(days=2)).isoformat()
-    elif "last week" in date_lower:
-        return (today - timedelta(days=7)).isoformat()
+    # today / yesterday / day before yesterday / last week / weekday names
+    spoken = relative_date(date_text, today)
+    if spoken is not None:
+        return spoken.isoformat()
     else:
         # Try to parse as date, otherwise return today
         try:
@@ -96,6 +90,83 @@ def parse_relative_date(date_text: str) -> str:
             return today.isoformat()
 
 
+def save_voice_transactions(db: Session, current_user, transactions_data: list,
+                            category_names: list, today_date: str) -> VoiceTransactionResponse:
+    """Validate parsed transactions (from the LLM or voice_grammar) and create expenses"""
+    # Process all transactions
+    from main import Expense
+    created_expenses = []
+
+    for idx, transaction_data in enumerate(transactions_data):
+        # Validate and normalize data - handle None values properly
+        amount_raw = transaction_data.get("amount")
+
+        # Check if amount is None or invalid
+        if amount_raw is None or amount_raw == "":
+            continue  # Skip invalid transactions
+
+        try:
+            amount = float(amount_raw)
+        except (ValueError, TypeError):
+            continue  # Skip invalid amounts
+
+        category = transaction_data.get("category") or "Other"
+        description = transaction_data.get("description") or f"Voice transaction {idx+1}"
+        date_str = transaction_data.get("date") or today_date
+        trans_type = transaction_data.get("type") or "expense"
+
+        # Validate amount is positive
+        if amount <= 0:
+            continue
+
+        # Ensure category is in user's list
+        if category not in category_names:
+            # Find closest match or use "Other"
+            category = "Other" if "Other" in category_names else category_names[0]
+
+        # Validate date format
+        date_str = parse_relative_date(date_str)
+
+        # Create actual transaction directly
+        expense = Expense(
+            user_id=current_user.id,
+            amount=amount,
+            description=description,
+            category=category,
+            date=date_str,
+            type=trans_type,
+            merchant_id=merchant_registry.resolve(current_user.id, description),
+        )
+
+        db.add(expense)
+        created_expenses.append({
+            "amount": amount,
+            "category": category,
+            "description": description,
+            "date": date_str,
+            "type": trans_type
+        })
+
+    # Commit all transactions at once
+    if created_expenses:
+        db.commit()
+
+        # Return summary of all created transactions
+        return VoiceTransactionResponse(
+            success=True,
+            amount=sum(t["amount"] for t in created_expenses),  # Total amount
+            category=f"{len(created_expenses)} transactions",  # Count
+            description=", ".join(t["description"] for t in created_expenses),  # All descriptions
+            date=today_date,
+            type="expense"
+        )
+    else:
+        return VoiceTransactionResponse(
+            success=False,
+            error="Could not process any valid transactions. Please try again."
+        )
+
+
 @router.post("/parse-transaction", response_model=VoiceTransactionResponse)
 def parse_voice_transaction(
     request: VoiceTransactionRequest,
@@ -103,28 +174,42 @@ def parse_voice_transaction(
     db: Session = Depends(get_db)
 ):
     """
-    Parse voice transcription and extract transaction details using Claude Haiku
+    Parse voice transcription and extract transaction details.
+    Simple utterances are handled locally (voice_grammar.py); everything else
+    goes to Claude Haiku.
     """
     
-    # Import models here to avoid circular import
-    from main import Category
-    
-    if not claude_client:
-        raise HTTPException(status_code=500, detail="AI service not configured. Please set ANTHROPIC_API_KEY.")
-    
     # Get user's categories
-    user_categories = db.query(Category).filter(
-        Category.user_id == current_user.id
-    ).all()
-    
-    category_names = [cat.name for cat in user_categories]
+    category_names = category_directory.names(current_user.id)
     
     if not category_names:
         category_names = ["Food", "Transport", "Bills", "Shopping", "Other"]
     
-    # Prepare prompt for Claude
     today_date = datetime.now().date().isoformat()
     
+    # Fast path: no LLM call when every part of the utterance is understood
+    local_transactions = parse_utterance(
+        request.text,
+        category_names,
+        classify=lambda description: merchant_classifier.predict(
+            current_user.id, description, allowed=category_names
+        ),
+    )
+    if local_transactions:
+        llm_usage.record_local("voice_parse", "grammar", current_user.id)
+        return save_voice_transactions(db, current_user, local_transactions, category_names, today_date)
+    
+    if not llm_client.is_configured():
+        raise HTTPException(status_code=500, detail="AI service not configured. Please set ANTHROPIC_API_KEY.")
+    
+    if not llm_client.is_available():
+        llm_usage.record_fallback("voice_parse", "breaker_open", current_user.id)
+        return VoiceTransactionResponse(
+            success=False,
+            error="AI service is busy right now. Please try again in a minute."
+        )
+    
+    # Prepare prompt for Claude
     prompt = f"""Extract transaction details from this voice input. The user may speak in English, Hindi, Hinglish, or any Indian language, but RETURN EVERYTHING IN ENGLISH.
 
 Voice Input: "{request.text}"
@@ -169,11 +254,13 @@ Return ONLY the JSON array, no other text."""
 
     try:
         # Call Claude Haiku 4.5 (correct model name)
-        message = claude_client.messages.create(
+        message = llm_client.create_message_sync(
             model="claude-haiku-4-5",  # Correct Haiku 4.5 model string
             max_tokens=300,
             temperature=0.0,  # Deterministic
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            route="voice_parse",
+            user_id=current_user.id,
         )
         
         response_text = message.content[0].text.strip()
@@ -199,83 +286,19 @@ Return ONLY the JSON array, no other text."""
                 error="No transactions detected. Please try again."
             )
         
-        # Process all transactions
-        from main import Expense
-        created_expenses = []
-        
-        for idx, transaction_data in enumerate(transactions_data):
-            # Validate and normalize data - handle None values properly
-            amount_raw = transaction_data.get("amount")
-            
-            # Check if amount is None or invalid
-            if amount_raw is None or amount_raw == "":
-                continue  # Skip invalid transactions
-            
-            try:
-                amount = float(amount_raw)
-            except (ValueError, TypeError):
-                continue  # Skip invalid amounts
-            
-            category = transaction_data.get("category") or "Other"
-            description = transaction_data.get("description") or f"Voice transaction {idx+1}"
-            date_str = transaction_data.get("date") or today_date
-            trans_type = transaction_data.get("type") or "expense"
-            
-            # Validate amount is positive
-            if amount <= 0:
-                continue
-            
-            # Ensure category is in user's list
-            if category not in category_names:
-                # Find closest match or use "Other"
-                category = "Other" if "Other" in category_names else category_names[0]
-            
-            # Validate date format
-            date_str = parse_relative_date(date_str)
-            
-            # Create actual transaction directly
-            expense = Expense(
-                user_id=current_user.id,
-                amount=amount,
-                description=description,
-                category=category,
-                date=date_str,
-                type=trans_type,
-            )
-            
-            db.add(expense)
-            created_expenses.append({
-                "amount": amount,
-                "category": category,
-                "description": description,
-                "date": date_str,
-                "type": trans_type
-            })
-        
-        # Commit all transactions at once
-        if created_expenses:
-            db.commit()
-            
-            # Return summary of all created transactions
-            return VoiceTransactionResponse(
-                success=True,
-                amount=sum(t["amount"] for t in created_expenses),  # Total amount
-                category=f"{len(created_expenses)} transactions",  # Count
-                description=", ".join(t["description"] for t in created_expenses),  # All descriptions
-                date=today_date,
-                type="expense"
-            )
-        else:
-            return VoiceTransactionResponse(
-                success=False,
-                error="Could not process any valid transactions. Please try again."
-            )
+        return save_voice_transactions(db, current_user, transactions_data, category_names, today_date)
         
     except json.JSONDecodeError as e:
+        llm_usage.record_fallback("voice_parse", "invalid_json", current_user.id)
         return VoiceTransactionResponse(
             success=False,
             error="Failed to understand the AI response. Please try speaking more clearly."
         )
+    except (llm_client.LLMUnavailableError, TimeoutError) as e:
+        return VoiceTransactionResponse(
+            success=False,
+            error="AI service is busy right now. Please try again in a minute."
+        )
     except anthropic.NotFoundError as e:
         return VoiceTransactionResponse(
             success=False,
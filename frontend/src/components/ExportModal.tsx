@@ -1,21 +1,27 @@
 import React, { useState } from "react";
 import { API_ENDPOINTS } from "../config/api";
-import { X, Loader2, Download, FileText, Table } from "lucide-react";
+import { X, Loader2, Download, FileText, Table, Database } from "lucide-react";
 
 const ExportModal = ({ isOpen, onClose }: any) => {
   const [loading, setLoading] = useState<string | null>(null);
 
-  const handleExport = async (type: "csv" | "excel") => {
+  const exportTargets = {
+    csv: { url: API_ENDPOINTS.exportCsv, filename: "expenses.csv" },
+    excel: { url: API_ENDPOINTS.exportExcel, filename: "expenses.xlsx" },
+    parquet: { url: API_ENDPOINTS.exportParquet, filename: "expenses.parquet" },
+  };
+
+  const handleExport = async (type: "csv" | "excel" | "parquet") => {
     setLoading(type);
     const token = localStorage.getItem("token");
-    const url = type === "csv" ? API_ENDPOINTS.exportCsv : API_ENDPOINTS.exportExcel;
+    const { url, filename } = exportTargets[type];
 
     try {
       const res = await fetch(url, { headers: { Authorization: `Bearer ${token}` } });
       const blob = await res.blob();
       const link = document.createElement("a");
       link.href = URL.createObjectURL(blob);
-      link.download = type === "csv" ? "expenses.csv" : "expenses.xlsx";
+      link.download = filename;
       link.click();
     } catch(e) { console.error(e); } 
     finally { setLoading(null); }
@@ -69,6 +75,23 @@ const ExportModal = ({ isOpen, onClose }: any) => {
             </div>
             {loading === "excel" && <Loader2 className="animate-spin text-indigo-600" />}
           </button>
+
+          <button
+            onClick={() => handleExport("parquet")}
+            disabled={!!loading}
+            className="flex items-center justify-between p-4 rounded-2xl border border-slate-200 dark:border-slate-700 hover:border-indigo-500 hover:bg-indigo-50 dark:hover:bg-indigo-900/10 transition-all group"
+          >
+            <div className="flex items-center gap-3">
+              <div className="p-2 bg-indigo-100 dark:bg-indigo-900/30 text-indigo-600 rounded-lg">
+                <Database className="w-6 h-6" />
+              </div>
+              <div className="text-left">
+                <div className="font-bold text-slate-800 dark:text-white group-hover:text-indigo-600">Parquet Format</div>
+                <div className="text-xs text-slate-500">Best for backups & notebooks</div>
+              </div>
+            </div>
+            {loading === "parquet" && <Loader2 className="animate-spin text-indigo-600" />}
+          </button>
         </div>
       </div>
     </div>
@@ -53,7 +53,7 @@ const ImportModal = ({ isOpen, onClose, onImportComplete }: any) => {
                   {file ? <span className="font-semibold text-indigo-600">{file.name}</span> : <span>Click to upload <span className="font-semibold">CSV</span> or <span className="font-semibold">Excel</span></span>}
                 </p>
               </div>
-              <input type="file" className="hidden" accept=".csv, .xlsx, .xls" onChange={(e) => setFile(e.target.files?.[0] || null)} />
+              <input type="file" className="hidden" accept=".csv, .xlsx, .xls, .parquet" onChange={(e) => setFile(e.target.files?.[0] || null)} />
             </label>
 
             <button
@@ -72,6 +72,7 @@ const ImportModal = ({ isOpen, onClose, onImportComplete }: any) => {
             <h3 className="text-xl font-bold text-slate-900 dark:text-white mb-2">Import Complete!</h3>
             <p className="text-slate-600 dark:text-slate-400 mb-6">
               Successfully processed <span className="font-bold text-emerald-600">{result.imported}</span> transactions.
+              {result.skipped_duplicates > 0 && <span className="block text-slate-500 text-sm mt-1">({result.skipped_duplicates} already imported, skipped)</span>}
               {result.failed > 0 && <span className="block text-rose-500 text-sm mt-1">({result.failed} failed)</span>}
             </p>
             <button onClick={onClose} className="btn-ghost w-full">Done</button>
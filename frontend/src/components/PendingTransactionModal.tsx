@@ -3,6 +3,9 @@ import { useParams, useNavigate } from "react-router-dom";
 import { API_ENDPOINTS, authGet, authPost, authDelete, authPut } from "../config/api";
 import { Loader2, CheckCircle2, XCircle, ShieldCheck, Calendar, Tag, ArrowLeft, Edit2, FileText } from "lucide-react";
 
+const PARSING_POLL_INTERVAL_MS = 1000;
+const PARSING_POLL_ATTEMPTS = 30;
+
 const PendingTransactionModal = () => {
   const { token } = useParams();
   const navigate = useNavigate();
@@ -25,10 +28,17 @@ const PendingTransactionModal = () => {
     const load = async () => {
       try {
         // Load both pending transaction and categories
-        const [txRes, categoriesRes] = await Promise.all([
+        const [firstTxRes, categoriesRes] = await Promise.all([
           authGet(API_ENDPOINTS.pendingGet(token!)),
           authGet(API_ENDPOINTS.categories)
         ]);
+        let txRes = firstTxRes;
+        
+        // SMS from the shortcut may still be parsing in the background
+        for (let attempt = 0; txRes.status === "parsing" && attempt < PARSING_POLL_ATTEMPTS; attempt++) {
+          await new Promise((resolve) => setTimeout(resolve, PARSING_POLL_INTERVAL_MS));
+          txRes = await authGet(API_ENDPOINTS.pendingGet(token!));
+        }
         
         setTx(txRes);
         setCategories(categoriesRes);
@@ -29,6 +29,7 @@ export const API_ENDPOINTS = {
   import: `${API_BASE}/api/import`,
   exportCsv: `${API_BASE}/api/export/csv`,
   exportExcel: `${API_BASE}/api/export/excel`,
+  exportParquet: `${API_BASE}/api/export/parquet`,
 
   // --- Pending Transactions (Email/SMS) ---
   pendingList: `${API_BASE}/api/pending-transactions`,